@@ -0,0 +1,238 @@
+import fnmatch
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+from stream_hash import hash_file
+from io_pool import DEFAULT_WORKERS, IOPool
+
+INDEX_NAME = "backup_info.json"
+OBJECTS_DIR = ".objects"
+DEFAULT_IGNORE_PATTERNS = ['*.pyc', '__pycache__', '*.log', '.git', '.venv', 'backup', 'temp', 'logs', '.staging']
+# Linux 上 reflink（写时复制）克隆文件的 ioctl
+_FICLONE = 0x40049409
+
+
+def _clone_file(source: str, target: str) -> bool:
+    """文件系统支持时用 reflink 克隆文件（不复制数据），不支持时返回 False"""
+    if not sys.platform.startswith("linux"):
+        return False
+    try:
+        import fcntl
+        with open(source, 'rb') as src, open(target, 'wb') as dst:
+            fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+        return True
+    except (ImportError, OSError):
+        if os.path.exists(target):
+            os.remove(target)
+        return False
+
+
+class BackupStore:
+    """内容寻址的备份存储：文件内容按 SHA-256 保存在 .objects 中，每个备份快照中的文件是指向对象的硬链接
+
+    未变化的文件在各个备份之间共享同一个对象，只有变化的文件占用新的空间；
+    快照索引（backup_info.json）记录每个文件的大小、修改时间和摘要，
+    下次备份时大小和修改时间都没变的文件直接复用摘要，不需要重新读取。
+    对象从不就地修改：安装目录中的文件总是复制（或 reflink 克隆）到对象库，不会与对象共享 inode
+    """
+
+    def __init__(self, backup_dir: str, ignore_patterns: Optional[List[str]] = None,
+                 workers: int = DEFAULT_WORKERS):
+        self.backup_dir = backup_dir
+        self.objects_dir = os.path.join(backup_dir, OBJECTS_DIR)
+        self.ignore_patterns = DEFAULT_IGNORE_PATTERNS if ignore_patterns is None else ignore_patterns
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._storing = {}
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    @staticmethod
+    def load_index(snapshot_path: str) -> Optional[dict]:
+        try:
+            with open(os.path.join(snapshot_path, INDEX_NAME), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def snapshots(self) -> List[dict]:
+        """存储中的快照索引（只包括内容寻址的快照），按时间从新到旧"""
+        result = []
+        if not os.path.isdir(self.backup_dir):
+            return result
+        for name in os.listdir(self.backup_dir):
+            path = os.path.join(self.backup_dir, name)
+            index = self.load_index(path) if os.path.isdir(path) else None
+            if index and "files" in index:
+                result.append(dict(index, name=name, backup_path=path))
+        return sorted(result, key=lambda item: item.get("timestamp", ""), reverse=True)
+
+    def _ignored(self, relative_path: str) -> bool:
+        return any(fnmatch.fnmatch(part, pattern)
+                   for part in relative_path.split("/") for pattern in self.ignore_patterns)
+
+    def _collect_files(self, source_dir: str, paths: Optional[Iterable[str]]) -> List[str]:
+        roots = list(paths) if paths is not None else sorted(os.listdir(source_dir))
+        files = []
+        for root in roots:
+            root = root.replace("\\", "/").strip("/")
+            full_root = os.path.join(source_dir, *root.split("/"))
+            if self._ignored(root) or not os.path.exists(full_root):
+                continue
+            if os.path.isfile(full_root):
+                files.append(root)
+                continue
+            for dirpath, dirnames, filenames in os.walk(full_root):
+                relative_dir = os.path.relpath(dirpath, source_dir).replace(os.sep, "/")
+                dirnames[:] = [name for name in dirnames if not self._ignored(f"{relative_dir}/{name}")]
+                files.extend(f"{relative_dir}/{name}" for name in filenames
+                             if not self._ignored(f"{relative_dir}/{name}"))
+        return files
+
+    def _known_digests(self) -> Dict[str, dict]:
+        """已有快照中的文件信息（较新的快照优先），用于跳过未变化文件的摘要计算"""
+        known = {}
+        for snapshot in reversed(self.snapshots()):
+            known.update(snapshot["files"])
+        return known
+
+    def _store_object(self, source: str, digest: str) -> int:
+        """把文件内容保存为对象，对象已存在（或另一个线程正在保存）时返回 0，否则返回新占用的字节数"""
+        object_path = self._object_path(digest)
+        with self._lock:
+            storing = self._storing.get(digest)
+            if storing is None:
+                if os.path.exists(object_path):
+                    return 0
+                self._storing[digest] = threading.Event()
+        if storing is not None:
+            # 相同内容的另一个文件正在保存，等它完成后再链接
+            storing.wait()
+            return 0
+        try:
+            os.makedirs(os.path.dirname(object_path), exist_ok=True)
+            temp_path = f"{object_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            if not _clone_file(source, temp_path):
+                shutil.copyfile(source, temp_path)
+            os.replace(temp_path, object_path)
+            return os.path.getsize(object_path)
+        finally:
+            self._storing[digest].set()
+
+    def _snapshot_file(self, source_dir: str, snapshot_path: str, relative_path: str, known: Dict[str, dict]):
+        source = os.path.join(source_dir, *relative_path.split("/"))
+        stat = os.stat(source)
+        previous = known.get(relative_path)
+        new_bytes = 0
+        if previous and previous["size"] == stat.st_size and previous["mtime_ns"] == stat.st_mtime_ns \
+                and os.path.exists(self._object_path(previous["sha256"])):
+            digest = previous["sha256"]
+        else:
+            digest = hash_file(source, ("sha256",))["sha256"]
+            new_bytes = self._store_object(source, digest)
+        target = os.path.join(snapshot_path, *relative_path.split("/"))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.link(self._object_path(digest), target)
+        except OSError:
+            # 文件系统不支持硬链接时退回复制
+            shutil.copyfile(self._object_path(digest), target)
+        return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": digest}, new_bytes
+
+    def create_snapshot(self, source_dir: str, paths: Optional[Iterable[str]] = None, name: Optional[str] = None,
+                        info: Optional[dict] = None,
+                        on_progress: Optional[Callable[[int, int], None]] = None) -> dict:
+        """为 source_dir 中的 paths（文件或目录，默认全部顶层项目）创建快照，返回快照索引
+
+        文件的摘要计算、对象保存和链接在 I/O 线程池中并行进行
+        """
+        paths = list(paths) if paths is not None else None
+        timestamp = time.strftime("%Y%m%d_%H%M%S")
+        name = name or f"backup_{timestamp}"
+        snapshot_path = os.path.join(self.backup_dir, name)
+        if os.path.exists(snapshot_path):
+            name = f"{name}_{int(time.time() * 1000) % 1000:03d}"
+            snapshot_path = os.path.join(self.backup_dir, name)
+        os.makedirs(snapshot_path)
+
+        known = self._known_digests()
+        files = self._collect_files(source_dir, paths)
+        self._storing = {}
+        results = IOPool(self.workers, on_progress).map(
+            lambda relative_path: self._snapshot_file(source_dir, snapshot_path, relative_path, known), files)
+        entries = {relative_path: entry for relative_path, (entry, _) in zip(files, results)}
+
+        index = dict(info or {})
+        index.update({
+            "timestamp": index.get("timestamp", timestamp),
+            "backup_path": snapshot_path,
+            "roots": sorted({path.replace("\\", "/").strip("/") for path in paths}) if paths is not None else None,
+            "files": entries,
+            "size": sum(entry["size"] for entry in entries.values()),
+            "newBytes": sum(new_bytes for _, new_bytes in results)
+        })
+        with open(os.path.join(snapshot_path, INDEX_NAME), 'w', encoding='utf-8') as f:
+            json.dump(index, f, indent=2, ensure_ascii=False)
+        return index
+
+    def _restore_file(self, snapshot_path: str, target_dir: str, relative_path: str, entry: dict):
+        source = os.path.join(snapshot_path, *relative_path.split("/"))
+        target = os.path.join(target_dir, *relative_path.split("/"))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        # 复制而不是链接，安装目录中的文件之后被修改也不会影响对象库
+        temp_path = target + ".restoring"
+        shutil.copyfile(source, temp_path)
+        os.replace(temp_path, target)
+        os.utime(target, ns=(entry["mtime_ns"], entry["mtime_ns"]))
+
+    def restore(self, snapshot_path: str, target_dir: str,
+                log_callback: Optional[Callable[[str], None]] = None,
+                on_progress: Optional[Callable[[int, int], None]] = None) -> int:
+        """把快照恢复到 target_dir：复制快照中的文件，并删除备份范围内快照中没有的文件，返回恢复的文件数"""
+        index = self.load_index(snapshot_path)
+        if not index or "files" not in index:
+            raise ValueError(f"不是内容寻址的备份: {snapshot_path}")
+        files = index["files"]
+        IOPool(self.workers, on_progress).map(
+            lambda item: self._restore_file(snapshot_path, target_dir, *item), list(files.items()))
+        removed = 0
+        for relative_path in self._collect_files(target_dir, index.get("roots")):
+            if relative_path not in files:
+                os.remove(os.path.join(target_dir, *relative_path.split("/")))
+                removed += 1
+        if log_callback:
+            log_callback(f"已恢复 {len(files)} 个文件，删除 {removed} 个备份后新增的文件")
+        return len(files)
+
+    def delete_snapshot(self, snapshot_path: str) -> int:
+        """删除快照并回收不再被任何快照引用的对象，返回释放的字节数"""
+        if os.path.exists(snapshot_path):
+            shutil.rmtree(snapshot_path)
+        return self.collect_garbage()
+
+    def collect_garbage(self) -> int:
+        referenced = {entry["sha256"] for snapshot in self.snapshots() for entry in snapshot["files"].values()}
+        freed = 0
+        if not os.path.isdir(self.objects_dir):
+            return freed
+        for dirpath, _, filenames in os.walk(self.objects_dir):
+            for name in filenames:
+                if name not in referenced:
+                    path = os.path.join(dirpath, name)
+                    freed += os.path.getsize(path)
+                    os.remove(path)
+        return freed
+
+    def usage(self) -> dict:
+        """按索引计算的占用：各快照的逻辑大小之和，以及去重后对象实际占用的大小"""
+        logical, objects = 0, {}
+        for snapshot in self.snapshots():
+            logical += snapshot.get("size", 0)
+            for entry in snapshot["files"].values():
+                objects[entry["sha256"]] = entry["size"]
+        return {"logicalBytes": logical, "storedBytes": sum(objects.values()), "objects": len(objects)}
@@ -0,0 +1,314 @@
+import hashlib
+import os
+import shutil
+import struct
+from itertools import accumulate
+from typing import Callable, Optional
+from delta_update import normalize_path
+from stream_hash import StreamingHasher, hash_file
+
+try:
+    import bsdiff4
+except ImportError:
+    bsdiff4 = None
+
+PATCH_MAGIC = b"OMBDIFF1"
+FORMAT_BLOCK = "blockdiff"
+FORMAT_BSDIFF = "bsdiff4"
+DEFAULT_BLOCK_SIZE = 4096
+COPY_CHUNK_SIZE = 1024 * 1024
+_OP_COPY, _OP_DATA, _OP_END = b"C", b"D", b"E"
+_U64 = struct.Struct("<Q")
+_MOD = 1 << 16
+
+
+class PatchError(Exception):
+    """补丁无法应用（格式错误、源文件不匹配或结果校验失败）"""
+
+
+def _weak_checksum(block: bytes):
+    """rsync 风格的滚动校验和，返回 (a, b)"""
+    return sum(block) % _MOD, sum(accumulate(block)) % _MOD
+
+
+def _index_blocks(path: str, block_size: int) -> dict:
+    """按块读取旧文件，建立 弱校验和 -> [(强校验, 偏移)] 的索引"""
+    index = {}
+    with open(path, 'rb') as f:
+        offset = 0
+        for block in iter(lambda: f.read(block_size), b''):
+            if len(block) == block_size:
+                a, b = _weak_checksum(block)
+                index.setdefault(a | (b << 16), []).append((hashlib.md5(block).digest(), offset))
+            offset += len(block)
+    return index
+
+
+class _PatchWriter:
+    """顺序写出补丁指令，相邻的 COPY 指令合并"""
+
+    def __init__(self, f):
+        self.f = f
+        self._copy = None  # 尚未写出的 COPY (偏移, 长度)
+        self.copied = 0
+        self.literal = 0
+
+    def copy(self, offset: int, length: int):
+        if self._copy and self._copy[0] + self._copy[1] == offset:
+            self._copy = (self._copy[0], self._copy[1] + length)
+            return
+        self._flush_copy()
+        self._copy = (offset, length)
+
+    def data(self, data: bytes):
+        if not data:
+            return
+        self._flush_copy()
+        self.f.write(_OP_DATA + _U64.pack(len(data)))
+        self.f.write(data)
+        self.literal += len(data)
+
+    def _flush_copy(self):
+        if self._copy:
+            self.f.write(_OP_COPY + _U64.pack(self._copy[0]) + _U64.pack(self._copy[1]))
+            self.copied += self._copy[1]
+            self._copy = None
+
+    def close(self):
+        self._flush_copy()
+        self.f.write(_OP_END)
+
+
+def create_patch(old_path: str, new_path: str, patch_path: str, block_size: int = DEFAULT_BLOCK_SIZE) -> dict:
+    """生成块级二进制补丁（发布时使用）
+
+    旧文件按固定块建立索引，新文件用滚动校验和逐字节查找能在旧文件中找到的块，
+    找到的部分记为 COPY，其余作为数据写入补丁；只有变化的区域需要逐字节滚动
+    """
+    index = _index_blocks(old_path, block_size)
+    with open(new_path, 'rb') as f:
+        new = f.read()
+    size = len(new)
+
+    with open(patch_path, 'wb') as f:
+        f.write(PATCH_MAGIC + _U64.pack(size))
+        writer = _PatchWriter(f)
+        position = literal_start = 0
+        a = b = None
+        while position + block_size <= size:
+            if a is None:
+                a, b = _weak_checksum(new[position:position + block_size])
+            candidates = index.get(a | (b << 16))
+            match = None
+            if candidates:
+                strong = hashlib.md5(new[position:position + block_size]).digest()
+                match = next((offset for digest, offset in candidates if digest == strong), None)
+            if match is not None:
+                writer.data(new[literal_start:position])
+                writer.copy(match, block_size)
+                position += block_size
+                literal_start = position
+                a = None
+                continue
+            # 窗口向后滚动一个字节
+            if position + block_size < size:
+                out_byte, in_byte = new[position], new[position + block_size]
+                a = (a - out_byte + in_byte) % _MOD
+                b = (b - block_size * out_byte + a) % _MOD
+            position += 1
+        writer.data(new[literal_start:])
+        writer.close()
+    return {"size": size, "copied": writer.copied, "literal": writer.literal,
+            "patchSize": os.path.getsize(patch_path)}
+
+
+def _read_exact(f, length: int) -> bytes:
+    data = f.read(length)
+    if len(data) != length:
+        raise PatchError("补丁文件不完整")
+    return data
+
+
+def apply_patch(old_path: str, patch_path: str, out_path: str, hasher: Optional[StreamingHasher] = None) -> int:
+    """流式应用块级补丁：按指令从旧文件或补丁中分块读取并顺序写出，返回写出的字节数"""
+    written = 0
+    with open(patch_path, 'rb') as patch, open(old_path, 'rb') as old, open(out_path, 'wb') as out:
+        if _read_exact(patch, len(PATCH_MAGIC)) != PATCH_MAGIC:
+            raise PatchError("不是有效的补丁文件")
+        size = _U64.unpack(_read_exact(patch, 8))[0]
+        while True:
+            op = _read_exact(patch, 1)
+            if op == _OP_END:
+                break
+            if op == _OP_COPY:
+                offset, length = _U64.unpack(_read_exact(patch, 8))[0], _U64.unpack(_read_exact(patch, 8))[0]
+                old.seek(offset)
+                source = old
+            elif op == _OP_DATA:
+                length = _U64.unpack(_read_exact(patch, 8))[0]
+                source = patch
+            else:
+                raise PatchError(f"未知的补丁指令: {op!r}")
+            while length > 0:
+                data = source.read(min(COPY_CHUNK_SIZE, length))
+                if not data:
+                    raise PatchError("补丁引用的数据超出文件范围")
+                out.write(data)
+                if hasher:
+                    hasher.update(data)
+                length -= len(data)
+                written += len(data)
+    if written != size:
+        raise PatchError(f"补丁结果大小不符: 期望 {size}, 实际 {written}")
+    return written
+
+
+def _apply_entry(entry: dict, old_path: str, patch_path: str, out_path: str) -> str:
+    """应用一个补丁并返回结果的 SHA-256"""
+    patch_format = entry.get("format", FORMAT_BLOCK)
+    if patch_format == FORMAT_BLOCK:
+        hasher = StreamingHasher(("sha256",))
+        apply_patch(old_path, patch_path, out_path, hasher)
+        return hasher.hexdigests()["sha256"]
+    if patch_format == FORMAT_BSDIFF:
+        if bsdiff4 is None:
+            raise PatchError("未安装 bsdiff4，无法应用 bsdiff 补丁")
+        # bsdiff4 需要把新旧文件读入内存，不是流式的
+        bsdiff4.file_patch(old_path, out_path, patch_path)
+        return hash_file(out_path, ("sha256",))["sha256"]
+    raise PatchError(f"不支持的补丁格式: {patch_format}")
+
+
+def apply_patches(manifest: dict, target_dir: str, extract_dir: str,
+                  download_fallback: Optional[Callable[[str, str], bool]] = None,
+                  log_callback: Optional[Callable[[str], None]] = None) -> dict:
+    """应用 update_manifest.json 中 patches 列出的二进制补丁
+
+    每个补丁以安装目录中的旧文件为源，结果写入解压目录中该文件的位置（暂存），校验 SHA-256 后
+    加入清单的 files 列表，随其他文件一起安装。源文件不匹配、补丁失败（包括补丁库抛出的任何异常）、
+    结果校验失败或清单中没有结果的 SHA-256（无法校验）时，使用更新包中的完整文件（fallback），
+    或调用 download_fallback(fallback_url, 目标路径) 下载完整文件
+    """
+    def log(message):
+        if log_callback:
+            log_callback(message)
+
+    patched, fallback = [], []
+    files = manifest.setdefault("files", [])
+    listed = {entry.get("path") for entry in files}
+    for entry in manifest.get("patches", []):
+        relative_path = normalize_path(entry["path"])
+        old_path = os.path.join(target_dir, *relative_path.split("/"))
+        out_path = os.path.join(extract_dir, *relative_path.split("/"))
+        os.makedirs(os.path.dirname(out_path), exist_ok=True)
+        temp_path = out_path + ".patched"
+        expected = entry.get("sha256", "").lower()
+        try:
+            if not expected:
+                raise PatchError("清单中没有补丁结果的 SHA-256，无法校验")
+            if not os.path.exists(old_path):
+                raise PatchError("安装目录中没有源文件")
+            if entry.get("source_sha256") and \
+                    hash_file(old_path, ("sha256",))["sha256"] != entry["source_sha256"].lower():
+                raise PatchError("源文件与补丁的基础版本不一致")
+            patch_path = os.path.join(extract_dir, *normalize_path(entry["patch"]).split("/"))
+            digest = _apply_entry(entry, old_path, patch_path, temp_path)
+            if digest != expected:
+                raise PatchError(f"补丁结果校验失败: 期望 {expected}, 实际 {digest}")
+            os.replace(temp_path, out_path)
+            patched.append(relative_path)
+            log(f"已应用补丁: {relative_path}")
+        except Exception as e:
+            # 损坏的补丁可能让补丁库抛出 ValueError 等任意异常，都改用完整文件
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            log(f"补丁不可用（{str(e)}），使用完整文件: {relative_path}")
+            _use_fallback(entry, relative_path, extract_dir, out_path, expected, download_fallback)
+            fallback.append(relative_path)
+        if relative_path not in listed:
+            files.append({"path": relative_path, "sha256": expected})
+            listed.add(relative_path)
+    return {"patched": patched, "fallback": fallback}
+
+
+def _use_fallback(entry: dict, relative_path: str, extract_dir: str, out_path: str, expected: str,
+                  download_fallback: Optional[Callable[[str, str], bool]]):
+    packaged = entry.get("fallback")
+    if packaged:
+        source = os.path.join(extract_dir, *normalize_path(packaged).split("/"))
+        if os.path.exists(source) and source != out_path:
+            shutil.copyfile(source, out_path)
+    elif entry.get("fallback_url") and download_fallback:
+        if not download_fallback(entry["fallback_url"], out_path):
+            raise PatchError(f"下载完整文件失败: {relative_path}")
+    else:
+        raise PatchError(f"补丁失败且没有可用的完整文件: {relative_path}")
+    if expected and hash_file(out_path, ("sha256",))["sha256"] != expected:
+        raise PatchError(f"完整文件校验失败: {relative_path}")
+
+
+def _self_test(size_mb: int, block_size: int):
+    """用合成的新旧文件对（插入、删除、覆盖）测试生成和应用补丁"""
+    import random
+    import tempfile
+    import time
+
+    work_dir = tempfile.mkdtemp(prefix="binary-patch-")
+    rng = random.Random(42)
+    old = bytearray(os.urandom(size_mb * 1024 * 1024))
+    new = bytearray(old)
+    for _ in range(20):
+        position = rng.randrange(len(new))
+        action = rng.choice(("insert", "delete", "overwrite"))
+        length = rng.randrange(1, 8192)
+        if action == "insert":
+            new[position:position] = os.urandom(length)
+        elif action == "delete":
+            del new[position:position + length]
+        else:
+            new[position:position + length] = os.urandom(min(length, len(new) - position))
+    paths = {name: os.path.join(work_dir, name) for name in ("old.bin", "new.bin", "patch.bin", "out.bin")}
+    with open(paths["old.bin"], 'wb') as f:
+        f.write(old)
+    with open(paths["new.bin"], 'wb') as f:
+        f.write(new)
+
+    start = time.perf_counter()
+    stats = create_patch(paths["old.bin"], paths["new.bin"], paths["patch.bin"], block_size)
+    diff_time = time.perf_counter() - start
+    start = time.perf_counter()
+    hasher = StreamingHasher(("sha256",))
+    apply_patch(paths["old.bin"], paths["patch.bin"], paths["out.bin"], hasher)
+    apply_time = time.perf_counter() - start
+    identical = hasher.hexdigests()["sha256"] == hashlib.sha256(new).hexdigest()
+    print(f"新文件 {stats['size']} 字节，补丁 {stats['patchSize']} 字节"
+          f"（{stats['patchSize'] / stats['size'] * 100:.2f}%），复用 {stats['copied']} 字节")
+    print(f"生成 {diff_time:.2f}s，应用 {apply_time:.2f}s，结果{'一致' if identical else '不一致'}")
+    shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="生成、应用或测试块级二进制补丁")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    diff_parser = subparsers.add_parser("diff", help="生成补丁")
+    diff_parser.add_argument("old")
+    diff_parser.add_argument("new")
+    diff_parser.add_argument("patch")
+    diff_parser.add_argument("--block-size", type=int, default=DEFAULT_BLOCK_SIZE)
+    patch_parser = subparsers.add_parser("apply", help="应用补丁")
+    patch_parser.add_argument("old")
+    patch_parser.add_argument("patch")
+    patch_parser.add_argument("out")
+    test_parser = subparsers.add_parser("selftest", help="用合成的新旧文件对测试")
+    test_parser.add_argument("--size", type=int, default=8, help="旧文件大小（MB）")
+    test_parser.add_argument("--block-size", type=int, default=DEFAULT_BLOCK_SIZE)
+    args = parser.parse_args()
+
+    if args.command == "diff":
+        result = create_patch(args.old, args.new, args.patch, args.block_size)
+        print(f"✅ 补丁 {result['patchSize']} 字节，复用 {result['copied']} 字节，新数据 {result['literal']} 字节")
+    elif args.command == "apply":
+        print(f"✅ 写出 {apply_patch(args.old, args.patch, args.out)} 字节")
+    else:
+        _self_test(args.size, args.block_size)
@@ -0,0 +1,158 @@
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from disk_analyzer import read_manifest
+
+DEFAULT_WORKERS = 8
+# 最近修改过的文件可能属于正在进行的拉取（blob 先于 manifest 写入），默认 1 小时内的不回收
+DEFAULT_MIN_AGE = 3600
+# 完整 blob：sha256-<64 位十六进制>；未完成的下载：后面带 -partial 或 -partial-<n>
+_BLOB_NAME = re.compile(r'^(sha256-[0-9a-f]{64})(-partial(?:-\d+)?)?$')
+
+
+def _read_manifest_digests(path):
+    # blob 文件名中用 "-" 代替摘要中的 ":"
+    return {digest.replace(":", "-") for digest in read_manifest(path)}
+
+
+def _walk_files(root, executor):
+    """并行遍历目录树：每个子目录在线程池中扫描，返回所有文件的 os.DirEntry"""
+    files = []
+    pending = [executor.submit(_scan_dir, root)]
+    while pending:
+        future = pending.pop()
+        dir_files, subdirs = future.result()
+        files.extend(dir_files)
+        pending.extend(executor.submit(_scan_dir, subdir) for subdir in subdirs)
+    return files
+
+
+def _scan_dir(path):
+    dir_files, subdirs = [], []
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    dir_files.append(entry)
+    except OSError:
+        pass
+    return dir_files, subdirs
+
+
+class BlobGarbageCollector:
+    """本机 Ollama 模型目录的垃圾回收：从 manifests 建立可达 blob 集合，找出未被引用的 blob 和未完成的下载"""
+
+    def __init__(self, models_dir, workers=DEFAULT_WORKERS, min_age=DEFAULT_MIN_AGE):
+        self.models_dir = models_dir
+        self.workers = max(int(workers), 1)
+        self.min_age = min_age
+
+    def scan(self, now=None):
+        """扫描模型目录，返回垃圾回收报告（不删除任何文件）"""
+        now = now or time.time()
+        manifests_dir = os.path.join(self.models_dir, "manifests")
+        blobs_dir = os.path.join(self.models_dir, "blobs")
+        reachable = set()
+        errors = []
+
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="blob-gc") as executor:
+            manifest_files = _walk_files(manifests_dir, executor) if os.path.isdir(manifests_dir) else []
+            futures = {executor.submit(_read_manifest_digests, entry.path): entry.path for entry in manifest_files}
+            for future, path in futures.items():
+                try:
+                    reachable |= future.result()
+                except (OSError, ValueError, KeyError, AttributeError) as e:
+                    errors.append(f"{path}: {str(e)}")
+            blob_files = list(executor.map(self._blob_info, _walk_files(blobs_dir, executor))) \
+                if os.path.isdir(blobs_dir) else []
+
+        orphans, partials, skipped = [], [], []
+        for blob in blob_files:
+            if blob["digest"] in reachable and not blob["partial"]:
+                continue
+            if now - blob["mtime"] < self.min_age:
+                skipped.append(blob)  # 可能属于正在进行的拉取
+            elif blob["partial"]:
+                partials.append(blob)
+            elif blob["digest"] is not None:
+                orphans.append(blob)
+            # 不符合 blob 命名规则的文件不是 Ollama 创建的，不做处理
+
+        return {
+            "modelsDir": self.models_dir,
+            "manifests": len(manifest_files),
+            "blobs": len(blob_files),
+            "reachable": len(reachable),
+            "orphans": orphans,
+            "partials": partials,
+            "skipped": skipped,
+            "orphanBytes": sum(blob["size"] for blob in orphans),
+            "partialBytes": sum(blob["size"] for blob in partials),
+            "errors": errors
+        }
+
+    @staticmethod
+    def _blob_info(entry):
+        match = _BLOB_NAME.match(entry.name)
+        try:
+            stat = entry.stat(follow_symlinks=False)
+            size, mtime = stat.st_size, stat.st_mtime
+        except OSError:
+            size, mtime = 0, time.time()
+        return {"name": entry.name, "path": entry.path, "size": size, "mtime": mtime,
+                "digest": match.group(1) if match else None,
+                "partial": bool(match and match.group(2))}
+
+    def collect(self, dry_run=True, include_partials=True):
+        """回收未被引用的 blob 和未完成的下载；dry_run 时只返回将要删除的文件
+
+        有 manifest 读取失败时不删除未被引用的 blob，避免误删被它引用的文件
+        """
+        report = self.scan()
+        targets = list(report["partials"]) if include_partials else []
+        if report["errors"]:
+            print(f"⚠️  {len(report['errors'])} 个 manifest 读取失败，跳过未引用 blob 的回收\n")
+        else:
+            targets.extend(report["orphans"])
+
+        deleted, failed = [], []
+        if not dry_run:
+            for blob in targets:
+                try:
+                    os.remove(blob["path"])
+                    deleted.append(blob)
+                except OSError as e:
+                    failed.append({"name": blob["name"], "error": str(e)})
+        report.update({
+            "dryRun": dry_run,
+            "targets": [blob["name"] for blob in targets],
+            "reclaimableBytes": sum(blob["size"] for blob in targets),
+            "deleted": [blob["name"] for blob in deleted],
+            "freedBytes": sum(blob["size"] for blob in deleted),
+            "failed": failed
+        })
+        return report
+
+
+if __name__ == "__main__":
+    import argparse
+    from disk_analyzer import default_models_dir
+    from fleet_dashboard import format_disk_usage
+
+    parser = argparse.ArgumentParser(description="回收 Ollama 模型目录中未被引用的 blob 和未完成的下载")
+    parser.add_argument("--models-dir", default=default_models_dir(), help="Ollama 模型目录")
+    parser.add_argument("--delete", action="store_true", help="实际删除（默认只列出）")
+    parser.add_argument("--min-age", type=int, default=DEFAULT_MIN_AGE, help="只回收超过该秒数未修改的文件")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="并行扫描线程数")
+    args = parser.parse_args()
+
+    result = BlobGarbageCollector(args.models_dir, args.workers, args.min_age).collect(dry_run=not args.delete)
+    print(f"{result['manifests']} 个 manifest，{result['blobs']} 个 blob 文件，{result['reachable']} 个被引用")
+    for name in result["targets"]:
+        print(f"  {'已删除' if name in result['deleted'] else '可回收'}: {name}")
+    print(f"可回收 {format_disk_usage(result['reclaimableBytes'])}，已释放 {format_disk_usage(result['freedBytes'])}")
+    for error in result["errors"] + [f"{item['name']}: {item['error']}" for item in result["failed"]]:
+        print(f"❌ {error}")
@@ -0,0 +1,117 @@
+import fnmatch
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+BULK_OPERATIONS = ("delete", "unload", "pull", "update")
+# 每种操作的默认并行数（拉取会占满带宽，并行数较小）
+DEFAULT_CONCURRENCY = {"delete": 8, "unload": 8, "pull": 2, "update": 2}
+
+
+def parse_modified_at(value):
+    """解析 /api/tags 中的 modified_at（纳秒精度的 ISO 时间），返回时间戳，失败时返回 None"""
+    if not value:
+        return None
+    # datetime.fromisoformat 最多支持微秒，截掉多余的小数位；Z 时区写法转为 +00:00
+    value = re.sub(r'(\.\d{6})\d+', r'\1', str(value)).replace("Z", "+00:00")
+    try:
+        return datetime.fromisoformat(value).timestamp()
+    except ValueError:
+        return None
+
+
+def select_models(models, filter_spec, now=None):
+    """按条件筛选模型，返回模型名称列表
+
+    filter_spec: {"names": [...], "pattern": "llama*", "family": "qwen2",
+                  "olderThanDays": 30, "minSize": 字节, "maxSize": 字节}，未指定的条件不限制
+    """
+    filter_spec = filter_spec or {}
+    now = now or time.time()
+    names = set(filter_spec.get("names") or [])
+    pattern = filter_spec.get("pattern", "")
+    family = filter_spec.get("family", "")
+    older_than_days = filter_spec.get("olderThanDays", 0)
+    min_size = filter_spec.get("minSize", 0)
+    max_size = filter_spec.get("maxSize", 0)
+
+    selected = []
+    for model in models:
+        name = model.get("name", "")
+        if names and name not in names:
+            continue
+        if pattern and not fnmatch.fnmatch(name, pattern):
+            continue
+        if family and model.get("details", {}).get("family", "") != family:
+            continue
+        if older_than_days:
+            modified_at = parse_modified_at(model.get("modified_at"))
+            if modified_at is None or now - modified_at < older_than_days * 86400:
+                continue
+        if min_size and model.get("size", 0) < min_size:
+            continue
+        if max_size and model.get("size", 0) > max_size:
+            continue
+        selected.append(name)
+    return selected
+
+
+class BulkOperationRunner:
+    """用有界线程池并行执行批量操作，每完成一项回调一次汇总进度和该项结果"""
+
+    def __init__(self, concurrency=None):
+        self.concurrency = dict(DEFAULT_CONCURRENCY)
+        self.concurrency.update(concurrency or {})
+        self.cancel_event = threading.Event()
+        self._lock = threading.Lock()
+        self._running = False
+
+    @property
+    def running(self):
+        return self._running
+
+    def run(self, op, names, execute, on_progress):
+        """阻塞执行（应在后台线程中调用），execute(name) 返回 (成功, 消息)"""
+        with self._lock:
+            if self._running:
+                return False
+            self._running = True
+        self.cancel_event.clear()
+
+        names = list(dict.fromkeys(names))
+        progress = {"op": op, "total": len(names), "done": 0, "succeeded": 0, "failed": 0,
+                    "finished": False, "cancelled": False, "item": None, "results": []}
+
+        def execute_one(name):
+            if self.cancel_event.is_set():
+                ok, message = False, "已取消"
+            else:
+                try:
+                    ok, message = execute(name)
+                except Exception as e:
+                    ok, message = False, str(e)
+            item = {"name": name, "ok": ok, "message": message}
+            with self._lock:
+                progress["done"] += 1
+                progress["succeeded" if ok else "failed"] += 1
+                progress["results"].append(item)
+                event = dict(progress, item=item, results=[])
+            on_progress(event)
+
+        try:
+            workers = max(1, min(int(self.concurrency.get(op, 1)), len(names)))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"bulk-{op}") as executor:
+                list(executor.map(execute_one, names))
+        finally:
+            with self._lock:
+                self._running = False
+                progress.update(finished=True, cancelled=self.cancel_event.is_set(), item=None)
+            # 最后一条进度带上全部结果
+            on_progress(progress)
+        return True
+
+    def cancel(self):
+        """取消尚未开始的操作（已开始的操作会执行完）"""
+        self.cancel_event.set()
@@ -0,0 +1,260 @@
+import fnmatch
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import zipfile
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+from urllib.parse import quote, urljoin
+from resumable_transfer import ResumableTransfer
+from stream_hash import StreamingHasher, hash_file
+
+MANIFEST_NAME = "update_manifest.json"
+DEFAULT_WORKERS = 4
+# 发布目录中不计入内容清单的文件
+DEFAULT_IGNORE_PATTERNS = ["*.pyc", "__pycache__", "*.log", ".git", "config", "logs", "temp", "backup"]
+
+
+class DeltaUpdateError(Exception):
+    """增量更新无法完成（清单无效、文件下载或校验失败），调用方应回退到完整更新包"""
+
+
+def normalize_path(path: str) -> str:
+    """清单中的相对路径统一使用 "/"，拒绝绝对路径和 ".."，避免写到安装目录之外"""
+    normalized = path.replace("\\", "/").strip("/")
+    parts = normalized.split("/")
+    if not normalized or os.path.isabs(path) or ".." in parts or ":" in parts[0]:
+        raise DeltaUpdateError(f"清单中的路径无效: {path}")
+    return normalized
+
+
+def _ignored(relative_path: str, patterns: List[str]) -> bool:
+    return any(fnmatch.fnmatch(part, pattern) for part in relative_path.split("/") for pattern in patterns)
+
+
+def build_manifest(root: str, version: str, ignore_patterns: Optional[List[str]] = None,
+                   workers: int = DEFAULT_WORKERS) -> dict:
+    """为发布目录生成内容清单：每个文件的相对路径、大小和 SHA-256（发布时使用）"""
+    patterns = DEFAULT_IGNORE_PATTERNS if ignore_patterns is None else ignore_patterns
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        relative_dir = os.path.relpath(dirpath, root).replace(os.sep, "/")
+        relative_dir = "" if relative_dir == "." else relative_dir + "/"
+        dirnames[:] = [name for name in dirnames if not _ignored(relative_dir + name, patterns)]
+        paths.extend(relative_dir + name for name in filenames if not _ignored(relative_dir + name, patterns))
+
+    def describe(relative_path):
+        full_path = os.path.join(root, *relative_path.split("/"))
+        return {"path": relative_path, "size": os.path.getsize(full_path),
+                "sha256": hash_file(full_path, ("sha256",))["sha256"]}
+
+    with ThreadPoolExecutor(max_workers=max(int(workers), 1), thread_name_prefix="manifest") as executor:
+        files = list(executor.map(describe, sorted(paths)))
+    return {"version": version, "files": files}
+
+
+def local_file_hashes(root: str, paths: List[str], workers: int = DEFAULT_WORKERS) -> Dict[str, str]:
+    """并行计算本地文件的 SHA-256，不存在或无法读取的文件不在结果中"""
+    def digest(relative_path):
+        full_path = os.path.join(root, *relative_path.split("/"))
+        try:
+            return relative_path, hash_file(full_path, ("sha256",))["sha256"]
+        except OSError:
+            return relative_path, None
+
+    with ThreadPoolExecutor(max_workers=max(int(workers), 1), thread_name_prefix="local-hash") as executor:
+        return {path: value for path, value in executor.map(digest, paths) if value}
+
+
+def plan_delta(manifest: dict, root: str, workers: int = DEFAULT_WORKERS) -> dict:
+    """比较内容清单和本地文件：返回需要下载的文件、需要删除的文件和下载量"""
+    files = []
+    for entry in manifest.get("files", []):
+        if not entry.get("sha256"):
+            raise DeltaUpdateError(f"清单缺少文件摘要: {entry.get('path', '')}")
+        files.append(dict(entry, path=normalize_path(entry["path"])))
+    local_hashes = local_file_hashes(root, [entry["path"] for entry in files], workers)
+    changed = [entry for entry in files if local_hashes.get(entry["path"]) != entry["sha256"].lower()]
+    return {
+        "version": manifest.get("version", ""),
+        "changed": changed,
+        "unchanged": len(files) - len(changed),
+        "delete": [normalize_path(path) for path in manifest.get("delete_files", [])],
+        "downloadBytes": sum(entry.get("size", 0) for entry in changed),
+        "fullBytes": sum(entry.get("size", 0) for entry in files)
+    }
+
+
+def file_url(manifest: dict, manifest_url: str, relative_path: str) -> str:
+    """单个文件的下载地址：清单中的 base_url，默认是清单所在目录下的 files/"""
+    base_url = manifest.get("base_url") or urljoin(manifest_url, "files/")
+    return urljoin(base_url.rstrip("/") + "/", quote(relative_path))
+
+
+def fetch_manifest(manifest_url: str, expected_sha256: str, version: str = "", timeout: int = 10) -> dict:
+    """获取内容清单并与 version.json 中发布的清单摘要比较
+
+    每个文件只按清单中的摘要校验，清单本身必须由 version.json 固定，否则被替换的清单可以让任意文件通过校验
+    """
+    if not expected_sha256:
+        raise DeltaUpdateError("版本信息中没有内容清单的摘要，无法校验内容清单")
+    try:
+        response = requests.get(manifest_url, timeout=timeout)
+    except requests.RequestException as e:
+        raise DeltaUpdateError(f"获取内容清单失败: {str(e)}")
+    if response.status_code != 200:
+        raise DeltaUpdateError(f"获取内容清单失败，状态码: {response.status_code}")
+    if hashlib.sha256(response.content).hexdigest() != expected_sha256.strip().lower():
+        raise DeltaUpdateError("内容清单校验失败，摘要与版本信息不一致")
+    try:
+        manifest = response.json()
+    except ValueError as e:
+        raise DeltaUpdateError(f"内容清单格式错误: {str(e)}")
+    if version and manifest.get("version") != version:
+        raise DeltaUpdateError(f"内容清单版本 {manifest.get('version')} 与更新版本 {version} 不一致")
+    return manifest
+
+
+class DeltaDownloader:
+    """增量更新：只并行下载内容发生变化的文件，校验后打包为与完整更新包格式相同的补丁包
+
+    补丁包中的 update_manifest.json 列出包含的文件和要删除的文件，
+    安装时只替换这些文件，不会像完整更新包那样整体替换目录
+    """
+
+    def __init__(self, manifest_url: str, staging_dir: str, workers: int = DEFAULT_WORKERS,
+                 timeout: int = 30, cancel_check: Optional[Callable[[], bool]] = None,
+                 on_progress: Optional[Callable[[int, int], None]] = None):
+        self.manifest_url = manifest_url
+        self.staging_dir = staging_dir
+        self.workers = max(int(workers), 1)
+        self.timeout = timeout
+        self.cancel_check = cancel_check or (lambda: False)
+        self.on_progress = on_progress
+        self._lock = threading.Lock()
+        self._progress = {}
+        self._failed = threading.Event()  # 一个文件失败时停止其他文件的下载
+
+    def _stopped(self) -> bool:
+        return self._failed.is_set() or self.cancel_check()
+
+    def _report(self, relative_path: str, downloaded: int, total: int):
+        with self._lock:
+            self._progress[relative_path] = downloaded
+            done = sum(self._progress.values())
+        if self.on_progress:
+            self.on_progress(done, total)
+
+    def _download_file(self, manifest: dict, entry: dict, total: int) -> bool:
+        relative_path = entry["path"]
+        target = os.path.join(self.staging_dir, "files", *relative_path.split("/"))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        partial = target + ".part"
+        hasher = StreamingHasher(("sha256",))
+        transfer = ResumableTransfer(file_url(manifest, self.manifest_url, relative_path), partial,
+                                     timeout=self.timeout, cancel_check=self._stopped, hasher=hasher,
+                                     on_progress=lambda downloaded, _: self._report(relative_path, downloaded, total))
+        try:
+            if not transfer.run():
+                return False
+        except Exception:
+            self._failed.set()
+            raise
+        hasher.sync(partial, os.path.getsize(partial))
+        if hasher.hexdigests()["sha256"] != entry["sha256"].lower():
+            transfer.discard()
+            self._failed.set()
+            raise DeltaUpdateError(f"文件校验失败: {relative_path}")
+        os.replace(partial, target)
+        return True
+
+    def download(self, plan: dict, manifest: dict, archive_path: str) -> Optional[dict]:
+        """并行下载变化的文件并生成补丁包，取消时返回 None，失败抛出 DeltaUpdateError"""
+        total = plan["downloadBytes"]
+        self._progress = {}
+        self._failed.clear()
+        start_time = time.time()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="delta") as executor:
+            futures = [executor.submit(self._download_file, manifest, entry, total) for entry in plan["changed"]]
+            try:
+                results = [future.result() for future in futures]
+            except DeltaUpdateError:
+                raise
+            except Exception as e:
+                raise DeltaUpdateError(f"下载文件失败: {str(e)}")
+        if not all(results):
+            return None
+
+        self._write_archive(plan, archive_path)
+        # 补丁包在本地生成，记录其摘要，安装前按摘要校验补丁包未被改动
+        return {"files": len(plan["changed"]), "downloadBytes": total, "fullBytes": plan["fullBytes"],
+                "digests": hash_file(archive_path), "elapsed": time.time() - start_time}
+
+    def _write_archive(self, plan: dict, archive_path: str):
+        """把下载的文件打包为补丁包（文件已经过压缩或体积很小，只存储不压缩）"""
+        install_manifest = {
+            "version": plan["version"],
+            "delta": True,
+            "files": [{"path": entry["path"], "sha256": entry["sha256"]} for entry in plan["changed"]],
+            "delete_files": plan["delete"]
+        }
+        temp_path = archive_path + ".tmp"
+        with zipfile.ZipFile(temp_path, 'w', zipfile.ZIP_STORED) as archive:
+            archive.writestr(MANIFEST_NAME, json.dumps(install_manifest, indent=2, ensure_ascii=False))
+            for entry in plan["changed"]:
+                archive.write(os.path.join(self.staging_dir, "files", *entry["path"].split("/")), entry["path"])
+        os.replace(temp_path, archive_path)
+
+
+def apply_install_manifest(source_dir: str, target_dir: str, manifest: dict,
+                           log_callback: Optional[Callable[[str], None]] = None) -> int:
+    """按 update_manifest.json 只替换列出的文件并删除 delete_files，返回替换的文件数"""
+    installed = 0
+    for entry in manifest.get("files", []):
+        relative_path = normalize_path(entry["path"])
+        source = os.path.join(source_dir, *relative_path.split("/"))
+        target = os.path.join(target_dir, *relative_path.split("/"))
+        if not os.path.exists(source):
+            continue
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if os.path.isdir(source):
+            shutil.copytree(source, target, dirs_exist_ok=True)
+        else:
+            shutil.copy2(source, target)
+        installed += 1
+        if log_callback:
+            log_callback(f"更新文件: {relative_path}")
+    for path in manifest.get("delete_files", []):
+        target = os.path.join(target_dir, *normalize_path(path).split("/"))
+        if os.path.isdir(target):
+            shutil.rmtree(target)
+        elif os.path.exists(target):
+            os.remove(target)
+        if log_callback:
+            log_callback(f"删除文件: {path}")
+    return installed
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="为发布目录生成增量更新的内容清单")
+    parser.add_argument("root", help="发布目录（解压后的完整更新包）")
+    parser.add_argument("--version", required=True, help="版本号")
+    parser.add_argument("--base-url", default="", help="单个文件的下载地址前缀，默认为清单所在目录下的 files/")
+    parser.add_argument("--delete", nargs="*", default=[], help="新版本中删除的文件")
+    parser.add_argument("--output", default="files_manifest.json", help="输出文件")
+    args = parser.parse_args()
+
+    result = build_manifest(args.root, args.version)
+    if args.base_url:
+        result["base_url"] = args.base_url
+    result["delete_files"] = args.delete
+    content = json.dumps(result, indent=2, ensure_ascii=False).encode("utf-8")
+    with open(args.output, 'wb') as f:
+        f.write(content)
+    print(f"✅ {len(result['files'])} 个文件，共 {sum(entry['size'] for entry in result['files'])} 字节 -> {args.output}")
+    print(f"📋 在 version.json 中发布 \"delta_manifest_sha256\": \"{hashlib.sha256(content).hexdigest()}\"")
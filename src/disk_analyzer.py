@@ -0,0 +1,166 @@
+import json
+import os
+import platform
+import re
+import socket
+import threading
+from network_backend import make_request, result_json
+from update_checker import parse_model_reference
+
+LOCAL_ADDRESSES = ("localhost", "127.0.0.1", "::1", "0.0.0.0")
+_BLOB_PATTERN = re.compile(r'sha256[-:]([0-9a-f]{64})')
+
+
+def default_models_dir():
+    """Ollama 模型目录：OLLAMA_MODELS 环境变量，否则为用户目录下的 .ollama/models"""
+    if os.environ.get("OLLAMA_MODELS"):
+        return os.environ["OLLAMA_MODELS"]
+    home_dir = os.path.join(os.path.expanduser("~"), ".ollama", "models")
+    # Linux 上以系统服务安装时，模型保存在 ollama 用户的目录下
+    service_dir = "/usr/share/ollama/.ollama/models"
+    if platform.system() == "Linux" and not os.path.isdir(home_dir) and os.path.isdir(service_dir):
+        return service_dir
+    return home_dir
+
+
+def is_local_address(address):
+    """服务器是否运行在本机（只有本机服务器才能直接读取模型目录）"""
+    return address in LOCAL_ADDRESSES or address in (socket.gethostname(), socket.getfqdn())
+
+
+def manifest_path(models_dir, model_name):
+    """模型名称对应的 manifest 文件：manifests/<registry>/<namespace>/<model>/<tag>"""
+    registry, repository, tag = parse_model_reference(model_name)
+    host = registry.split("://", 1)[-1]
+    return os.path.join(models_dir, "manifests", host, *repository.split("/"), tag)
+
+
+def blob_path(models_dir, digest):
+    """blob 文件路径，文件名中用 "-" 代替摘要中的 ":" """
+    return os.path.join(models_dir, "blobs", digest.replace(":", "-"))
+
+
+def read_manifest(path):
+    """读取 manifest 中引用的 blob，返回 {摘要: 大小}（包括 config）"""
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    layers = list(manifest.get("layers", []))
+    if manifest.get("config"):
+        layers.append(manifest["config"])
+    return {layer["digest"]: layer.get("size", 0) for layer in layers if layer.get("digest")}
+
+
+def local_model_layers(models_dir, model):
+    """从本机模型目录读取模型引用的 blob"""
+    return read_manifest(manifest_path(models_dir, model["name"]))
+
+
+def parse_show_layers(show_data, model_size):
+    """从 /api/show 的 modelfile 中提取 FROM/ADAPTER 引用的 blob
+
+    /api/show 不返回各 blob 的大小：权重 blob（第一个 FROM）按 /api/tags 的模型大小计，
+    其余 blob（适配器、投影层等）大小记为 0，模板和参数等小文件不计入
+    """
+    layers = {}
+    for line in (show_data or {}).get("modelfile", "").splitlines():
+        if not line.upper().startswith(("FROM ", "ADAPTER ")):
+            continue
+        match = _BLOB_PATTERN.search(line)
+        if match:
+            layers.setdefault(f"sha256:{match.group(1)}", 0 if layers else model_size)
+    return layers
+
+
+class DiskAnalyzer:
+    """blob 级磁盘占用分析：建立 blob -> 模型的引用索引，计算实际占用、共享大小和每个模型可回收的大小"""
+
+    def __init__(self, network):
+        self.network = network
+        self._source = None
+        self._models = {}     # 模型名称 -> (digest, {blob 摘要: 大小})
+        self._refs = {}       # blob 摘要 -> set(模型名称)
+        self._blob_sizes = {}
+        self._lock = threading.Lock()
+
+    def _add(self, name, digest, layers):
+        self._models[name] = (digest, layers)
+        for blob, size in layers.items():
+            self._refs.setdefault(blob, set()).add(name)
+            self._blob_sizes[blob] = max(size, self._blob_sizes.get(blob, 0))
+
+    def _remove(self, name):
+        _, layers = self._models.pop(name)
+        for blob in layers:
+            models = self._refs.get(blob, set())
+            models.discard(name)
+            if not models:
+                self._refs.pop(blob, None)
+                self._blob_sizes.pop(blob, None)
+
+    def update(self, base_url, models, models_dir=None):
+        """用 /api/tags 的模型列表增量更新索引：只为新增或摘要变化的模型读取 manifest
+
+        models_dir 不为空时直接读取本机模型目录，否则通过 /api/show 获取
+        """
+        source = (base_url, models_dir)
+        with self._lock:
+            if source != self._source:
+                self._source = source
+                self._models, self._refs, self._blob_sizes = {}, {}, {}
+            current = {model["name"]: model for model in models}
+            for name in [name for name, (digest, _) in self._models.items()
+                         if name not in current or current[name].get("digest", "") != digest]:
+                self._remove(name)
+            changed = [model for name, model in current.items() if name not in self._models]
+
+        loaded = {}
+        if models_dir:
+            for model in changed:
+                try:
+                    loaded[model["name"]] = local_model_layers(models_dir, model)
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"❌ 读取模型 manifest 失败 {model['name']}: {str(e)}\n")
+        elif changed:
+            specs = [make_request(f"{base_url}/show", "POST", {"model": model["name"]}, timeout=10)
+                     for model in changed]
+            for model, result in zip(changed, self.network.request_many(specs)):
+                layers = parse_show_layers(result_json(result), model.get("size", 0))
+                if layers:
+                    loaded[model["name"]] = layers
+
+        with self._lock:
+            for model in changed:
+                if model["name"] in loaded:
+                    self._add(model["name"], model.get("digest", ""), loaded[model["name"]])
+        return self.report(models)
+
+    def report(self, models=()):
+        """磁盘占用报告：按 /api/tags 相加的大小、去重后的实际占用、共享大小，以及每个模型删除后可回收的大小"""
+        with self._lock:
+            listed_bytes = sum(model.get("size", 0) for model in models if model.get("name") in self._models)
+            # 读取不到 manifest 的模型仍按 /api/tags 的大小计入总占用
+            unindexed_bytes = sum(model.get("size", 0) for model in models if model.get("name") not in self._models)
+            unique_bytes = sum(self._blob_sizes.values())
+            shared_bytes = sum(self._blob_sizes[blob] for blob, names in self._refs.items() if len(names) > 1)
+            rows = []
+            for name, (_, layers) in sorted(self._models.items()):
+                exclusive = sum(self._blob_sizes[blob] for blob in layers if len(self._refs[blob]) == 1)
+                shared = sum(self._blob_sizes[blob] for blob in layers if len(self._refs[blob]) > 1)
+                rows.append({"name": name, "blobs": len(layers), "reclaimableBytes": exclusive,
+                             "sharedBytes": shared, "sharedWith": sorted({other for blob in layers
+                                                                         for other in self._refs[blob]
+                                                                         if other != name})})
+            return {
+                "listedBytes": listed_bytes,
+                "uniqueBytes": unique_bytes,
+                "sharedBytes": shared_bytes,
+                "savedBytes": max(listed_bytes - unique_bytes, 0),
+                "diskBytes": unique_bytes + unindexed_bytes,
+                "blobs": len(self._blob_sizes),
+                "models": rows
+            }
+
+    def referenced_blobs(self):
+        """索引中所有被引用的 blob 摘要"""
+        with self._lock:
+            return set(self._refs)
@@ -1,9 +1,10 @@
 import os
 import time
-import hashlib
-import requests
 from typing import Optional, Callable
 from PyQt6.QtCore import QObject, pyqtSignal, QThread
+from resumable_transfer import ResumableTransfer, TransferError
+from segmented_download import DEFAULT_SEGMENTS, MIN_SEGMENT_SIZE, SegmentedDownloader, SegmentedDownloadError, probe_url
+from stream_hash import StreamingHasher, verify_digests
 
 
 class UpdateDownloader(QObject):
@@ -30,14 +31,22 @@ class UpdateDownloader(QObject):
         self.speed_callback = None
         self.eta_callback = None
         self.expected_md5 = ""
+        self.expected_sha256 = ""
+        # 下载时边写边算的摘要，同一个对象在重试和续传之间保持，避免重新读取已下载的部分
+        self.hasher = StreamingHasher()
         self.timeout = 30
         self.max_retries = 3
         self.retry_count = 0
+        self.segments = DEFAULT_SEGMENTS
 
     def set_download_url(self, url: str):
+        if url != self.download_url:
+            self.hasher.reset()
         self.download_url = url
 
     def set_save_path(self, path: str):
+        if path != self.save_path:
+            self.hasher.reset()
         self.save_path = path
         self.temp_file = path + ".tmp"
 
@@ -47,6 +56,9 @@ class UpdateDownloader(QObject):
     def set_expected_md5(self, md5: str):
         self.expected_md5 = md5
 
+    def set_expected_sha256(self, sha256: str):
+        self.expected_sha256 = sha256
+
     def set_timeout(self, timeout: int):
         self.timeout = timeout
 
@@ -56,6 +68,10 @@ class UpdateDownloader(QObject):
     def set_chunk_size(self, size: int):
         self.chunk_size = size
 
+    def set_segments(self, segments: int):
+        """并行下载的连接数，1 表示始终使用单连接下载"""
+        self.segments = max(int(segments), 1)
+
     def set_progress_callback(self, callback: Callable[[float], None]):
         self.progress_callback = callback
 
@@ -82,90 +98,120 @@ class UpdateDownloader(QObject):
         self.cancel_event = threading.Event()
         
         self.downloadStarted.emit(self.download_url)
-        
+
+        # 已有单连接下载的断点时继续单连接下载
+        if self.segments > 1 and not os.path.exists(self.temp_file + ".meta"):
+            file_info = self.get_file_info(self.download_url)
+            if file_info['supports_range'] and file_info['size'] >= MIN_SEGMENT_SIZE * 2:
+                self.file_size = file_info['size']
+                result = self._download_segmented(file_info['etag'], file_info['last_modified'])
+                if result is not None:
+                    return result
+                # 服务器实际不支持分段，从头单连接下载
+                self.downloaded_size = 0
+                if os.path.exists(self.temp_file):
+                    os.remove(self.temp_file)
+
         return self._download()
 
-    def _download(self) -> bool:
+    def _download_segmented(self, etag: str, last_modified: str = "") -> Optional[bool]:
+        """多连接分段下载，服务器不支持分段时返回 None 由调用方回退到单连接下载"""
+        start_time = time.time()
+        last_update_time = [start_time]
+
+        def on_progress(downloaded, total):
+            self.downloaded_size = downloaded
+            current_time = time.time()
+            if current_time - last_update_time[0] <= 0.5:
+                return
+            last_update_time[0] = current_time
+            elapsed = current_time - start_time
+            self._emit_progress(downloaded, total, (downloaded / elapsed) if elapsed > 0 else 0)
+
+        downloader = SegmentedDownloader(self.download_url, self.temp_file, self.file_size, etag=etag,
+                                         last_modified=last_modified, segments=self.segments, timeout=self.timeout,
+                                         max_retries=self.max_retries, cancel_event=self.cancel_event,
+                                         pause_check=lambda: self.is_paused, on_progress=on_progress,
+                                         hasher=self.hasher)
         try:
-            response = requests.get(self.download_url, stream=True, timeout=self.timeout)
-            
-            if response.status_code == 200:
-                total_size = int(response.headers.get('content-length', self.file_size))
-                self.file_size = total_size if total_size > 0 else self.file_size
-                
-                start_time = time.time()
-                last_update_time = start_time
-                
-                mode = 'ab' if self.downloaded_size > 0 else 'wb'
-                with open(self.temp_file, mode) as f:
-                    for chunk in response.iter_content(chunk_size=self.chunk_size):
-                        if self.cancel_event and self.cancel_event.is_set():
-                            self.is_downloading = False
-                            self.downloadCancelled.emit()
-                            return False
-                        
-                        while self.is_paused:
-                            if self.cancel_event and self.cancel_event.is_set():
-                                self.is_downloading = False
-                                self.downloadCancelled.emit()
-                                return False
-                            time.sleep(0.1)
-                        
-                        if chunk:
-                            f.write(chunk)
-                            self.downloaded_size += len(chunk)
-                            
-                            current_time = time.time()
-                            if current_time - last_update_time > 0.5:
-                                progress = (self.downloaded_size / self.file_size * 100) if self.file_size > 0 else 0
-                                elapsed = current_time - start_time
-                                speed = (self.downloaded_size / elapsed) if elapsed > 0 else 0
-                                speed_str = self._format_speed(speed)
-                                eta_str = self._calculate_eta(self.downloaded_size, self.file_size, speed)
-                                
-                                self.downloadProgress.emit(progress, speed_str, eta_str)
-                                
-                                if self.progress_callback:
-                                    self.progress_callback(progress)
-                                if self.speed_callback:
-                                    self.speed_callback(speed_str)
-                                if self.eta_callback:
-                                    self.eta_callback(eta_str)
-                                
-                                last_update_time = current_time
-                
-                if self._verify_file():
-                    os.rename(self.temp_file, self.save_path)
-                    self.is_downloading = False
-                    self.downloadComplete.emit(self.save_path)
-                    return True
-                else:
-                    self._cleanup()
-                    self.downloadFailed.emit("文件验证失败")
-                    return False
-            else:
-                self._cleanup()
-                self.downloadFailed.emit(f"下载失败，状态码: {response.status_code}")
-                return False
-                
-        except requests.exceptions.Timeout:
-            if self.retry_count < self.max_retries:
-                self.retry_count += 1
-                time.sleep(2)
-                return self._download()
-            else:
-                self._cleanup()
-                self.downloadFailed.emit("下载超时")
-                return False
+            completed = downloader.download()
+        except SegmentedDownloadError as e:
+            print(f"⚠️  分段下载不可用，改用单连接下载: {str(e)}\n")
+            downloader.discard()
+            return None
         except Exception as e:
-            if self.retry_count < self.max_retries:
-                self.retry_count += 1
-                time.sleep(2)
-                return self._download()
-            else:
-                self._cleanup()
-                self.downloadFailed.emit(f"下载失败: {str(e)}")
-                return False
+            # 段映射保留在临时文件旁，下次下载可以从已完成的位置继续
+            self.is_downloading = False
+            self.downloadFailed.emit(f"下载失败: {str(e)}")
+            return False
+
+        if not completed:
+            self.is_downloading = False
+            self.downloadCancelled.emit()
+            return False
+        return self._finish_download()
+
+    def _emit_progress(self, downloaded: int, total: int, speed: float):
+        progress = (downloaded / total * 100) if total > 0 else 0
+        speed_str = self._format_speed(speed)
+        eta_str = self._calculate_eta(downloaded, total, speed)
+
+        self.downloadProgress.emit(progress, speed_str, eta_str)
+
+        if self.progress_callback:
+            self.progress_callback(progress)
+        if self.speed_callback:
+            self.speed_callback(speed_str)
+        if self.eta_callback:
+            self.eta_callback(eta_str)
+
+    def _download(self) -> bool:
+        """单连接下载，临时文件旁有续传信息时从已下载的位置继续"""
+        start_time = time.time()
+        last_update_time = [start_time]
+        transfer = ResumableTransfer(self.download_url, self.temp_file, chunk_size=self.chunk_size,
+                                     timeout=self.timeout, max_retries=self.max_retries,
+                                     cancel_check=lambda: bool(self.cancel_event and self.cancel_event.is_set()),
+                                     pause_check=lambda: self.is_paused, hasher=self.hasher)
+        initial_size = transfer.resume_offset()
+
+        def on_progress(downloaded, total):
+            self.downloaded_size = downloaded
+            self.file_size = total or self.file_size
+            current_time = time.time()
+            if current_time - last_update_time[0] <= 0.5:
+                return
+            last_update_time[0] = current_time
+            # 速度只按本次传输的字节计算
+            elapsed = current_time - start_time
+            speed = (downloaded - initial_size) / elapsed if elapsed > 0 else 0
+            self._emit_progress(downloaded, self.file_size, speed)
+
+        transfer.on_progress = on_progress
+        try:
+            completed = transfer.run()
+        except TransferError as e:
+            # 临时文件和续传信息保留，下次下载从断点继续
+            self.is_downloading = False
+            self.downloadFailed.emit(str(e))
+            return False
+
+        if not completed:
+            self.is_downloading = False
+            self.downloadCancelled.emit()
+            return False
+        self.downloaded_size = transfer.downloaded
+        return self._finish_download()
+
+    def _finish_download(self) -> bool:
+        if self._verify_file():
+            os.replace(self.temp_file, self.save_path)
+            self.is_downloading = False
+            self.downloadComplete.emit(self.save_path)
+            return True
+        self._cleanup()
+        self.downloadFailed.emit("文件验证失败")
+        return False
 
     def pause_download(self):
         if self.is_downloading and not self.is_paused:
@@ -184,19 +230,25 @@ class UpdateDownloader(QObject):
     def _verify_file(self) -> bool:
         if not os.path.exists(self.temp_file):
             return False
-        
-        if not self.expected_md5:
+
+        if not self.expected_md5 and not self.expected_sha256:
             return True
-        
+
         try:
-            md5_hash = hashlib.md5()
-            with open(self.temp_file, 'rb') as f:
-                for chunk in iter(lambda: f.read(8192), b''):
-                    md5_hash.update(chunk)
-            return md5_hash.hexdigest() == self.expected_md5
-        except:
+            # 摘要已在下载时计算，这里只补算未经过数据流的部分（正常情况下没有）
+            self.hasher.sync(self.temp_file, os.path.getsize(self.temp_file))
+            error = verify_digests(self.hasher.hexdigests(),
+                                   {"md5": self.expected_md5, "sha256": self.expected_sha256})
+            if error:
+                print(f"❌ {error}\n")
+            return not error
+        except OSError:
             return False
 
+    def get_digests(self) -> dict:
+        """最近一次下载的摘要（md5、sha256）"""
+        return self.hasher.hexdigests()
+
     def _format_speed(self, speed: float) -> str:
         if speed > 1024 * 1024 * 1024:
             return f"{speed / (1024 * 1024 * 1024):.2f} GB/s"
@@ -219,8 +271,10 @@ class UpdateDownloader(QObject):
 
     def _cleanup(self):
         self.is_downloading = False
-        if os.path.exists(self.temp_file):
-            os.remove(self.temp_file)
+        self.hasher.reset()
+        for path in (self.temp_file, self.temp_file + ".segments", self.temp_file + ".meta"):
+            if os.path.exists(path):
+                os.remove(path)
 
     def get_download_progress(self) -> float:
         if self.file_size > 0:
@@ -243,7 +297,8 @@ class UpdateDownloader(QObject):
         return self.temp_file
 
     def can_resume(self) -> bool:
-        return os.path.exists(self.temp_file) and self.downloaded_size > 0
+        return os.path.exists(self.temp_file) and (os.path.exists(self.temp_file + ".meta")
+                                                   or os.path.exists(self.temp_file + ".segments"))
 
     def reset(self):
         self._cleanup()
@@ -257,30 +312,13 @@ class UpdateDownloader(QObject):
         self.retry_count = 0
 
     def get_file_info(self, url: str) -> dict:
-        try:
-            response = requests.head(url, timeout=10)
-            if response.status_code == 200:
-                return {
-                    'size': int(response.headers.get('content-length', 0)),
-                    'content_type': response.headers.get('content-type', ''),
-                    'supports_range': 'accept-ranges' in response.headers
-                }
-        except:
-            pass
-        return {
-            'size': 0,
-            'content_type': '',
-            'supports_range': False
-        }
-
-    def download_with_resume(self, url: str, save_path: str, expected_md5: str = "") -> bool:
+        return probe_url(url)
+
+    def download_with_resume(self, url: str, save_path: str, expected_md5: str = "",
+                             expected_sha256: str = "") -> bool:
         self.set_download_url(url)
         self.set_save_path(save_path)
         self.set_expected_md5(expected_md5)
-        
-        if self.can_resume():
-            file_info = self.get_file_info(url)
-            if file_info['supports_range']:
-                self.downloaded_size = os.path.getsize(self.temp_file)
-        
+        self.set_expected_sha256(expected_sha256)
+        # 续传位置由临时文件旁的续传信息（单连接）或段映射（分段）决定，start_download 会自动继续
         return self.start_download()
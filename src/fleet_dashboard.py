@@ -0,0 +1,132 @@
+import threading
+import time
+from network_backend import make_request, api_url, server_key, result_json
+
+
+def format_model_entry(model):
+    """把 /api/tags 中的模型转换为界面使用的结构，确保包含必要的属性"""
+    return {
+        "name": model.get("name", ""),
+        "size": model.get("size", 0),
+        "digest": model.get("digest", ""),
+        "details": model.get("details", {}),
+        "modified_at": model.get("modified_at", "")
+    }
+
+
+def listed_size(models):
+    """/api/tags 中模型大小之和，同一摘要的多个标签只计一次；
+    不同模型共享的层无法从 /api/tags 得知，因此这不是实际磁盘占用（实际占用见 DiskAnalyzer）
+    """
+    sizes = {}
+    for model in models:
+        sizes[model.get("digest") or model.get("name")] = model.get("size", 0)
+    return sum(sizes.values())
+
+
+def format_disk_usage(total_size):
+    """磁盘占用统一以 GB 显示，保留一位小数"""
+    return f"{total_size / (1024 * 1024 * 1024):.1f} GB"
+
+
+def format_vram_usage(total_vram):
+    """显存占用按大小选择合适的单位"""
+    if total_vram == 0:
+        return "0 B"
+    elif total_vram < 1024 * 1024:
+        return f"{total_vram} B"
+    elif total_vram < 1024 * 1024 * 1024:
+        return f"{(total_vram / (1024 * 1024)):.1f} MB"
+    return f"{(total_vram / (1024 * 1024 * 1024)):.1f} GB"
+
+
+class FleetSnapshotCache:
+    """每台服务器的仪表盘快照缓存（模型列表、活跃模型、模型大小、显存），并发刷新"""
+
+    def __init__(self, timeout=3):
+        self.timeout = timeout
+        self._snapshots = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            return self._snapshots.get(key)
+
+    def refresh(self, network, servers, callback=None):
+        """并发拉取各服务器的 /api/tags 和 /api/ps，完成后调用 callback(snapshots)"""
+        servers = [dict(server) for server in servers]
+        specs = []
+        for server in servers:
+            base_url = api_url(server["address"], server["port"])
+            specs.append(make_request(f"{base_url}/tags", timeout=self.timeout))
+            specs.append(make_request(f"{base_url}/ps", timeout=self.timeout))
+
+        def on_results(results):
+            snapshots = {}
+            for index, server in enumerate(servers):
+                tags_result, ps_result = results[index * 2], results[index * 2 + 1]
+                snapshots[server_key(server)] = self._build_snapshot(server, tags_result, ps_result)
+            with self._lock:
+                self._snapshots.update(snapshots)
+            if callback:
+                callback(snapshots)
+
+        network.submit_many(specs, on_results)
+
+    def prune(self, servers):
+        """移除不在服务器列表中的快照"""
+        keys = {server_key(server) for server in servers}
+        with self._lock:
+            for key in list(self._snapshots):
+                if key not in keys:
+                    del self._snapshots[key]
+
+    def _build_snapshot(self, server, tags_result, ps_result):
+        tags_data = result_json(tags_result)
+        ps_data = result_json(ps_result) or {}
+        models = [format_model_entry(model) for model in (tags_data or {}).get("models", [])]
+        active_models = ps_data.get("models", [])
+        return {
+            "key": server_key(server),
+            "name": server.get("name", ""),
+            "online": tags_data is not None,
+            "models": models,
+            "activeModels": active_models,
+            "listedBytes": listed_size(models),
+            "vramBytes": sum(model.get("size_vram", 0) for model in active_models),
+            "latency": round(tags_result["latency"], 1),
+            "fetchedAt": time.time()
+        }
+
+    def summary(self, servers):
+        """计算集群汇总（模型数、模型大小合计、显存、已加载模型）及每台服务器的概要"""
+        rows = []
+        totals = {"servers": len(servers), "online": 0, "models": 0, "uniqueModels": 0,
+                  "loadedModels": 0, "listedBytes": 0, "vramBytes": 0}
+        unique_models = set()
+        with self._lock:
+            for server in servers:
+                snapshot = self._snapshots.get(server_key(server))
+                if not snapshot:
+                    continue
+                if snapshot["online"]:
+                    totals["online"] += 1
+                totals["models"] += len(snapshot["models"])
+                totals["loadedModels"] += len(snapshot["activeModels"])
+                totals["listedBytes"] += snapshot["listedBytes"]
+                totals["vramBytes"] += snapshot["vramBytes"]
+                unique_models.update(model["name"] for model in snapshot["models"])
+                rows.append({
+                    "key": snapshot["key"],
+                    "name": snapshot["name"],
+                    "online": snapshot["online"],
+                    "models": len(snapshot["models"]),
+                    "loadedModels": len(snapshot["activeModels"]),
+                    "listedUsage": format_disk_usage(snapshot["listedBytes"]),
+                    "vramUsage": format_vram_usage(snapshot["vramBytes"]),
+                    "fetchedAt": snapshot["fetchedAt"]
+                })
+        totals["uniqueModels"] = len(unique_models)
+        totals["listedUsage"] = format_disk_usage(totals["listedBytes"])
+        totals["vramUsage"] = format_vram_usage(totals["vramBytes"])
+        return {"totals": totals, "servers": rows}
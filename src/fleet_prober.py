@@ -0,0 +1,131 @@
+import threading
+import time
+from collections import deque
+from network_backend import make_request, api_url, server_key, result_json
+
+# 每台服务器保留的探测样本数
+DEFAULT_WINDOW = 120
+
+
+def is_reachable(result):
+    """服务器是否在线：收到任何 HTTP 响应即视为可达（旧版本或代理可能对 /api/version 返回 404）"""
+    return result["status"] > 0
+
+
+def percentile(values, pct):
+    """计算百分位数（线性插值），values 为空时返回 0"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * pct / 100.0
+    lower = int(rank)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (rank - lower)
+
+
+class LatencyStats:
+    """单台服务器的滚动延迟与可用性统计"""
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.latencies = deque(maxlen=window)  # 仅记录成功探测的延迟
+        self.outcomes = deque(maxlen=window)   # 每次探测是否成功
+        self.last_ok = False
+        self.last_latency = 0.0
+        self.last_checked = 0.0
+        self.version = ""
+
+    def record(self, ok, latency, version=""):
+        self.outcomes.append(ok)
+        self.last_ok = ok
+        self.last_checked = time.time()
+        if ok:
+            self.latencies.append(latency)
+            self.last_latency = latency
+            if version:
+                self.version = version
+        else:
+            self.last_latency = 0.0
+
+    def snapshot(self):
+        latencies = list(self.latencies)
+        checks = len(self.outcomes)
+        return {
+            "online": self.last_ok,
+            "latency": round(self.last_latency, 1),
+            "p50": round(percentile(latencies, 50), 1),
+            "p95": round(percentile(latencies, 95), 1),
+            "p99": round(percentile(latencies, 99), 1),
+            "availability": round(sum(self.outcomes) / checks * 100, 1) if checks else 0.0,
+            "checks": checks,
+            "version": self.version,
+            "lastChecked": self.last_checked
+        }
+
+
+class FleetProber:
+    """并发探测所有服务器（/api/version），维护每台服务器的滚动统计"""
+
+    def __init__(self, window=DEFAULT_WINDOW, timeout=2):
+        self.window = window
+        self.timeout = timeout
+        self._stats = {}
+        self._lock = threading.Lock()
+        self._probing = False
+
+    def _stats_for(self, key):
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = LatencyStats(self.window)
+            self._stats[key] = stats
+        return stats
+
+    def record(self, address, port, ok, latency, version=""):
+        """记录一次探测结果（单台服务器的连接测试也会汇入统计）"""
+        with self._lock:
+            self._stats_for(server_key({"address": address, "port": port})).record(ok, latency, version)
+
+    def probe(self, network, servers, callback):
+        """并发探测全部服务器，完成后调用 callback(snapshot)；上一轮未结束时跳过"""
+        with self._lock:
+            if self._probing:
+                return False
+            self._probing = True
+        servers = [dict(server) for server in servers]
+        specs = [make_request(f"{api_url(server['address'], server['port'])}/version", timeout=self.timeout)
+                 for server in servers]
+
+        def on_results(results):
+            try:
+                with self._lock:
+                    for server, result in zip(servers, results):
+                        version = (result_json(result) or {}).get("version", "")
+                        self._stats_for(server_key(server)).record(is_reachable(result), result["latency"], version)
+                    # 清理已删除服务器的统计
+                    keys = {server_key(server) for server in servers}
+                    for key in list(self._stats):
+                        if key not in keys:
+                            del self._stats[key]
+            finally:
+                with self._lock:
+                    self._probing = False
+            callback(self.snapshot(servers))
+
+        network.submit_many(specs, on_results)
+        return True
+
+    def snapshot(self, servers):
+        """按服务器列表顺序返回健康统计，供 QML 作为模型使用"""
+        rows = []
+        with self._lock:
+            for server in servers:
+                key = server_key(server)
+                stats = self._stats.get(key)
+                row = stats.snapshot() if stats else LatencyStats(self.window).snapshot()
+                row.update({
+                    "key": key,
+                    "name": server.get("name", ""),
+                    "address": server.get("address", ""),
+                    "port": server.get("port", "")
+                })
+                rows.append(row)
+        return rows
@@ -6,6 +6,11 @@ import json
 import time
 from typing import Optional, List, Dict, Any
 from PyQt6.QtCore import QObject, pyqtSignal
+from binary_patch import PatchError, apply_patches
+from resumable_transfer import ResumableTransfer, TransferError
+from zip_extract import extract_update, read_zip_manifest
+from backup_store import BackupStore
+from staged_install import StagedInstall
 
 
 class UpdateInstaller(QObject):
@@ -28,11 +33,15 @@ class UpdateInstaller(QObject):
         self.backup_enabled = True
         self.backup_path = ""
         self.install_manifest = None
-        self.ignore_patterns = ['*.pyc', '__pycache__', '*.log', '.git']
+        self.backup_store = None
+        self.staged_install = None
+        self.ignore_patterns = ['*.pyc', '__pycache__', '*.log', '.git', '.staging']
 
     def set_project_root(self, path: str):
         self.project_root = path
         self.backup_dir = os.path.join(path, "backup")
+        self.backup_store = BackupStore(self.backup_dir, self.ignore_patterns)
+        self.staged_install = StagedInstall(path)
         self.temp_dir = os.path.join(path, "temp")
         os.makedirs(self.backup_dir, exist_ok=True)
         os.makedirs(self.temp_dir, exist_ok=True)
@@ -45,6 +54,8 @@ class UpdateInstaller(QObject):
 
     def set_ignore_patterns(self, patterns: List[str]):
         self.ignore_patterns = patterns
+        if self.backup_store:
+            self.backup_store.ignore_patterns = patterns
 
     def install_update(self, update_file: str = None) -> bool:
         if self.is_installing:
@@ -65,6 +76,8 @@ class UpdateInstaller(QObject):
             self._extract_update()
             
             self._load_install_manifest()
+
+            self._apply_patches()
             
             if self.backup_enabled:
                 self._backup_current_version()
@@ -93,8 +106,10 @@ class UpdateInstaller(QObject):
         
         self.installProgress.emit(10, "正在解压更新包...")
         
-        with zipfile.ZipFile(self.update_file, 'r') as zip_ref:
-            zip_ref.extractall(self.extract_dir)
+        # 清单直接从压缩包读取，只解压要安装的文件
+        extract_update(self.update_file, self.extract_dir,
+                       on_progress=lambda done, total: self.installProgress.emit(
+                           10 + (done / total * 10 if total else 0), "正在解压更新包..."))
         
         self.installProgress.emit(20, "解压完成")
 
@@ -112,99 +127,74 @@ class UpdateInstaller(QObject):
                 'version_file': 'src/__init__.py'
             }
 
+    def _apply_patches(self):
+        """应用清单中的二进制补丁，结果暂存在解压目录中，随其他文件一起安装"""
+        if not self.install_manifest.get('patches'):
+            return
+        self.installProgress.emit(25, "正在应用二进制补丁...")
+        result = apply_patches(self.install_manifest, self.project_root, self.extract_dir,
+                               download_fallback=self._download_fallback,
+                               log_callback=lambda message: self.installProgress.emit(25, message))
+        self.installProgress.emit(28, f"补丁完成: {len(result['patched'])} 个已应用，"
+                                      f"{len(result['fallback'])} 个使用完整文件")
+
+    def _download_fallback(self, url: str, path: str) -> bool:
+        try:
+            if not ResumableTransfer(url, path + ".part").run():
+                return False
+        except TransferError as e:
+            raise PatchError(str(e))
+        os.replace(path + ".part", path)
+        return True
+
     def _backup_current_version(self):
         version = self.install_manifest.get('version', 'backup')
         timestamp = time.strftime("%Y%m%d_%H%M%S")
-        self.backup_path = os.path.join(self.backup_dir, f"backup_{version}_{timestamp}")
-        
-        os.makedirs(self.backup_path, exist_ok=True)
         
         self.installProgress.emit(30, "正在备份当前版本...")
         
         files_to_backup = self.install_manifest.get('files', [])
         
         if files_to_backup:
-            for file_info in files_to_backup:
-                src_path = os.path.join(self.project_root, file_info['path'])
-                if os.path.exists(src_path):
-                    dest_path = os.path.join(self.backup_path, file_info['path'])
-                    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-                    if os.path.isdir(src_path):
-                        shutil.copytree(src_path, dest_path, 
-                                      ignore=shutil.ignore_patterns(*self.ignore_patterns))
-                    else:
-                        shutil.copy2(src_path, dest_path)
+            paths = [file_info['path'] for file_info in files_to_backup]
         else:
-            ui_dir = os.path.join(self.project_root, "ui")
-            if os.path.exists(ui_dir):
-                shutil.copytree(ui_dir, os.path.join(self.backup_path, "ui"),
-                              ignore=shutil.ignore_patterns(*self.ignore_patterns))
-            
-            version_file = os.path.join(self.project_root, "src", "__init__.py")
-            if os.path.exists(version_file):
-                shutil.copy2(version_file, os.path.join(self.backup_path, "__init__.py"))
-            
-            config_dir = os.path.join(self.project_root, "config")
-            if os.path.exists(config_dir):
-                shutil.copytree(config_dir, os.path.join(self.backup_path, "config"),
-                              ignore=shutil.ignore_patterns(*self.ignore_patterns))
+            paths = ["ui", "src/__init__.py", "config"]
         
-        backup_info_file = os.path.join(self.backup_path, "backup_info.json")
-        with open(backup_info_file, 'w', encoding='utf-8') as f:
-            json.dump({
-                'version': version,
-                'timestamp': timestamp,
-                'backup_path': self.backup_path
-            }, f, indent=2, ensure_ascii=False)
+        # 未变化的文件以硬链接指向对象库中已有的内容，只有变化的文件占用新空间
+        index = self.backup_store.create_snapshot(
+            self.project_root, paths, f"backup_{version}_{timestamp}", {'version': version, 'timestamp': timestamp},
+            on_progress=lambda done, total: self.installProgress.emit(30 + done / total * 10,
+                                                                      f"正在备份当前版本 ({done}/{total})..."))
+        self.backup_path = index['backup_path']
         
-        self.installProgress.emit(40, "备份完成")
+        self.installProgress.emit(40, f"备份完成，新增 {self.format_size(index['newBytes'])}")
         self.backupCreated.emit(self.backup_path)
 
     def _install_files(self):
         files_to_install = self.install_manifest.get('files', [])
         
+        # 新版本先在暂存目录中构建，安装目录中的文件在换入之前保持不变
+        self.installProgress.emit(45, "正在暂存新版本...")
+        self.staged_install.log_callback = lambda message: self.installProgress.emit(85, message)
+        # 文件在 I/O 线程池中并行放置，进度按时间间隔合并后报告
+        self.staged_install.on_progress = lambda done, total: self.installProgress.emit(
+            45 + done / total * 40, f"正在暂存新版本 ({done}/{total})...")
+        info = {'backup_path': self.backup_path if self.backup_enabled else ''}
         if files_to_install:
-            total_files = len(files_to_install)
-            for i, file_info in enumerate(files_to_install):
-                progress = 40 + (i / total_files) * 50
-                src_path = os.path.join(self.extract_dir, file_info['path'])
-                dest_path = os.path.join(self.project_root, file_info['path'])
-                
-                if os.path.exists(src_path):
-                    self.installProgress.emit(progress, f"正在安装: {file_info['path']}")
-                    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
-                    
-                    if os.path.isdir(src_path):
-                        if os.path.exists(dest_path):
-                            shutil.rmtree(dest_path)
-                        shutil.copytree(src_path, dest_path)
-                    else:
-                        shutil.copy2(src_path, dest_path)
+            self.staged_install.stage_manifest(self.extract_dir, self.install_manifest, move=True, info=info)
         else:
-            self.installProgress.emit(50, "正在安装UI文件...")
+            files = {}
             ui_dir = os.path.join(self.extract_dir, "ui")
             if os.path.exists(ui_dir):
-                dest_ui_dir = os.path.join(self.project_root, "ui")
-                if os.path.exists(dest_ui_dir):
-                    shutil.rmtree(dest_ui_dir)
-                shutil.copytree(ui_dir, dest_ui_dir)
-            
-            self.installProgress.emit(70, "正在安装版本文件...")
+                files["ui"] = ui_dir
             version_file = os.path.join(self.extract_dir, "__init__.py")
             if os.path.exists(version_file):
-                dest_version_file = os.path.join(self.project_root, "src", "__init__.py")
-                shutil.copy2(version_file, dest_version_file)
+                files["src/__init__.py"] = version_file
+            self.staged_install.stage(files, self.install_manifest.get('delete_files', []), move=True, info=info)
         
-        delete_files = self.install_manifest.get('delete_files', [])
-        if delete_files:
-            self.installProgress.emit(90, "正在清理旧文件...")
-            for file_path in delete_files:
-                full_path = os.path.join(self.project_root, file_path)
-                if os.path.exists(full_path):
-                    if os.path.isdir(full_path):
-                        shutil.rmtree(full_path)
-                    else:
-                        os.remove(full_path)
+        self.installProgress.emit(85, "正在换入新版本...")
+        # 换入失败时已恢复原来的文件，StagedInstallError 由 install_update 统一处理
+        self.staged_install.swap()
         
         self.installProgress.emit(95, "正在验证安装...")
         self._verify_installation()
@@ -246,23 +236,34 @@ class UpdateInstaller(QObject):
             
             self.installProgress.emit(10, "正在恢复备份...")
             
-            for item in os.listdir(self.backup_path):
-                if item == "backup_info.json":
-                    continue
+            index = BackupStore.load_index(self.backup_path)
+            journal = self.staged_install.load_journal() or {}
+            if self.staged_install.can_rollback() and journal.get('info', {}).get('backup_path') == self.backup_path:
+                # 恢复本次安装前的备份：暂存安装保留了上一个版本，直接改名换回
+                self.staged_install.rollback()
+            elif index and 'files' in index:
+                # 内容寻址的快照按索引恢复，并删除备份范围内之后新增的文件
+                self.backup_store.restore(self.backup_path, self.project_root,
+                                          on_progress=lambda done, total: self.installProgress.emit(
+                                              10 + done / total * 85, f"正在恢复备份 ({done}/{total})..."))
+            else:
+                for item in os.listdir(self.backup_path):
+                    if item == "backup_info.json":
+                        continue
                 
-                src_path = os.path.join(self.backup_path, item)
-                dest_path = os.path.join(self.project_root, item)
+                    src_path = os.path.join(self.backup_path, item)
+                    dest_path = os.path.join(self.project_root, item)
                 
-                if os.path.exists(dest_path):
-                    if os.path.isdir(dest_path):
-                        shutil.rmtree(dest_path)
-                    else:
-                        os.remove(dest_path)
+                    if os.path.exists(dest_path):
+                        if os.path.isdir(dest_path):
+                            shutil.rmtree(dest_path)
+                        else:
+                            os.remove(dest_path)
                 
-                if os.path.isdir(src_path):
-                    shutil.copytree(src_path, dest_path)
-                else:
-                    shutil.copy2(src_path, dest_path)
+                    if os.path.isdir(src_path):
+                        shutil.copytree(src_path, dest_path)
+                    else:
+                        shutil.copy2(src_path, dest_path)
             
             self.installProgress.emit(100, "备份恢复完成")
             self.backupRestored.emit()
@@ -301,7 +302,12 @@ class UpdateInstaller(QObject):
     def delete_backup(self, backup_path: str) -> bool:
         try:
             if os.path.exists(backup_path):
-                shutil.rmtree(backup_path)
+                index = BackupStore.load_index(backup_path)
+                if index and 'files' in index:
+                    # 同时回收不再被任何备份引用的对象
+                    self.backup_store.delete_snapshot(backup_path)
+                else:
+                    shutil.rmtree(backup_path)
                 return True
         except Exception as e:
             self.installFailed.emit(f"删除备份失败: {str(e)}")
@@ -321,6 +327,10 @@ class UpdateInstaller(QObject):
         return deleted_count
 
     def get_backup_size(self, backup_path: str) -> int:
+        index = BackupStore.load_index(backup_path)
+        if index and 'size' in index:
+            return index['size']
+        
         total_size = 0
         try:
             for dirpath, dirnames, filenames in os.walk(backup_path):
@@ -331,6 +341,10 @@ class UpdateInstaller(QObject):
             pass
         return total_size
 
+    def get_backup_usage(self) -> Dict[str, int]:
+        """所有备份的逻辑大小和去重后实际占用的大小（由快照索引计算）"""
+        return self.backup_store.usage() if self.backup_store else {}
+
     def format_size(self, size_bytes: int) -> str:
         if size_bytes > 1024 * 1024 * 1024:
             return f"{size_bytes / (1024 * 1024 * 1024):.2f} GB"
@@ -370,21 +384,10 @@ class UpdateInstaller(QObject):
             if not os.path.exists(update_file):
                 return None
             
-            temp_extract = os.path.join(self.temp_dir, "info_extract")
-            os.makedirs(temp_extract, exist_ok=True)
-            
-            with zipfile.ZipFile(update_file, 'r') as zip_ref:
-                zip_ref.extractall(temp_extract)
-            
-            manifest_file = os.path.join(temp_extract, "update_manifest.json")
-            if os.path.exists(manifest_file):
-                with open(manifest_file, 'r', encoding='utf-8') as f:
-                    info = json.load(f)
-                    info['file_size'] = os.path.getsize(update_file)
-                    return info
-            
-            shutil.rmtree(temp_extract)
-            return None
+            info = read_zip_manifest(update_file)
+            if info is not None:
+                info['file_size'] = os.path.getsize(update_file)
+            return info
             
         except:
             return None
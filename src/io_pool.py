@@ -0,0 +1,125 @@
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Callable, Iterable, List, Optional
+
+DEFAULT_WORKERS = min(8, (os.cpu_count() or 1) * 2)
+# 每个线程最多排队的任务数，大量文件时不会一次创建全部 Future
+QUEUE_FACTOR = 4
+# 进度报告的最小间隔（秒）
+PROGRESS_INTERVAL = 0.1
+
+
+class IOPool:
+    """有界的文件 I/O 线程池：复制、计算摘要、移动和 fsync 在多个线程中并行执行
+
+    排队的任务数不超过线程数的 QUEUE_FACTOR 倍；进度按时间间隔合并后报告，
+    最后一个任务完成时总会报告一次，不会每个文件发出一次信号。
+    一个任务失败后不再提交剩余任务，等待已提交的任务结束后抛出第一个异常
+    """
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, on_progress: Optional[Callable[[int, int], None]] = None,
+                 interval: float = PROGRESS_INTERVAL):
+        self.workers = max(int(workers), 1)
+        self.on_progress = on_progress
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._done = 0
+        self._total = 0
+        self._last_report = 0.0
+
+    def _advance(self):
+        with self._lock:
+            self._done += 1
+            done = self._done
+            now = time.monotonic()
+            if done < self._total and now - self._last_report < self.interval:
+                return
+            self._last_report = now
+        if self.on_progress:
+            self.on_progress(done, self._total)
+
+    def _run(self, func: Callable, results: list, index: int, item):
+        results[index] = func(item)
+        self._advance()
+
+    def map(self, func: Callable, items: Iterable) -> List:
+        """对每一项并行执行 func，按输入顺序返回结果"""
+        items = list(items)
+        results = [None] * len(items)
+        self._done, self._total, self._last_report = 0, len(items), time.monotonic()
+        if not items:
+            return results
+        error = None
+        with ThreadPoolExecutor(max_workers=min(self.workers, len(items)), thread_name_prefix="io") as executor:
+            pending = set()
+            for index, item in enumerate(items):
+                if len(pending) >= self.workers * QUEUE_FACTOR:
+                    finished, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    error = next((future.exception() for future in finished if future.exception()), None)
+                    if error:
+                        break
+                pending.add(executor.submit(self._run, func, results, index, item))
+            finished, _ = wait(pending)
+            error = error or next((future.exception() for future in finished if future.exception()), None)
+        if error:
+            raise error
+        return results
+
+
+def _run_benchmark(file_count: int, file_kb: int, workers: List[int]):
+    """用合成的更新包（file_count 个文件）比较不同线程数下备份和暂存安装的耗时"""
+    import shutil
+    import tempfile
+    from backup_store import BackupStore
+    from staged_install import StagedInstall
+
+    work_dir = tempfile.mkdtemp(prefix="io-pool-")
+    install_dir = os.path.join(work_dir, "install")
+    package_dir = os.path.join(work_dir, "package")
+    for root in (install_dir, package_dir):
+        for index in range(file_count):
+            path = os.path.join(root, "ui", f"part{index // 100}", f"file{index}.qml")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, 'wb') as f:
+                f.write(os.urandom(file_kb * 1024))
+    print(f"合成更新包: {file_count} 个文件，共 {file_count * file_kb / 1024:.1f}MB")
+
+    for count in workers:
+        backup_dir = os.path.join(work_dir, "backup")
+        shutil.rmtree(backup_dir, ignore_errors=True)
+        start = time.perf_counter()
+        BackupStore(backup_dir, workers=count).create_snapshot(install_dir, ["ui"])
+        backup_time = time.perf_counter() - start
+
+        staged = StagedInstall(install_dir, workers=count)
+        # 上一轮保留的暂存目录不计入耗时
+        staged.discard()
+        start = time.perf_counter()
+        staged.stage({"ui": os.path.join(package_dir, "ui")})
+        stage_time = time.perf_counter() - start
+        start = time.perf_counter()
+        staged.swap()
+        swap_time = time.perf_counter() - start
+        start = time.perf_counter()
+        staged.rollback()
+        rollback_time = time.perf_counter() - start
+        # 只更新一个文件：同一单位中其余未变化的文件从安装目录建立硬链接
+        staged.discard()
+        start = time.perf_counter()
+        staged.stage({"ui/part0/file0.qml": os.path.join(package_dir, "ui", "part0", "file0.qml")})
+        partial_time = time.perf_counter() - start
+        print(f"{count:>2} 线程: 备份 {backup_time:.2f}s，暂存 {stage_time:.2f}s，"
+              f"换入 {swap_time * 1000:.1f}ms，回滚 {rollback_time * 1000:.1f}ms，单文件暂存 {partial_time:.2f}s")
+    shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="文件安装和备份的并行 I/O 基准测试")
+    parser.add_argument("--files", type=int, default=5000, help="合成更新包中的文件数")
+    parser.add_argument("--size", type=int, default=16, help="每个文件的大小（KB）")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 8], help="要比较的线程数")
+    args = parser.parse_args()
+    _run_benchmark(args.files, args.size, args.workers)
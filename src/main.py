@@ -81,6 +81,7 @@ class MainApplication(QObject):
         self.update_manager = UpdateManager(model_manager=self.model_manager)
         self.engine = QQmlApplicationEngine()
         self.engine.rootContext().setContextProperty("modelManager", self.model_manager)
+        self.engine.rootContext().setContextProperty("installedModels", self.model_manager.model_proxy)
         self.engine.rootContext().setContextProperty("updateManager", self.update_manager)
         self.engine.rootContext().setContextProperty("appVersion", __version__)
         self.engine.rootContext().setContextProperty("debugMode", debug_mode)
@@ -154,4 +155,5 @@ if __name__ == "__main__":
                     pass
     
     main_app.model_manager.getModels()
+    app.aboutToQuit.connect(main_app.model_manager.shutdown)
     sys.exit(app.exec())
\ No newline at end of file
@@ -0,0 +1,118 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from network_backend import make_request, result_json
+
+# 预热时同时发出的 /api/show 请求数
+DEFAULT_MAX_CONCURRENCY = 4
+# license 全文可能很长，缓存中只保留开头部分
+LICENSE_PREVIEW_LENGTH = 500
+
+
+def extract_metadata(show_data):
+    """从 /api/show 的响应中提取界面需要的元数据"""
+    details = show_data.get("details", {}) or {}
+    model_info = show_data.get("model_info", {}) or {}
+    architecture = model_info.get("general.architecture", "")
+    license_text = show_data.get("license", "") or ""
+    return {
+        "family": details.get("family", ""),
+        "families": details.get("families") or [],
+        "format": details.get("format", ""),
+        "parameterSize": details.get("parameter_size", ""),
+        "quantization": details.get("quantization_level", ""),
+        "architecture": architecture,
+        "parameterCount": model_info.get("general.parameter_count", 0),
+        "contextLength": model_info.get(f"{architecture}.context_length", 0),
+        "embeddingLength": model_info.get(f"{architecture}.embedding_length", 0),
+        "capabilities": show_data.get("capabilities") or [],
+        "parameters": show_data.get("parameters", ""),
+        "template": show_data.get("template", ""),
+        "system": show_data.get("system", ""),
+        "license": license_text[:LICENSE_PREVIEW_LENGTH],
+        "modifiedAt": show_data.get("modified_at", "")
+    }
+
+
+class ModelMetadataCache:
+    """以模型 digest 为键的 /api/show 元数据缓存
+
+    digest 是模型内容的摘要，内容不变键就不变，因此缓存条目不会过期；模型更新后 digest 变化，自然会重新获取
+    """
+
+    def __init__(self, network, cache_file, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        self.network = network
+        self.cache_file = cache_file
+        self.max_concurrency = max(int(max_concurrency), 1)
+        self._entries = {}
+        self._lock = threading.Lock()
+        self._warming = set()  # 正在获取的 digest，避免重复请求
+        self.load()
+
+    def load(self):
+        if os.path.exists(self.cache_file):
+            try:
+                with open(self.cache_file, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f)
+            except Exception as e:
+                print(f"❌ Error loading model metadata cache: {str(e)}\n")
+                self._entries = {}
+
+    def save(self):
+        with self._lock:
+            entries = dict(self._entries)
+        try:
+            os.makedirs(os.path.dirname(self.cache_file) or ".", exist_ok=True)
+            with open(self.cache_file, 'w', encoding='utf-8') as f:
+                json.dump(entries, f, indent=2, ensure_ascii=False)
+        except Exception as e:
+            print(f"❌ Error saving model metadata cache: {str(e)}\n")
+
+    def get(self, digest):
+        with self._lock:
+            return self._entries.get(digest)
+
+    def missing(self, models):
+        """缓存中没有、也没有正在获取的模型"""
+        with self._lock:
+            return [model for model in models
+                    if model.get("digest") and model["digest"] not in self._entries
+                    and model["digest"] not in self._warming]
+
+    def warm(self, base_url, models):
+        """并发获取缺少元数据的模型（并发数受 max_concurrency 限制），返回新增的条目数"""
+        pending = {}
+        for model in self.missing(models):
+            pending.setdefault(model["digest"], model["name"])
+        if not pending:
+            return 0
+        with self._lock:
+            self._warming |= set(pending)
+
+        def fetch(item):
+            digest, name = item
+            result = self.network.request(make_request(f"{base_url}/show", "POST", {"model": name}, timeout=10))
+            return digest, result_json(result)
+
+        added = 0
+        try:
+            with ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(pending)),
+                                    thread_name_prefix="metadata") as executor:
+                for digest, show_data in executor.map(fetch, pending.items()):
+                    if show_data is None:
+                        continue
+                    with self._lock:
+                        self._entries[digest] = extract_metadata(show_data)
+                    added += 1
+        finally:
+            with self._lock:
+                self._warming -= set(pending)
+        if added:
+            self.save()
+        return added
+
+    def annotate(self, models):
+        """给模型列表附加缓存中的元数据（没有缓存的模型为空字典）"""
+        with self._lock:
+            return [dict(model, metadata=self._entries.get(model.get("digest", ""), {})) for model in models]
@@ -0,0 +1,347 @@
+import json
+import os
+import threading
+import time
+from fleet_prober import percentile
+from network_backend import make_request, api_url, server_key, result_json
+from unload_engine import UnloadEngine
+
+DEFAULT_PROMPT = "Write one sentence about the sea."
+DEFAULT_NUM_PREDICT = 32
+# 最多保留的历史记录条数
+MAX_HISTORY = 200
+# p50 变慢超过该比例视为性能回退
+REGRESSION_THRESHOLD = 0.2
+
+
+def summarize(values):
+    """样本的统计量（毫秒或 token/s）"""
+    if not values:
+        return {"count": 0, "mean": 0.0, "min": 0.0, "max": 0.0, "p50": 0.0, "p95": 0.0, "p99": 0.0}
+    return {
+        "count": len(values),
+        "mean": round(sum(values) / len(values), 2),
+        "min": round(min(values), 2),
+        "max": round(max(values), 2),
+        "p50": round(percentile(values, 50), 2),
+        "p95": round(percentile(values, 95), 2),
+        "p99": round(percentile(values, 99), 2)
+    }
+
+
+class ModelBenchmark:
+    """测量模型冷加载时间、热启动首 token 延迟和生成速度，结果追加到 JSON 历史记录"""
+
+    def __init__(self, network, history_file, prompt=DEFAULT_PROMPT, num_predict=DEFAULT_NUM_PREDICT,
+                 timeout=300, unload_engine=None):
+        self.network = network
+        self.unload_engine = unload_engine or UnloadEngine(network)
+        self.history_file = history_file
+        self.prompt = prompt
+        self.num_predict = num_predict
+        self.timeout = timeout
+        self.cancel_event = threading.Event()
+
+    def installed_models(self, server):
+        """服务器上已安装的模型名称（与 _get_models 相同的 /api/tags 数据）"""
+        result = self.network.request(make_request(f"{api_url(server['address'], server['port'])}/tags"))
+        return [model.get("name", "") for model in (result_json(result) or {}).get("models", [])]
+
+    def _generate(self, base_url, model_name):
+        """流式生成一次，返回 (首 token 延迟 ms, 总耗时 ms, 最后一行数据)"""
+        spec = make_request(f"{base_url}/generate", "POST", {
+            "model": model_name,
+            "prompt": self.prompt,
+            "stream": True,
+            "options": {"num_predict": self.num_predict}
+        }, timeout=self.timeout)
+        start_time = time.perf_counter()
+        first_token = None
+        final = {}
+        for line in self.network.iter_lines(spec):
+            try:
+                data = json.loads(line)
+            except (ValueError, TypeError):
+                continue
+            if data.get("error"):
+                raise RuntimeError(data["error"])
+            if first_token is None and data.get("response"):
+                first_token = (time.perf_counter() - start_time) * 1000
+            if data.get("done"):
+                final = data
+                break
+        total = (time.perf_counter() - start_time) * 1000
+        return (first_token if first_token is not None else total), total, final
+
+    @staticmethod
+    def _tokens_per_second(final, first_token, total):
+        # 优先使用服务器统计的 eval_count / eval_duration（纳秒），没有时按客户端时间估算
+        eval_count = final.get("eval_count", 0)
+        eval_duration = final.get("eval_duration", 0)
+        if eval_count and eval_duration:
+            return eval_count / (eval_duration / 1e9)
+        generation_time = (total - first_token) / 1000
+        return eval_count / generation_time if eval_count and generation_time > 0 else 0.0
+
+    def run_model(self, server, model_name, repeat=3, on_progress=None):
+        """对一台服务器上的一个模型执行 repeat 次冷启动和 repeat 次热启动测量"""
+        base_url = api_url(server["address"], server["port"])
+        samples = {"coldLoad": [], "coldFirstToken": [], "warmFirstToken": [], "tokensPerSecond": []}
+        errors = []
+
+        for index in range(repeat):
+            if self.cancel_event.is_set():
+                break
+            try:
+                # 冷启动：先卸载模型并确认已从 /api/ps 消失，再测量加载和首 token
+                unloaded, message = self.unload_engine.unload(base_url, model_name)
+                if not unloaded:
+                    raise RuntimeError(message)
+                first_token, total, final = self._generate(base_url, model_name)
+                load_duration = final.get("load_duration", 0) / 1e6
+                samples["coldLoad"].append(load_duration or first_token)
+                samples["coldFirstToken"].append(first_token)
+            except Exception as e:
+                errors.append(f"冷启动第 {index + 1} 次: {str(e)}")
+            if on_progress:
+                on_progress({"server": server.get("name", ""), "model": model_name, "phase": "cold",
+                             "index": index + 1, "repeat": repeat})
+
+        for index in range(repeat):
+            if self.cancel_event.is_set():
+                break
+            try:
+                first_token, total, final = self._generate(base_url, model_name)
+                samples["warmFirstToken"].append(first_token)
+                samples["tokensPerSecond"].append(self._tokens_per_second(final, first_token, total))
+            except Exception as e:
+                errors.append(f"热启动第 {index + 1} 次: {str(e)}")
+            if on_progress:
+                on_progress({"server": server.get("name", ""), "model": model_name, "phase": "warm",
+                             "index": index + 1, "repeat": repeat})
+
+        return {
+            "server": server_key(server),
+            "serverName": server.get("name", ""),
+            "model": model_name,
+            "repeat": repeat,
+            "stats": {metric: summarize(values) for metric, values in samples.items()},
+            "errors": errors
+        }
+
+    def run(self, servers, model_names, repeat=3, on_progress=None):
+        """在每台服务器上测量选中的、且已安装的模型，返回本次运行记录；未被取消时写入历史"""
+        self.cancel_event.clear()
+        started_at = time.time()
+        results = []
+        for server in servers:
+            installed = set(self.installed_models(server))
+            for model_name in model_names:
+                if self.cancel_event.is_set():
+                    break
+                if model_name not in installed:
+                    print(f"⚠️  {server.get('name', '')} 未安装 {model_name}，跳过基准测试\n")
+                    continue
+                results.append(self.run_model(server, model_name, repeat, on_progress))
+
+        run = {
+            "startedAt": started_at,
+            "finishedAt": time.time(),
+            "prompt": self.prompt,
+            "numPredict": self.num_predict,
+            "cancelled": self.cancel_event.is_set(),
+            "results": results
+        }
+        if run["cancelled"]:
+            # 取消的运行样本不完整，不写入历史，也不作为之后比较性能回退的基准
+            run["regressions"] = []
+            print("⚠️  基准测试已取消，结果不写入历史\n")
+            return run
+        run["regressions"] = self.find_regressions(run, self.load_history())
+        self.append_history(run)
+        return run
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def load_history(self):
+        if os.path.exists(self.history_file):
+            try:
+                with open(self.history_file, 'r', encoding='utf-8') as f:
+                    return json.load(f)
+            except Exception as e:
+                print(f"❌ Error loading benchmark history: {str(e)}\n")
+        return []
+
+    def append_history(self, run):
+        history = (self.load_history() + [run])[-MAX_HISTORY:]
+        try:
+            os.makedirs(os.path.dirname(self.history_file) or ".", exist_ok=True)
+            with open(self.history_file, 'w', encoding='utf-8') as f:
+                json.dump(history, f, indent=2, ensure_ascii=False)
+        except Exception as e:
+            print(f"❌ Error saving benchmark history: {str(e)}\n")
+
+    @staticmethod
+    def find_regressions(run, history, threshold=REGRESSION_THRESHOLD):
+        """与同一服务器、同一模型的上一次结果比较 p50，找出变慢超过阈值的指标"""
+        previous = {}
+        for old_run in history:
+            for result in old_run.get("results", []):
+                previous[(result["server"], result["model"])] = result["stats"]
+
+        regressions = []
+        for result in run["results"]:
+            old_stats = previous.get((result["server"], result["model"]))
+            if not old_stats:
+                continue
+            for metric, stats in result["stats"].items():
+                old_p50 = old_stats.get(metric, {}).get("p50", 0)
+                new_p50 = stats["p50"]
+                if not old_p50 or not new_p50:
+                    continue
+                # tokensPerSecond 越大越好，其余指标越小越好
+                change = (old_p50 - new_p50) / old_p50 if metric == "tokensPerSecond" else (new_p50 - old_p50) / old_p50
+                if change > threshold:
+                    regressions.append({"server": result["server"], "model": result["model"], "metric": metric,
+                                        "previous": old_p50, "current": new_p50, "change": round(change * 100, 1)})
+        return regressions
+
+
+class StubOllamaServer:
+    """模拟 Ollama 的本地桩服务器：/api/tags、/api/ps、流式 /api/generate，可在没有 GPU 的环境中运行基准测试"""
+
+    def __init__(self, models=("stub:latest",), load_delay=0.2, token_delay=0.005, tokens=DEFAULT_NUM_PREDICT):
+        from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+        self.models = list(models)
+        self.load_delay = load_delay
+        self.token_delay = token_delay
+        self.tokens = tokens
+        self.loaded = set()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, data):
+                body = json.dumps(data).encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == "/api/tags":
+                    self._send_json({"models": [{"name": name, "size": 1024 ** 3, "digest": "stub"}
+                                                for name in stub.models]})
+                elif self.path == "/api/ps":
+                    self._send_json({"models": [{"name": name, "size_vram": 1024 ** 3} for name in stub.loaded]})
+                elif self.path == "/api/version":
+                    self._send_json({"version": "stub"})
+                else:
+                    self.send_error(404)
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length) or b"{}")
+                model_name = request.get("model", "")
+                if self.path != "/api/generate" or model_name not in stub.models:
+                    self.send_error(404)
+                    return
+                if request.get("keep_alive") in (0, "0", "0s"):
+                    stub.loaded.discard(model_name)
+                    self._send_json({"model": model_name, "done": True, "done_reason": "unload"})
+                    return
+
+                start_time = time.perf_counter()
+                load_duration = 0
+                if model_name not in stub.loaded:
+                    time.sleep(stub.load_delay)
+                    stub.loaded.add(model_name)
+                    load_duration = int((time.perf_counter() - start_time) * 1e9)
+                if not request.get("prompt"):
+                    self._send_json({"model": model_name, "done": True, "load_duration": load_duration})
+                    return
+
+                count = request.get("options", {}).get("num_predict", stub.tokens)
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                eval_start = time.perf_counter()
+                for index in range(count):
+                    time.sleep(stub.token_delay)
+                    self._write_chunk({"model": model_name, "response": f"t{index} ", "done": False})
+                self._write_chunk({"model": model_name, "response": "", "done": True,
+                                   "load_duration": load_duration, "eval_count": count,
+                                   "eval_duration": int((time.perf_counter() - eval_start) * 1e9)})
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _write_chunk(self, data):
+                line = json.dumps(data).encode() + b"\n"
+                self.wfile.write(f"{len(line):x}\r\n".encode() + line + b"\r\n")
+                self.wfile.flush()
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return {"name": "stub", "address": "127.0.0.1", "port": self.port}
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def _print_run(run):
+    for result in run["results"]:
+        print(f"{result['serverName']} / {result['model']}")
+        for metric, stats in result["stats"].items():
+            print(f"  {metric:>16}: p50 {stats['p50']:>9.2f}  p95 {stats['p95']:>9.2f}  "
+                  f"p99 {stats['p99']:>9.2f}  ({stats['count']} 次)")
+        for error in result["errors"]:
+            print(f"  ❌ {error}")
+    for regression in run["regressions"]:
+        print(f"⚠️  性能回退 {regression['server']} {regression['model']} {regression['metric']}: "
+              f"{regression['previous']} -> {regression['current']} ({regression['change']}%)")
+
+
+if __name__ == "__main__":
+    import argparse
+    from network_backend import ThreadNetworkBackend
+
+    parser = argparse.ArgumentParser(description="模型加载时间与首 token 延迟基准测试")
+    parser.add_argument("--server", action="append", default=[], help="服务器地址 address:port，可重复")
+    parser.add_argument("--model", action="append", default=[], help="要测试的模型，可重复")
+    parser.add_argument("--repeat", type=int, default=3, help="冷/热启动各重复次数")
+    parser.add_argument("--num-predict", type=int, default=DEFAULT_NUM_PREDICT, help="每次生成的 token 数")
+    parser.add_argument("--history", default=os.path.join("config", "benchmark_history.json"),
+                        help="历史记录文件")
+    parser.add_argument("--stub", action="store_true", help="使用本地桩服务器（CI 中使用）")
+    args = parser.parse_args()
+
+    stub_server = None
+    if args.stub:
+        stub_server = StubOllamaServer(args.model or ["stub:latest"])
+        servers = [stub_server.start()]
+    else:
+        servers = []
+        for value in args.server or ["127.0.0.1:11434"]:
+            address, _, port = value.rpartition(":")
+            servers.append({"name": value, "address": address, "port": int(port)})
+
+    network = ThreadNetworkBackend(8)
+    benchmark = ModelBenchmark(network, args.history, num_predict=args.num_predict)
+    models = args.model or benchmark.installed_models(servers[0])
+    _print_run(benchmark.run(servers, models, args.repeat))
+    network.shutdown()
+    if stub_server:
+        stub_server.stop()
@@ -0,0 +1,147 @@
+import threading
+from bulk_operations import parse_modified_at
+
+
+class ModelInventory:
+    """跨服务器模型索引：按模型名称和摘要记录每台服务器上的模型，支持增量更新"""
+
+    def __init__(self):
+        self._hosts = {}        # key -> {模型名称: (digest, modified_at)}
+        self._host_names = {}   # key -> 服务器名称
+        self._by_name = {}      # 模型名称 -> {digest: set(key)}
+        self._lock = threading.Lock()
+
+    def update_host(self, key, name, models):
+        """用一台服务器的最新模型列表更新索引，只处理发生变化的条目，返回是否有变化"""
+        new_entries = {model["name"]: (model.get("digest", ""), model.get("modified_at", ""))
+                       for model in models}
+        with self._lock:
+            self._host_names[key] = name
+            old_entries = self._hosts.get(key, {})
+            if old_entries == new_entries:
+                return False
+
+            for model_name, (digest, _) in old_entries.items():
+                if new_entries.get(model_name, (None,))[0] != digest:
+                    self._unindex(model_name, digest, key)
+            for model_name, (digest, _) in new_entries.items():
+                if old_entries.get(model_name, (None,))[0] != digest:
+                    self._by_name.setdefault(model_name, {}).setdefault(digest, set()).add(key)
+            self._hosts[key] = new_entries
+            return True
+
+    def _unindex(self, model_name, digest, key):
+        digests = self._by_name.get(model_name, {})
+        hosts = digests.get(digest)
+        if hosts is None:
+            return
+        hosts.discard(key)
+        if not hosts:
+            del digests[digest]
+        if not digests:
+            self._by_name.pop(model_name, None)
+
+    def remove_host(self, key):
+        with self._lock:
+            for model_name, (digest, _) in self._hosts.pop(key, {}).items():
+                self._unindex(model_name, digest, key)
+            self._host_names.pop(key, None)
+
+    def retain_hosts(self, keys):
+        """移除不在服务器列表中的服务器"""
+        with self._lock:
+            stale_keys = [key for key in self._hosts if key not in keys]
+        for key in stale_keys:
+            self.remove_host(key)
+
+    def _host(self, key):
+        return {"key": key, "name": self._host_names.get(key, key)}
+
+    def _latest_digest(self, model_name):
+        """以修改时间最新的摘要作为参考版本（不同服务器的时区和小数位数不同，按解析后的时间比较）"""
+        latest_digest, latest_time = "", None
+        for digest, hosts in self._by_name.get(model_name, {}).items():
+            for key in hosts:
+                modified_at = parse_modified_at(self._hosts[key][model_name][1])
+                if modified_at is None:
+                    if not latest_digest:
+                        latest_digest = digest
+                    continue
+                if latest_time is None or modified_at >= latest_time:
+                    latest_digest, latest_time = digest, modified_at
+        return latest_digest
+
+    def hosts_missing(self, model_name):
+        """没有该模型的服务器"""
+        with self._lock:
+            having = set()
+            for hosts in self._by_name.get(model_name, {}).values():
+                having |= hosts
+            return [self._host(key) for key in sorted(self._hosts) if key not in having]
+
+    def outdated_hosts(self, model_name, reference_digest=""):
+        """模型摘要与参考摘要不同的服务器（默认以最新修改的摘要为参考）"""
+        with self._lock:
+            reference = reference_digest or self._latest_digest(model_name)
+            rows = []
+            for digest, hosts in self._by_name.get(model_name, {}).items():
+                if digest == reference:
+                    continue
+                for key in sorted(hosts):
+                    row = self._host(key)
+                    row.update({"digest": digest, "expectedDigest": reference})
+                    rows.append(row)
+            return rows
+
+    def single_host_models(self):
+        """只存在于一台服务器上的模型"""
+        with self._lock:
+            rows = []
+            for model_name, digests in sorted(self._by_name.items()):
+                hosts = set()
+                for digest_hosts in digests.values():
+                    hosts |= digest_hosts
+                if len(hosts) == 1:
+                    row = self._host(next(iter(hosts)))
+                    row["model"] = model_name
+                    rows.append(row)
+            return rows
+
+    def diff(self, key_a, key_b):
+        """比较两台服务器的模型：仅 A 有、仅 B 有、摘要不同、完全相同"""
+        with self._lock:
+            models_a = self._hosts.get(key_a, {})
+            models_b = self._hosts.get(key_b, {})
+            different = [{"name": name, "digestA": models_a[name][0], "digestB": models_b[name][0]}
+                         for name in sorted(models_a.keys() & models_b.keys())
+                         if models_a[name][0] != models_b[name][0]]
+            return {
+                "hostA": self._host(key_a),
+                "hostB": self._host(key_b),
+                "onlyA": sorted(models_a.keys() - models_b.keys()),
+                "onlyB": sorted(models_b.keys() - models_a.keys()),
+                "differentDigest": different,
+                "same": len(models_a.keys() & models_b.keys()) - len(different)
+            }
+
+    def latest_digests(self):
+        """每个模型在集群中最新的 digest"""
+        with self._lock:
+            return {model_name: self._latest_digest(model_name) for model_name in self._by_name}
+
+    def host_models(self, key):
+        """一台服务器上的 {模型名称: digest}"""
+        with self._lock:
+            return {name: entry[0] for name, entry in self._hosts.get(key, {}).items()}
+
+    def summary(self):
+        """每个模型所在的服务器数和摘要版本数"""
+        with self._lock:
+            rows = []
+            for model_name, digests in sorted(self._by_name.items()):
+                hosts = set()
+                for digest_hosts in digests.values():
+                    hosts |= digest_hosts
+                rows.append({"name": model_name, "hosts": len(hosts), "digests": len(digests),
+                             "missing": len(self._hosts) - len(hosts)})
+            return rows
@@ -0,0 +1,345 @@
+import re
+from PyQt6.QtCore import (QAbstractListModel, QModelIndex, QSortFilterProxyModel, Qt, pyqtProperty, pyqtSignal,
+                          pyqtSlot)
+from bulk_operations import parse_modified_at
+
+_SIZE_UNITS = {"": 1, "K": 1e3, "M": 1e6, "B": 1e9, "T": 1e12}
+
+
+def parse_parameter_size(value, model_name=""):
+    """把 "8.0B"、"270M" 这样的参数量转为数字，details 中没有时从模型标签（如 :8b）推断"""
+    match = re.match(r'^\s*([\d.]+)\s*([KMBT]?)', str(value or ""), re.IGNORECASE)
+    if not match:
+        match = re.search(r'[:\-](\d+(?:\.\d+)?)([mb])\b', model_name, re.IGNORECASE)
+    if not match:
+        return 0.0
+    try:
+        return float(match.group(1)) * _SIZE_UNITS[match.group(2).upper()]
+    except ValueError:
+        return 0.0
+
+
+def quantization_rank(value):
+    """量化等级的排序键：按位数排序，位数相同再按名称（Q4_0 < Q4_K_M < Q8_0 < F16）"""
+    match = re.search(r'(\d+)', str(value or ""))
+    return (int(match.group(1)) if match else 0, str(value or "").upper())
+
+
+class InstalledModelListModel(QAbstractListModel):
+    """已安装模型的列表模型：每行是一台服务器上的一个模型，排序键和搜索文本在写入时预先计算"""
+
+    ROLE_NAMES = ("name", "size", "digest", "modifiedAt", "family", "parameterSize", "quantization",
+                  "contextLength", "serverKey", "serverName")
+    _ROLES = {Qt.ItemDataRole.UserRole + index: name for index, name in enumerate(ROLE_NAMES)}
+    ROLE_IDS = {name: role for role, name in _ROLES.items()}
+
+    countChanged = pyqtSignal()
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._rows = []       # 每行的数据字典，包含预先计算的 sortKeys 和 search
+        self._index = {}      # (serverKey, 模型名称) -> 行号
+        self._metadata = None  # digest -> 元数据，由 setMetadataSource 设置
+
+    def roleNames(self):
+        return {role: name.encode() for role, name in self._ROLES.items()}
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._rows)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or not 0 <= index.row() < len(self._rows):
+            return None
+        if role == Qt.ItemDataRole.DisplayRole:
+            role = self.ROLE_IDS["name"]
+        name = self._ROLES.get(role)
+        return self._rows[index.row()][name] if name else None
+
+    @pyqtProperty(int, notify=countChanged)
+    def count(self):
+        return len(self._rows)
+
+    def row(self, row):
+        return self._rows[row]
+
+    def setMetadataSource(self, get_metadata):
+        """get_metadata(digest) 返回缓存的 /api/show 元数据，用于补充上下文长度等字段"""
+        self._metadata = get_metadata
+
+    def _make_row(self, server_key, server_name, model):
+        details = model.get("details", {}) or {}
+        metadata = (self._metadata(model.get("digest", "")) if self._metadata else None) or {}
+        name = model.get("name", "")
+        family = details.get("family", "") or metadata.get("family", "")
+        parameter_size = details.get("parameter_size", "") or metadata.get("parameterSize", "")
+        quantization = details.get("quantization_level", "") or metadata.get("quantization", "")
+        row = {
+            "name": name,
+            "size": model.get("size", 0),
+            "digest": model.get("digest", ""),
+            "modifiedAt": model.get("modified_at", ""),
+            "family": family,
+            "parameterSize": parameter_size,
+            "quantization": quantization,
+            "contextLength": metadata.get("contextLength", 0),
+            "serverKey": server_key,
+            "serverName": server_name
+        }
+        row["sortKeys"] = {
+            "name": name.lower(),
+            "size": row["size"],
+            "modifiedAt": parse_modified_at(row["modifiedAt"]) or 0.0,
+            "family": family.lower(),
+            "parameterSize": parse_parameter_size(parameter_size, name),
+            "quantization": quantization_rank(quantization),
+            "contextLength": row["contextLength"],
+            "serverName": server_name.lower()
+        }
+        row["search"] = " ".join((name, family, parameter_size, quantization, server_name)).lower()
+        return row
+
+    def _reindex(self):
+        self._index = {(row["serverKey"], row["name"]): position for position, row in enumerate(self._rows)}
+
+    @pyqtSlot(str, str, list)
+    def setServerModels(self, server_key, server_name, models):
+        """增量更新一台服务器的模型：只插入、删除或修改发生变化的行"""
+        new_rows = {model.get("name", ""): self._make_row(server_key, server_name, model) for model in models}
+
+        # 从后往前删除，避免行号变化
+        removed = [position for (key, name), position in self._index.items()
+                   if key == server_key and name not in new_rows]
+        for position in sorted(removed, reverse=True):
+            self.beginRemoveRows(QModelIndex(), position, position)
+            del self._rows[position]
+            self.endRemoveRows()
+        if removed:
+            self._reindex()
+
+        appended = []
+        for name, row in new_rows.items():
+            position = self._index.get((server_key, name))
+            if position is None:
+                appended.append(row)
+            elif self._rows[position] != row:
+                self._rows[position] = row
+                model_index = self.index(position)
+                self.dataChanged.emit(model_index, model_index)
+        if appended:
+            start = len(self._rows)
+            self.beginInsertRows(QModelIndex(), start, start + len(appended) - 1)
+            self._rows.extend(appended)
+            self.endInsertRows()
+            self._reindex()
+        if removed or appended:
+            self.countChanged.emit()
+
+    @pyqtSlot(list)
+    def retainServers(self, server_keys):
+        """移除不在服务器列表中的服务器的模型"""
+        keys = set(server_keys)
+        for server_key in {row["serverKey"] for row in self._rows} - keys:
+            self.setServerModels(server_key, "", [])
+
+    @pyqtSlot()
+    def refreshMetadata(self):
+        """元数据缓存更新后，重新计算受影响的行"""
+        for position, row in enumerate(self._rows):
+            model = {"name": row["name"], "size": row["size"], "digest": row["digest"],
+                     "modified_at": row["modifiedAt"],
+                     "details": {"family": row["family"], "parameter_size": row["parameterSize"],
+                                 "quantization_level": row["quantization"]}}
+            new_row = self._make_row(row["serverKey"], row["serverName"], model)
+            if new_row != row:
+                self._rows[position] = new_row
+                model_index = self.index(position)
+                self.dataChanged.emit(model_index, model_index)
+
+
+class ModelFilterProxyModel(QSortFilterProxyModel):
+    """已安装模型的筛选、排序和分组：使用源模型中预先计算的排序键和搜索文本
+
+    输入的筛选文本在上一次的基础上变长时（继续输入），只需重新检查上一次匹配的行
+    """
+
+    filterChanged = pyqtSignal()
+    sortChanged = pyqtSignal()
+    countChanged = pyqtSignal()
+
+    SORT_KEYS = ("name", "size", "modifiedAt", "family", "parameterSize", "quantization", "contextLength",
+                 "serverName")
+    GROUP_KEYS = ("", "family", "quantization", "parameterSize", "serverName")
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._text = ""
+        self._terms = []
+        self._family = ""
+        self._quantization = ""
+        self._server_key = ""
+        self._sort_key = "name"
+        self._descending = False
+        self._group_by = ""
+        self._matched = None           # 上一次文本筛选匹配的行 (serverKey, 模型名称)，用于增量筛选
+        self._previous_matched = None
+        self._narrowing = False
+        self.setDynamicSortFilter(True)
+        self.rowsInserted.connect(self.countChanged)
+        self.rowsRemoved.connect(self.countChanged)
+        self.modelReset.connect(self.countChanged)
+        self.layoutChanged.connect(self.countChanged)
+
+    @pyqtProperty(int, notify=countChanged)
+    def count(self):
+        return self.rowCount()
+
+    def _refilter(self):
+        self.invalidateFilter()
+        self.countChanged.emit()
+        self.filterChanged.emit()
+
+    @pyqtProperty(str, notify=filterChanged)
+    def filterText(self):
+        return self._text
+
+    @filterText.setter
+    def filterText(self, text):
+        text = text.strip().lower()
+        if text == self._text:
+            return
+        # 新文本包含旧文本时结果只会更少，可以只检查上一次匹配的行
+        self._narrowing = bool(self._text) and text.startswith(self._text) and self._matched is not None
+        previous_matched = self._matched if self._narrowing else None
+        self._text = text
+        self._terms = text.split()
+        self._matched = set()
+        self._previous_matched = previous_matched
+        self._refilter()
+        self._narrowing = False
+
+    @pyqtProperty(str, notify=filterChanged)
+    def family(self):
+        return self._family
+
+    @family.setter
+    def family(self, family):
+        if family != self._family:
+            self._family = family
+            self._matched = None
+            self._refilter()
+
+    @pyqtProperty(str, notify=filterChanged)
+    def quantization(self):
+        return self._quantization
+
+    @quantization.setter
+    def quantization(self, quantization):
+        if quantization != self._quantization:
+            self._quantization = quantization
+            self._matched = None
+            self._refilter()
+
+    @pyqtProperty(str, notify=filterChanged)
+    def serverKey(self):
+        """只显示该服务器的模型，空字符串表示全部服务器"""
+        return self._server_key
+
+    @serverKey.setter
+    def serverKey(self, server_key):
+        if server_key != self._server_key:
+            self._server_key = server_key
+            self._matched = None
+            self._refilter()
+
+    @pyqtProperty(str, notify=sortChanged)
+    def sortKey(self):
+        return self._sort_key
+
+    @sortKey.setter
+    def sortKey(self, sort_key):
+        if sort_key in self.SORT_KEYS and sort_key != self._sort_key:
+            self._sort_key = sort_key
+            self._resort()
+
+    @pyqtProperty(bool, notify=sortChanged)
+    def descending(self):
+        return self._descending
+
+    @descending.setter
+    def descending(self, descending):
+        if descending != self._descending:
+            self._descending = descending
+            self._resort()
+
+    @pyqtProperty(str, notify=sortChanged)
+    def groupBy(self):
+        """分组字段（配合 ListView 的 section.property 使用），组内再按 sortKey 排序"""
+        return self._group_by
+
+    @groupBy.setter
+    def groupBy(self, group_by):
+        if group_by in self.GROUP_KEYS and group_by != self._group_by:
+            self._group_by = group_by
+            self._resort()
+
+    def _resort(self):
+        self.invalidate()
+        self.sort(0, Qt.SortOrder.DescendingOrder if self._descending else Qt.SortOrder.AscendingOrder)
+        self.sortChanged.emit()
+
+    def setSourceModel(self, source_model):
+        super().setSourceModel(source_model)
+        self.sort(0, Qt.SortOrder.AscendingOrder)
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        row = self.sourceModel().row(source_row)
+        if self._server_key and row["serverKey"] != self._server_key:
+            return False
+        if self._family and row["family"] != self._family:
+            return False
+        if self._quantization and row["quantization"] != self._quantization:
+            return False
+        if not self._terms:
+            return True
+        row_id = (row["serverKey"], row["name"])
+        if self._narrowing and row_id not in self._previous_matched:
+            return False
+        if all(term in row["search"] for term in self._terms):
+            if self._matched is not None:
+                self._matched.add(row_id)
+            return True
+        return False
+
+    def lessThan(self, left, right):
+        source = self.sourceModel()
+        left_row, right_row = source.row(left.row()), source.row(right.row())
+        left_key = left_row["sortKeys"][self._sort_key]
+        right_key = right_row["sortKeys"][self._sort_key]
+        if self._group_by:
+            # 分组字段始终升序，组内顺序由 descending 决定
+            left_group = left_row["sortKeys"][self._group_by]
+            right_group = right_row["sortKeys"][self._group_by]
+            if left_group != right_group:
+                return (left_group < right_group) != self._descending
+        return left_key < right_key
+
+    @pyqtSlot(result=list)
+    def families(self):
+        """源模型中出现的模型系列，用于筛选下拉框"""
+        source = self.sourceModel()
+        return sorted({source.row(position)["family"] for position in range(source.rowCount())} - {""})
+
+    @pyqtSlot(result=list)
+    def quantizations(self):
+        source = self.sourceModel()
+        values = {source.row(position)["quantization"] for position in range(source.rowCount())} - {""}
+        return sorted(values, key=quantization_rank)
+
+    @pyqtSlot(int, result='QVariant')
+    def get(self, proxy_row):
+        """按代理行号取得模型数据"""
+        source_index = self.mapToSource(self.index(proxy_row, 0))
+        if not source_index.isValid():
+            return {}
+        row = self.sourceModel().row(source_index.row())
+        return {name: row[name] for name in InstalledModelListModel.ROLE_NAMES}
@@ -6,7 +6,22 @@ import weakref
 import subprocess
 import platform
 from bs4 import BeautifulSoup
-from PyQt6.QtCore import QObject, pyqtSignal, QRunnable, QThreadPool, QMetaObject, Qt, Q_ARG, pyqtProperty, pyqtSlot
+from PyQt6.QtCore import QObject, pyqtSignal, QRunnable, QThreadPool, QMetaObject, Qt, Q_ARG, pyqtProperty, pyqtSlot, QTimer
+from warm_keeper import WarmModelKeeper
+from network_backend import create_network_backend, make_request, api_url, server_key, result_json, THREAD_BACKEND, ASYNC_BACKEND
+from fleet_prober import FleetProber, is_reachable
+from fleet_dashboard import FleetSnapshotCache, format_model_entry, format_disk_usage, format_vram_usage
+from model_inventory import ModelInventory
+from sync_planner import FleetSyncRunner, load_desired_state, pinned_models, plan_sync, plan_actions
+from residency_scheduler import ResidencyScheduler, parse_size
+from model_benchmark import ModelBenchmark
+from unload_engine import UnloadEngine
+from bulk_operations import BulkOperationRunner, BULK_OPERATIONS, select_models
+from update_checker import UpdateChecker, DEFAULT_REGISTRY, DEFAULT_TTL, OUTDATED
+from disk_analyzer import DiskAnalyzer, default_models_dir, is_local_address
+from blob_gc import BlobGarbageCollector
+from metadata_cache import ModelMetadataCache
+from model_list_model import InstalledModelListModel, ModelFilterProxyModel
 
 def execute_command(command):
     """执行命令并返回结果"""
@@ -54,6 +69,20 @@ class ModelManager(QObject):
     modelAllVersionsStatusUpdated = pyqtSignal(str)  # 模型所有版本状态更新信号
     settingsUpdated = pyqtSignal()  # 设置更新信号
     unloadModelResult = pyqtSignal(bool, str)  # 模型卸载结果信号 (成功状态, 消息)
+    fleetHealthUpdated = pyqtSignal()  # 服务器集群健康统计更新信号
+    fleetDashboardUpdated = pyqtSignal()  # 集群仪表盘汇总更新信号
+    inventoryUpdated = pyqtSignal()  # 跨服务器模型索引更新信号
+    syncPlanReady = pyqtSignal(list)  # 集群模型同步计划 (每台服务器的拉取/删除列表)
+    syncProgressUpdated = pyqtSignal('QVariant')  # 集群模型同步进度
+    syncFinished = pyqtSignal(bool, str)  # 集群模型同步结束 (是否全部成功, 消息)
+    preloadModelResult = pyqtSignal(bool, str)  # 模型预加载结果信号 (成功状态, 消息)
+    benchmarkProgress = pyqtSignal('QVariant')  # 基准测试进度
+    benchmarkFinished = pyqtSignal('QVariant')  # 基准测试结果 (统计与性能回退)
+    diskAnalysisUpdated = pyqtSignal('QVariant')  # blob 级磁盘占用分析 (实际占用、共享大小、每个模型可回收大小)
+    modelMetadataUpdated = pyqtSignal()  # 模型元数据缓存新增了条目
+    blobGcFinished = pyqtSignal('QVariant')  # 模型目录垃圾回收结果 (未引用 blob、未完成的下载、释放的空间)
+    modelUpdatesChecked = pyqtSignal(list)  # 模型更新检查结果 (每个模型的本地/远程摘要和状态)
+    bulkOperationProgress = pyqtSignal('QVariant')  # 批量操作进度 (汇总进度和单项结果，最后一条 finished 为 true)
 
     def __init__(self):
         super().__init__()
@@ -79,9 +108,49 @@ class ModelManager(QObject):
         self.download_tasks_file = os.path.join(self.project_root, "config", "download_tasks.json")
         self._settings = {}
         self.translation_cache = {}  # 内存缓存，存储翻译结果
+        self.warm_keeper = WarmModelKeeper(self)  # 翻译模型常驻管理
         self.load_config()
         self.load_download_tasks()
         self.load_settings()
+        self.network = create_network_backend(self._settings)  # 网络后端（线程 / asyncio）
+        self.fleet_prober = FleetProber()  # 服务器集群健康探测
+        self._fleet_health = []
+        self.fleet_dashboard = FleetSnapshotCache()  # 每台服务器的仪表盘快照缓存
+        self._fleet_summary = {"totals": {}, "servers": []}
+        self.inventory = ModelInventory()  # 跨服务器模型索引
+        self.desired_models_file = os.path.join(self.project_root, "config", "model_sync.json")
+        sync_settings = self._settings.get('sync', {})
+        self.sync_runner = FleetSyncRunner(os.path.join(self.project_root, "config", "model_sync_state.json"),
+                                           sync_settings.get('per_host_concurrency', 1),
+                                           sync_settings.get('max_hosts', 8))
+        self.unload_engine = UnloadEngine(self.network)  # 确认式卸载，服务器能力按服务器缓存
+        self.bulk_runner = BulkOperationRunner(self._settings.get('bulk', {}).get('concurrency'))
+        self._bulk_pulls = set()  # 批量操作发起的拉取，取消时一并暂停
+        update_settings = self._settings.get('updates', {})
+        self.update_checker = UpdateChecker(self.network, update_settings.get('registry', DEFAULT_REGISTRY),
+                                            update_settings.get('manifest_ttl', DEFAULT_TTL))
+        self._outdated_models = []
+        self.disk_analyzer = DiskAnalyzer(self.network)
+        self.metadata_cache = ModelMetadataCache(self.network,
+                                                 os.path.join(self.project_root, "config", "model_metadata_cache.json"),
+                                                 self._settings.get('metadata', {}).get('max_concurrency', 4))
+        # 已安装模型的列表模型（全部服务器）及筛选/排序代理，默认只显示当前服务器
+        self.model_list = InstalledModelListModel(self)
+        self.model_list.setMetadataSource(self.metadata_cache.get)
+        self.model_proxy = ModelFilterProxyModel(self)
+        self.model_proxy.setSourceModel(self.model_list)
+        self.model_proxy.serverKey = f"{self._server_address}:{self._server_port}"
+        self.modelsUpdated.connect(self._on_models_updated)
+        self.modelMetadataUpdated.connect(self.model_list.refreshMetadata)
+        self.settingsUpdated.connect(self._on_settings_updated)
+        self.residency = ResidencyScheduler(self)  # 按显存预算调度模型常驻
+        self.benchmark = ModelBenchmark(self.network, os.path.join(self.project_root, "config", "benchmark_history.json"),
+                                        unload_engine=self.unload_engine)
+        # 每分钟检查一次定时预加载任务
+        self.residency_timer = QTimer(self)
+        self.residency_timer.setInterval(60000)
+        self.residency_timer.timeout.connect(self._on_residency_tick)
+        self.residency_timer.start()
 
     def load_config(self):
         if os.path.exists(self.config_file):
@@ -375,27 +444,37 @@ class ModelManager(QObject):
     
     @pyqtSlot(str, str)
     def testServerConnectionAsync(self, address, port):
-        """异步测试服务器连接"""
-        worker = APICallWorker(self._test_server_connection, address, port)
-        self.thread_pool.start(worker)
-    
-    def _test_server_connection(self, address, port):
-        """服务器连接测试的实际实现（在后台线程中执行）"""
-        import time
-        start_time = time.time()
-        try:
-            response = requests.get(f"http://{address}:{port}/api/tags", timeout=2)
-            is_connected = response.status_code == 200
-            latency = (time.time() - start_time) * 1000  # 转换为毫秒
-        except Exception as e:
-            is_connected = False
-            latency = 0
-        
+        """异步测试服务器连接（使用轻量的 /api/version，不传输模型列表）"""
+        self.network.submit_many([make_request(f"{api_url(address, port)}/version")],
+                                 lambda results: self._on_server_connection_tested(address, port, results))
+
+    def _on_server_connection_tested(self, address, port, results):
+        """服务器连接测试完成回调（在网络后端线程中执行）"""
+        result = results[0]
+        is_connected = is_reachable(result)
+        latency = result["latency"] if is_connected else 0
+        self.fleet_prober.record(address, port, is_connected, latency)
+
         # 发出信号通知测试结果
         QMetaObject.invokeMethod(self, "serverConnectionTested", Qt.ConnectionType.QueuedConnection,
                                  Q_ARG(bool, is_connected),
                                  Q_ARG(float, latency))
     
+    @pyqtProperty(list, notify=fleetHealthUpdated)
+    def fleetHealth(self):
+        """每台服务器的在线状态、p50/p95/p99 延迟和可用率（与 servers 顺序一致）"""
+        return self._fleet_health
+
+    @pyqtSlot()
+    def probeFleet(self):
+        """并发探测所有服务器的健康状态"""
+        self.fleet_prober.probe(self.network, self._servers, self._on_fleet_probed)
+
+    def _on_fleet_probed(self, health):
+        """集群探测完成回调（在网络后端线程中执行）"""
+        self._fleet_health = health
+        QMetaObject.invokeMethod(self, "fleetHealthUpdated", Qt.ConnectionType.QueuedConnection)
+
     @pyqtSlot(int, str, str, str)
     def updateServer(self, index, name, address, port):
         if 0 <= index < len(self._servers):
@@ -439,13 +518,247 @@ class ModelManager(QObject):
             # 更新当前服务器配置
             self._server_address = active_server['address']
             self._server_port = active_server['port']
+            self.model_proxy.serverKey = server_key(active_server)
             
             # Force a new list reference to ensure QML detects the change
             self._servers = self._servers.copy()
             
             self.save_config()
             self.serversUpdated.emit()
+
+            # 有缓存快照时立即显示，再在后台刷新该服务器
+            snapshot = self.fleet_dashboard.get(server_key(active_server))
+            if snapshot and snapshot['online']:
+                self._emit_snapshot(snapshot)
+            self.fleet_dashboard.refresh(self.network, [active_server], self._on_fleet_snapshots)
     
+    @pyqtProperty(str, notify=settingsUpdated)
+    def networkBackend(self):
+        return self.network.name
+
+    @pyqtSlot(str)
+    def setNetworkBackend(self, backend):
+        """切换网络后端（thread / async）"""
+        if backend not in (THREAD_BACKEND, ASYNC_BACKEND):
+            return
+        self._settings.setdefault('network', {})['backend'] = backend
+        self.save_settings()
+        old_network = self.network
+        self.network = create_network_backend(self._settings)
+        self.unload_engine.network = self.network
+        self.update_checker.network = self.network
+        self.disk_analyzer.network = self.network
+        self.metadata_cache.network = self.network
+        self.benchmark.network = self.network
+        # 旧后端在进行中的调用（如正在刷新的工作线程）结束后才会真正关闭
+        old_network.shutdown()
+        if self.network.name != backend:
+            self.statusUpdated.emit("异步网络后端不可用，已使用线程后端")
+        self.settingsUpdated.emit()
+
+    def shutdown(self):
+        """退出前释放后台资源"""
+        self.warm_keeper.shutdown()
+        self.network.shutdown()
+
+    @pyqtProperty('QVariant', notify=fleetDashboardUpdated)
+    def fleetDashboard(self):
+        """集群汇总：totals（服务器、模型、磁盘、显存、已加载模型）和每台服务器的概要"""
+        return self._fleet_summary
+
+    @pyqtSlot()
+    def refreshFleetDashboard(self):
+        """并发刷新所有服务器的仪表盘快照"""
+        self.fleet_dashboard.prune(self._servers)
+        self.fleet_dashboard.refresh(self.network, self._servers, self._on_fleet_snapshots)
+
+    def _on_fleet_snapshots(self, snapshots):
+        """快照刷新完成回调（在网络后端线程中执行）"""
+        self._fleet_summary = self.fleet_dashboard.summary(self._servers)
+        QMetaObject.invokeMethod(self, "fleetDashboardUpdated", Qt.ConnectionType.QueuedConnection)
+
+        # 增量更新模型索引：离线服务器保留上次的数据，模型列表未变化的服务器不重建
+        self.inventory.retain_hosts({server_key(server) for server in self._servers})
+        inventory_changed = False
+        QMetaObject.invokeMethod(self.model_list, "retainServers", Qt.ConnectionType.QueuedConnection,
+                                 Q_ARG(list, [server_key(server) for server in self._servers]))
+        for key, snapshot in snapshots.items():
+            if snapshot['online']:
+                inventory_changed |= self.inventory.update_host(key, snapshot['name'], snapshot['models'])
+                QMetaObject.invokeMethod(self.model_list, "setServerModels", Qt.ConnectionType.QueuedConnection,
+                                         Q_ARG(str, key), Q_ARG(str, snapshot['name']),
+                                         Q_ARG(list, snapshot['models']))
+        if inventory_changed:
+            QMetaObject.invokeMethod(self, "inventoryUpdated", Qt.ConnectionType.QueuedConnection)
+        active_snapshot = snapshots.get(f"{self._server_address}:{self._server_port}")
+        if active_snapshot and active_snapshot['online']:
+            self._emit_snapshot(active_snapshot)
+
+    def _on_models_updated(self, models):
+        """当前服务器的模型列表更新时，同步到列表模型（在主线程中执行）"""
+        key = f"{self._server_address}:{self._server_port}"
+        name = next((server['name'] for server in self._servers if server_key(server) == key), key)
+        self.model_list.setServerModels(key, name, models)
+
+    @pyqtProperty(str, notify=serversUpdated)
+    def activeServerKey(self):
+        return f"{self._server_address}:{self._server_port}"
+
+    def _emit_snapshot(self, snapshot):
+        """用快照更新当前服务器的模型列表、活跃模型、磁盘和显存显示"""
+        QMetaObject.invokeMethod(self, "modelsUpdated", Qt.ConnectionType.QueuedConnection,
+                                 Q_ARG(list, snapshot['models']))
+        QMetaObject.invokeMethod(self, "activeModelsUpdated", Qt.ConnectionType.QueuedConnection,
+                                 Q_ARG(int, len(snapshot['activeModels'])))
+        QMetaObject.invokeMethod(self, "activeModelsDetailsUpdated", Qt.ConnectionType.QueuedConnection,
+                                 Q_ARG(list, snapshot['activeModels']))
+        QMetaObject.invokeMethod(self, "vramUsageUpdated", Qt.ConnectionType.QueuedConnection,
+                                 Q_ARG(str, format_vram_usage(snapshot['vramBytes'])))
+        # 快照中的 listedBytes 是 /api/tags 大小之和，当前服务器的磁盘占用统一按 blob 去重计算；
+        # 回调可能在网络后端的事件循环线程中执行，分析（可能请求 /api/show）放到线程池中
+        self.thread_pool.start(APICallWorker(self._update_disk_usage, snapshot['models']))
+
+    @pyqtSlot()
+    def refreshInventory(self):
+        """并发拉取所有服务器的 /api/tags 并更新模型索引（与集群仪表盘共用快照）"""
+        self.refreshFleetDashboard()
+
+    @pyqtSlot(result='QVariantList')
+    def getInventorySummary(self):
+        """每个模型所在的服务器数、摘要版本数和缺失的服务器数"""
+        return self.inventory.summary()
+
+    @pyqtSlot(str, result='QVariantList')
+    def getHostsMissingModel(self, model_name):
+        """没有指定模型的服务器"""
+        return self.inventory.hosts_missing(model_name)
+
+    @pyqtSlot(str, result='QVariantList')
+    def getOutdatedHosts(self, model_name):
+        """指定模型摘要不是最新版本的服务器"""
+        return self.inventory.outdated_hosts(model_name)
+
+    @pyqtSlot(result='QVariantList')
+    def getSingleHostModels(self):
+        """只存在于一台服务器上的模型"""
+        return self.inventory.single_host_models()
+
+    @pyqtSlot(int, int, result='QVariant')
+    def diffServers(self, index_a, index_b):
+        """比较两台服务器上的模型"""
+        if not (0 <= index_a < len(self._servers) and 0 <= index_b < len(self._servers)):
+            return {}
+        return self.inventory.diff(server_key(self._servers[index_a]), server_key(self._servers[index_b]))
+
+    @pyqtSlot()
+    def planFleetSync(self):
+        """根据 config/model_sync.json 计算每台服务器的同步计划（不执行）"""
+        self._plan_fleet_sync(run=False)
+
+    @pyqtSlot()
+    def syncFleet(self):
+        """计算同步计划并立即并行执行，使所有服务器收敛到期望的模型集合"""
+        if self.sync_runner.running:
+            self.statusUpdated.emit("模型同步正在进行中")
+            return
+        self.statusUpdated.emit("正在计算模型同步计划...")
+        self._plan_fleet_sync(run=True)
+
+    @pyqtSlot()
+    def resumeFleetSync(self):
+        """继续上次中断或失败的同步操作"""
+        actions = self.sync_runner.load_pending()
+        if not actions:
+            self.statusUpdated.emit("没有未完成的同步操作")
+            return
+        self._run_fleet_sync(actions)
+
+    @pyqtSlot()
+    def cancelFleetSync(self):
+        """取消正在进行的同步"""
+        self.sync_runner.cancel()
+
+    def _plan_fleet_sync(self, run):
+        def on_snapshots(snapshots):
+            self._on_fleet_snapshots(snapshots)
+            # 查询 registry 会阻塞，回调可能在网络后端的事件循环线程中执行，放到线程池中
+            self.thread_pool.start(APICallWorker(self._build_fleet_sync_plan, snapshots, run))
+
+        self.fleet_dashboard.refresh(self.network, self._servers, on_snapshots)
+
+    def _build_fleet_sync_plan(self, snapshots, run):
+        desired = load_desired_state(self.desired_models_file)
+        host_models = {key: self.inventory.host_models(key)
+                       for key, snapshot in snapshots.items() if snapshot['online']}
+        # 固定 digest 的模型只有在 registry 当前提供该版本时才能通过拉取达到
+        registry_digests = {name: digest for name, (digest, _) in
+                            self.update_checker.remote_digests(pinned_models(desired)).items()}
+        plans = plan_sync(desired, self._servers, host_models, self.inventory.latest_digests(),
+                          registry_digests)
+        QMetaObject.invokeMethod(self, "syncPlanReady", Qt.ConnectionType.QueuedConnection,
+                                 Q_ARG(list, plans))
+        unreachable = sum(len(plan["unreachable"]) for plan in plans)
+        if unreachable:
+            self.statusUpdated.emit(f"{unreachable} 个固定版本的模型在 registry 中已不可用，无法通过拉取同步")
+        if run:
+            actions = plan_actions(plans)
+            if actions:
+                self._run_fleet_sync(actions)
+            elif not unreachable:
+                self.statusUpdated.emit("所有服务器已符合期望的模型集合")
+
+    def _run_fleet_sync(self, actions):
+        worker = APICallWorker(self.sync_runner.run, actions,
+                               self._on_fleet_sync_progress, self._on_fleet_sync_finished)
+        self.thread_pool.start(worker)
+
+    def _on_fleet_sync_progress(self, progress):
+        QMetaObject.invokeMethod(self, "syncProgressUpdated", Qt.ConnectionType.QueuedConnection,
+                                 Q_ARG('QVariant', progress))
+
+    def _on_fleet_sync_finished(self, success, message):
+        self.statusUpdated.emit(message)
+        QMetaObject.invokeMethod(self, "syncFinished", Qt.ConnectionType.QueuedConnection,
+                                 Q_ARG(bool, success),
+                                 Q_ARG(str, message))
+        self.refreshFleetDashboard()
+
+    @pyqtSlot(list, bool, int)
+    def runBenchmark(self, model_names, all_servers, repeat):
+        """测量模型冷加载时间、热启动首 token 延迟和生成速度（当前服务器或全部服务器）"""
+        if all_servers:
+            servers = [dict(server) for server in self._servers]
+        else:
+            servers = [dict(server) for server in self._servers
+                       if server['address'] == self._server_address and server['port'] == self._server_port]
+            servers = servers or [{"name": self._server_address, "address": self._server_address,
+                                   "port": self._server_port}]
+        self.statusUpdated.emit("正在运行基准测试...")
+        worker = APICallWorker(self._run_benchmark, servers, list(model_names), max(int(repeat), 1))
+        self.thread_pool.start(worker)
+
+    def _run_benchmark(self, servers, model_names, repeat):
+        def on_progress(progress):
+            QMetaObject.invokeMethod(self, "benchmarkProgress", Qt.ConnectionType.QueuedConnection,
+                                     Q_ARG('QVariant', progress))
+
+        run = self.benchmark.run(servers, model_names, repeat, on_progress)
+        if run["regressions"]:
+            self.statusUpdated.emit(f"基准测试完成，发现 {len(run['regressions'])} 项性能回退")
+        else:
+            self.statusUpdated.emit("基准测试完成")
+        QMetaObject.invokeMethod(self, "benchmarkFinished", Qt.ConnectionType.QueuedConnection,
+                                 Q_ARG('QVariant', run))
+
+    @pyqtSlot()
+    def cancelBenchmark(self):
+        self.benchmark.cancel()
+
+    @pyqtSlot(result=list)
+    def getBenchmarkHistory(self):
+        """基准测试历史记录（由旧到新）"""
+        return self.benchmark.load_history()
+
     @pyqtSlot()
     def getModels(self):
         worker = APICallWorker(self._get_models)
@@ -463,21 +776,15 @@ class ModelManager(QObject):
             if response.status_code == 200:
                 models = response.json().get("models", [])
                 # 转换模型数据结构，确保包含name和size属性
-                formatted_models = []
-                for model in models:
-                    # 确保模型数据包含必要的属性
-                    formatted_model = {
-                        "name": model.get("name", ""),
-                        "size": model.get("size", 0),
-                        "digest": model.get("digest", ""),
-                        "details": model.get("details", {}),
-                        "modified_at": model.get("modified_at", "")
-                    }
-                    formatted_models.append(formatted_model)
+                formatted_models = [format_model_entry(model) for model in models]
                 # 使用Q_ARG传递模型列表
                 QMetaObject.invokeMethod(self, "modelsUpdated", Qt.ConnectionType.QueuedConnection,
                                          Q_ARG(list, formatted_models))
                 self.statusUpdated.emit("连接成功")
+                # 后台补全缺少的模型元数据
+                if self.metadata_cache.missing(formatted_models):
+                    worker = APICallWorker(self._warm_model_metadata, self.apiUrl, formatted_models)
+                    self.thread_pool.start(worker)
             else:
                 self.statusUpdated.emit("连接失败: " + str(response.status_code))
                 print(f"❌ 连接失败，状态码: {response.status_code}\n")
@@ -490,6 +797,15 @@ class ModelManager(QObject):
             QMetaObject.invokeMethod(self, "modelsUpdated", Qt.ConnectionType.QueuedConnection,
                                      Q_ARG(list, []))
     
+    def _warm_model_metadata(self, base_url, models):
+        if self.metadata_cache.warm(base_url, models):
+            QMetaObject.invokeMethod(self, "modelMetadataUpdated", Qt.ConnectionType.QueuedConnection)
+
+    @pyqtSlot(str, result='QVariant')
+    def getModelMetadata(self, digest):
+        """从缓存中获取模型元数据（参数、模板、量化、上下文长度、许可证等），没有缓存时返回空字典"""
+        return self.metadata_cache.get(digest) or {}
+
     @pyqtSlot()
     def getActiveModels(self):
         """获取当前运行的模型数量"""
@@ -530,26 +846,65 @@ class ModelManager(QObject):
         try:
             response = requests.get(f"{self.apiUrl}/tags", timeout=2)
             if response.status_code == 200:
-                models = response.json().get("models", [])
-                total_size = 0
-                for model in models:
-                    # 计算模型大小，假设大小以字节为单位
-                    size = model.get("size", 0)
-                    total_size += size
-                
-                # 将字节转换为GB
-                total_gb = total_size / (1024 * 1024 * 1024)
-                # 格式化保留一位小数
-                formatted_size = f"{total_gb:.1f} GB"
-                QMetaObject.invokeMethod(self, "diskUsageUpdated", Qt.ConnectionType.QueuedConnection,
-                                         Q_ARG(str, formatted_size))
+                self._update_disk_usage(response.json().get("models", []))
             else:
                 QMetaObject.invokeMethod(self, "diskUsageUpdated", Qt.ConnectionType.QueuedConnection,
                                          Q_ARG(str, "0.0 GB"))
         except Exception as e:
             QMetaObject.invokeMethod(self, "diskUsageUpdated", Qt.ConnectionType.QueuedConnection,
                                      Q_ARG(str, "0.0 GB"))
-    
+
+    def _update_disk_usage(self, models):
+        """按 blob 去重计算当前服务器的磁盘占用并更新显示（在后台线程中执行）"""
+        # 模型之间共享 blob，按 blob 去重后的大小才是实际占用
+        total_size = self._analyze_disk_usage(models)["diskBytes"]
+        QMetaObject.invokeMethod(self, "diskUsageUpdated", Qt.ConnectionType.QueuedConnection,
+                                 Q_ARG(str, format_disk_usage(total_size)))
+
+    def local_models_dir(self):
+        """当前服务器在本机且模型目录存在时返回模型目录，否则返回 None"""
+        models_dir = self._settings.get('storage', {}).get('models_dir') or default_models_dir()
+        if is_local_address(self._server_address) and os.path.isdir(models_dir):
+            return models_dir
+        return None
+
+    def _analyze_disk_usage(self, models):
+        report = self.disk_analyzer.update(self.apiUrl, models, self.local_models_dir())
+        QMetaObject.invokeMethod(self, "diskAnalysisUpdated", Qt.ConnectionType.QueuedConnection,
+                                 Q_ARG('QVariant', report))
+        return report
+
+    @pyqtSlot()
+    def analyzeDiskUsage(self):
+        """分析 blob 级磁盘占用，结果通过 diskAnalysisUpdated 发送"""
+        worker = APICallWorker(self._get_disk_usage)
+        self.thread_pool.start(worker)
+
+    @pyqtSlot(bool)
+    def collectBlobGarbage(self, dry_run):
+        """回收本机模型目录中未被引用的 blob 和未完成的下载（dry_run 时只列出）"""
+        models_dir = self.local_models_dir()
+        if not models_dir:
+            self.statusUpdated.emit("只有本机服务器可以清理模型目录")
+            return
+        if not dry_run and any(task['status'] == 'downloading' for task in self.download_tasks.values()):
+            self.statusUpdated.emit("有正在进行的下载，请完成或暂停后再清理")
+            return
+        worker = APICallWorker(self._collect_blob_garbage, models_dir, dry_run)
+        self.thread_pool.start(worker)
+
+    def _collect_blob_garbage(self, models_dir, dry_run):
+        self.statusUpdated.emit("正在扫描模型目录")
+        gc_settings = self._settings.get('storage', {})
+        collector = BlobGarbageCollector(models_dir, gc_settings.get('gc_workers', 8), gc_settings.get('gc_min_age', 3600))
+        report = collector.collect(dry_run)
+        size = format_disk_usage(report["reclaimableBytes"] if dry_run else report["freedBytes"])
+        self.statusUpdated.emit(f"可回收 {size}" if dry_run else f"已释放 {size}")
+        QMetaObject.invokeMethod(self, "blobGcFinished", Qt.ConnectionType.QueuedConnection,
+                                 Q_ARG('QVariant', report))
+        if not dry_run:
+            self._get_disk_usage()
+
     @pyqtSlot()
     def getVramUsage(self):
         """获取显存使用情况"""
@@ -569,14 +924,7 @@ class ModelManager(QObject):
                     total_vram += vram
                 
                 # 将字节转换为合适的单位
-                if total_vram == 0:
-                    formatted_usage = "0 B"
-                elif total_vram < 1024 * 1024:
-                    formatted_usage = f"{total_vram} B"
-                elif total_vram < 1024 * 1024 * 1024:
-                    formatted_usage = f"{(total_vram / (1024 * 1024)):.1f} MB"
-                else:
-                    formatted_usage = f"{(total_vram / (1024 * 1024 * 1024)):.1f} GB"
+                formatted_usage = format_vram_usage(total_vram)
                 
                 QMetaObject.invokeMethod(self, "vramUsageUpdated", Qt.ConnectionType.QueuedConnection,
                                          Q_ARG(str, formatted_usage))
@@ -598,6 +946,12 @@ class ModelManager(QObject):
                 self.resumeDownload(model_name)
                 return
         
+        self._create_download_task(model_name)
+        worker = APICallWorker(self._pull_model, model_name)
+        self.thread_pool.start(worker)
+
+    def _create_download_task(self, model_name):
+        """创建排队中的下载任务"""
         self.download_tasks[model_name] = {
             'modelName': model_name,
             'status': 'queued',
@@ -616,9 +970,6 @@ class ModelManager(QObject):
         
         import threading
         self.download_cancel_events[model_name] = threading.Event()
-        
-        worker = APICallWorker(self._pull_model, model_name)
-        self.thread_pool.start(worker)
 
     @pyqtSlot(str)
     def pauseDownload(self, model_name):
@@ -1021,6 +1372,116 @@ class ModelManager(QObject):
             minutes = int((seconds % 3600) / 60)
             return f"{hours}h {minutes}m"
 
+    @pyqtSlot()
+    def checkModelUpdates(self):
+        """比较本地模型摘要和 registry manifest 摘要，找出需要更新的模型（不会开始拉取）"""
+        worker = APICallWorker(self._check_model_updates)
+        self.thread_pool.start(worker)
+
+    def _check_model_updates(self):
+        self.statusUpdated.emit("检查模型更新")
+        result = self.network.request(make_request(f"{self.apiUrl}/tags"))
+        if not result["ok"]:
+            self.statusUpdated.emit("ollama服务器连接失败")
+            return
+        rows = self.update_checker.check(result_json(result, {}).get("models", []))
+        self._outdated_models = [row["name"] for row in rows if row["status"] == OUTDATED]
+        self.statusUpdated.emit(f"{len(self._outdated_models)} 个模型有更新" if self._outdated_models
+                                else "所有模型均为最新版本")
+        QMetaObject.invokeMethod(self, "modelUpdatesChecked", Qt.ConnectionType.QueuedConnection,
+                                 Q_ARG(list, rows))
+
+    @pyqtSlot()
+    def updateOutdatedModels(self):
+        """只拉取上次检查中发现过期的模型"""
+        self.bulkOperation("update", list(self._outdated_models))
+
+    @pyqtSlot(str, 'QVariant')
+    def bulkOperation(self, op, target):
+        """批量执行 delete / unload / pull / update
+
+        target 为模型名称列表，或筛选条件（如 {"olderThanDays": 30}，见 bulk_operations.select_models）
+        """
+        if op not in BULK_OPERATIONS:
+            self.statusUpdated.emit(f"不支持的批量操作: {op}")
+            return
+        if self.bulk_runner.running:
+            self.statusUpdated.emit("批量操作正在进行中")
+            return
+        worker = APICallWorker(self._bulk_operation, op, target)
+        self.thread_pool.start(worker)
+
+    @pyqtSlot()
+    def updateAllModels(self):
+        """更新当前服务器上的全部模型"""
+        self.bulkOperation("update", {})
+
+    @pyqtSlot()
+    def cancelBulkOperation(self):
+        """取消批量操作：未开始的项目不再执行，进行中的拉取会被暂停"""
+        self.bulk_runner.cancel()
+        for model_name in list(self._bulk_pulls):
+            self.pauseDownload(model_name)
+
+    def _bulk_operation(self, op, target):
+        if isinstance(target, dict):
+            result = self.network.request(make_request(f"{self.apiUrl}/tags"))
+            if not result["ok"]:
+                self.statusUpdated.emit("ollama服务器连接失败")
+                names = []
+            else:
+                names = select_models(result_json(result, {}).get("models", []), target)
+        else:
+            names = [str(name) for name in (target or [])]
+        if not names:
+            self.statusUpdated.emit("没有符合条件的模型")
+            # 仍然发送结束事件，让界面退出进行中状态
+            QMetaObject.invokeMethod(self, "bulkOperationProgress", Qt.ConnectionType.QueuedConnection,
+                                     Q_ARG('QVariant', {"op": op, "total": 0, "done": 0, "succeeded": 0,
+                                                        "failed": 0, "finished": True, "cancelled": False,
+                                                        "item": None, "results": []}))
+            return
+
+        self.statusUpdated.emit(f"批量操作: {op} {len(names)} 个模型")
+        executors = {
+            "delete": self._bulk_delete,
+            "unload": lambda name: self.unload_engine.unload(self.apiUrl, name),
+            "pull": self._bulk_pull,
+            "update": self._bulk_pull
+        }
+        self.bulk_runner.run(op, names, executors[op], self._on_bulk_progress)
+
+    def _bulk_delete(self, model_name):
+        result = self.network.request(make_request(f"{self.apiUrl}/delete", "DELETE", {"name": model_name}, timeout=30))
+        return result["ok"], "模型删除成功" if result["ok"] else (result["error"] or f"状态码 {result['status']}")
+
+    def _bulk_pull(self, model_name):
+        """在批量操作的线程中同步拉取，任务同时显示在下载管理页"""
+        task = self.download_tasks.get(model_name)
+        if task and task['status'] == 'downloading':
+            return False, "模型已在下载中"
+        if not task or task['status'] != 'paused':
+            self._create_download_task(model_name)
+        self._bulk_pulls.add(model_name)
+        try:
+            self._pull_model(model_name)
+        finally:
+            self._bulk_pulls.discard(model_name)
+        # _pull_model 成功（或已是最新）时会移除任务，失败或暂停时保留
+        task = self.download_tasks.get(model_name)
+        if task is None:
+            return True, "拉取完成"
+        return False, "已暂停" if task['status'] == 'paused' else "拉取失败"
+
+    def _on_bulk_progress(self, progress):
+        if progress["finished"]:
+            message = f"批量操作完成: 成功 {progress['succeeded']}，失败 {progress['failed']}"
+            self.statusUpdated.emit("批量操作已取消" if progress["cancelled"] else message)
+            self.getModels()
+            self.getActiveModels()
+        QMetaObject.invokeMethod(self, "bulkOperationProgress", Qt.ConnectionType.QueuedConnection,
+                                 Q_ARG('QVariant', progress))
+
     @pyqtSlot(str)
     def deleteModel(self, model_name):
         worker = APICallWorker(self._delete_model, model_name)
@@ -1045,80 +1506,36 @@ class ModelManager(QObject):
     
     def _unload_model(self, model_name):
         """卸载运行中的模型"""
-        try:
-            self.statusUpdated.emit("卸载模型")
-            
-            # 尝试使用专门的卸载端点
-            api_success = False
-            try:
-                # 尝试常见的卸载端点
-                endpoints = [
-                    f"{self.apiUrl}/unload",
-                    f"{self.apiUrl}/models/unload",
-                    f"{self.apiUrl}/model/unload"
-                ]
-                
-                for endpoint in endpoints:
-                    try:
-                        response = requests.post(endpoint, json={
-                            "name": model_name
-                        }, timeout=2)
-                        
-                        if response.status_code == 200:
-                            self.statusUpdated.emit("模型卸载成功 (API)")
-                            self.getModels()
-                            api_success = True
-                            QMetaObject.invokeMethod(self, "unloadModelResult", Qt.ConnectionType.QueuedConnection,
-                                                 Q_ARG(bool, True),
-                                                 Q_ARG(str, "模型卸载成功 (API)"))
-                            return
-                    except:
-                        continue
-            except Exception as api_error:
-                self.statusUpdated.emit(f"尝试专用 API 失败: {str(api_error)}")
-            
-            # API 失败，尝试当前实现
-            if not api_success:
-                try:
-                    response = requests.post(f"{self.apiUrl}/generate", json={
-                        "model": model_name,
-                        "prompt": "",
-                        "keep_alive": "0"
-                    }, timeout=2)
-                    
-                    if response.status_code == 200:
-                        self.statusUpdated.emit("模型卸载成功")
-                        self.getModels()
-                        QMetaObject.invokeMethod(self, "unloadModelResult", Qt.ConnectionType.QueuedConnection,
-                                             Q_ARG(bool, True),
-                                             Q_ARG(str, "模型卸载成功"))
-                        return
-                except Exception as generate_error:
-                    self.statusUpdated.emit(f"尝试 generate API 失败: {str(generate_error)}")
-            
-            # 回退到 CLI
-            command = f"ollama rm {model_name}"
-            returncode, stdout, stderr = execute_command(command)
-            
-            if returncode == 0:
-                self.statusUpdated.emit("模型卸载成功 (CLI)")
-                self.getModels()
-                QMetaObject.invokeMethod(self, "unloadModelResult", Qt.ConnectionType.QueuedConnection,
-                                         Q_ARG(bool, True),
-                                         Q_ARG(str, "模型卸载成功 (CLI)"))
-            else:
-                error_msg = stderr.strip() if stderr else "卸载失败"
-                self.statusUpdated.emit(f"卸载模型失败: {error_msg}")
-                QMetaObject.invokeMethod(self, "unloadModelResult", Qt.ConnectionType.QueuedConnection,
-                                         Q_ARG(bool, False),
-                                         Q_ARG(str, f"卸载失败: {error_msg}"))
-        except Exception as e:
-            error_msg = f"错误: {str(e)}"
-            self.statusUpdated.emit(error_msg)
-            QMetaObject.invokeMethod(self, "unloadModelResult", Qt.ConnectionType.QueuedConnection,
-                                     Q_ARG(bool, False),
-                                     Q_ARG(str, error_msg))
-    
+        self.statusUpdated.emit("卸载模型")
+        success, message = self.unload_engine.unload(self.apiUrl, model_name)
+        self.statusUpdated.emit(message if success else f"卸载模型失败: {message}")
+        if success:
+            self.getModels()
+            self.getActiveModels()
+        QMetaObject.invokeMethod(self, "unloadModelResult", Qt.ConnectionType.QueuedConnection,
+                                 Q_ARG(bool, success),
+                                 Q_ARG(str, message if success else f"卸载失败: {message}"))
+
+    @pyqtSlot(list)
+    def unloadModels(self, model_names):
+        """并行卸载多个运行中的模型"""
+        worker = APICallWorker(self._unload_models, list(model_names))
+        self.thread_pool.start(worker)
+
+    def _unload_models(self, model_names):
+        self.statusUpdated.emit("卸载模型")
+        outcomes = self.unload_engine.unload_many(self.apiUrl, model_names)
+        failed = [name for name, (ok, _) in outcomes.items() if not ok]
+        message = f"已卸载 {len(outcomes) - len(failed)}/{len(outcomes)} 个模型"
+        if failed:
+            message += f"，失败: {', '.join(failed)}"
+        self.statusUpdated.emit(message)
+        self.getModels()
+        self.getActiveModels()
+        QMetaObject.invokeMethod(self, "unloadModelResult", Qt.ConnectionType.QueuedConnection,
+                                 Q_ARG(bool, not failed),
+                                 Q_ARG(str, message))
+
     @pyqtSlot(str)
     def unloadModelWithForce(self, model_name):
         """强制卸载运行中的模型"""
@@ -1153,6 +1570,45 @@ class ModelManager(QObject):
                                      Q_ARG(bool, False),
                                      Q_ARG(str, error_msg))
     
+    @pyqtSlot(str)
+    def preloadModel(self, model_name):
+        """在当前服务器上预加载模型，超出显存预算时按 LRU 卸载其他模型"""
+        worker = APICallWorker(self._preload_model, model_name)
+        self.thread_pool.start(worker)
+
+    def _preload_model(self, model_name):
+        """预加载模型的实际实现（在后台线程中执行）"""
+        self.statusUpdated.emit("预加载模型")
+        loaded, evicted = self.residency.ensure_loaded(self._server_address, self._server_port, model_name)
+        if loaded:
+            message = "模型预加载成功" + (f"，已卸载: {', '.join(evicted)}" if evicted else "")
+        else:
+            message = "模型预加载失败"
+        self.statusUpdated.emit(message)
+        QMetaObject.invokeMethod(self, "preloadModelResult", Qt.ConnectionType.QueuedConnection,
+                                 Q_ARG(bool, loaded),
+                                 Q_ARG(str, message))
+        if loaded:
+            self.getModels()
+
+    @pyqtSlot(str)
+    def setVramBudget(self, budget):
+        """设置当前服务器的显存预算（如 "24GB"，0 表示不限制）"""
+        residency = self._settings.setdefault('residency', {})
+        residency.setdefault('budgets', {})[f"{self._server_address}:{self._server_port}"] = parse_size(budget)
+        self.save_settings()
+        self.settingsUpdated.emit()
+
+    @pyqtSlot(result='QVariant')
+    def getResidencyStatus(self):
+        """当前服务器的显存预算、已用显存和按 LRU 排列的已加载模型"""
+        return self.residency.status(self._server_address, self._server_port)
+
+    def _on_residency_tick(self):
+        if self._settings.get('residency', {}).get('schedule'):
+            worker = APICallWorker(self.residency.tick, list(self._servers))
+            self.thread_pool.start(worker)
+
     @pyqtSlot(str, result=bool)
     def isModelLoaded(self, model_name):
         """检查模型是否正在运行"""
@@ -1196,13 +1652,18 @@ class ModelManager(QObject):
                             translate_prompt = f"{ollama_prompt}\n\n{description}"
                             
                             # 优化请求参数
-                            response = requests.post(f"{self.apiUrl}/generate", json={
+                            payload = {
                                 "model": ollama_model,
                                 "prompt": translate_prompt,
                                 "stream": False,
                                 "temperature": 0.3,  # 降低随机性，提高翻译准确性
                                 "stop": ["\n\n"]  # 设置停止词
-                            }, timeout=15)  # 增加超时时间到 15 秒
+                            }
+                            if self.warm_keeper.is_enabled():
+                                # 每次翻译都刷新驻留时间，保持模型常驻
+                                payload["keep_alive"] = self.warm_keeper.keep_alive
+                                self.warm_keeper.touch()
+                            response = requests.post(f"{self.apiUrl}/generate", json=payload, timeout=15)  # 增加超时时间到 15 秒
                             
                             if response.status_code == 200:
                                 result = response.json()
@@ -1262,6 +1723,19 @@ class ModelManager(QObject):
             pass
         return description
 
+    def _on_settings_updated(self):
+        """关闭翻译模型常驻（或 Ollama 翻译、清空模型）后释放之前预加载的模型"""
+        if self.warm_keeper.loaded and not self.warm_keeper.is_enabled():
+            worker = APICallWorker(self.warm_keeper.release)
+            self.thread_pool.start(worker)
+
+    @pyqtSlot()
+    def warmTranslationModel(self):
+        """预加载 Ollama 翻译模型，使首次翻译只需承担生成延迟"""
+        if self.warm_keeper.is_enabled():
+            worker = APICallWorker(self.warm_keeper.activate)
+            self.thread_pool.start(worker)
+
     @pyqtSlot()
     def clearTranslationCache(self):
         """清除翻译缓存"""
@@ -0,0 +1,398 @@
+import asyncio
+import json
+import queue
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+import requests
+
+try:
+    import httpx
+except ImportError:  # httpx 为可选依赖，未安装时只能使用线程后端
+    httpx = None
+
+THREAD_BACKEND = "thread"
+ASYNC_BACKEND = "async"
+DEFAULT_MAX_CONCURRENCY = 64
+# 异步后端的并发不占用线程，默认值高得多，用于一次探测上千台服务器
+DEFAULT_ASYNC_MAX_CONCURRENCY = 2048
+# 异步后端每台服务器（协议+地址+端口）使用独立的连接池，每个池的连接数上限
+ASYNC_CONNECTIONS_PER_HOST = 8
+# 等待事件循环返回结果时，在请求超时之外额外等待的时间（秒）
+RESULT_TIMEOUT_MARGIN = 5
+
+
+def api_url(address, port):
+    """拼接 Ollama API 地址"""
+    return f"http://{address}:{port}/api"
+
+
+def server_key(server):
+    """服务器在缓存、统计中使用的唯一键"""
+    return f"{server.get('address', '')}:{server.get('port', '')}"
+
+
+def make_request(url, method="GET", json_body=None, headers=None, timeout=2):
+    """构造请求描述，两种后端共用"""
+    return {
+        "url": url,
+        "method": method,
+        "json": json_body,
+        "headers": headers or {},
+        "timeout": timeout
+    }
+
+
+def _make_result(spec, status=0, content=b"", latency=0.0, error="", headers=None):
+    return {
+        "url": spec["url"],
+        "ok": 200 <= status < 300,
+        "status": status,
+        "content": content,
+        "headers": headers or {},
+        "latency": latency,  # 毫秒
+        "error": error
+    }
+
+
+def result_json(result, default=None):
+    """解析请求结果中的 JSON，失败时返回默认值"""
+    if not result or not result.get("ok"):
+        return default
+    try:
+        return json.loads(result["content"])
+    except (ValueError, TypeError):
+        return default
+
+
+def _closed_result(spec):
+    return _make_result(spec, error="网络后端已关闭")
+
+
+class _CallTracker:
+    """记录进行中的调用：shutdown() 推迟到最后一个调用结束后才真正释放资源，
+    切换网络后端时仍在使用旧后端的线程可以正常完成；关闭后的新调用直接返回错误结果
+    """
+
+    def __init__(self):
+        self._calls = 0
+        self._calls_lock = threading.Lock()
+        self._closing = False
+        self._closed = False
+
+    def _begin(self):
+        """开始一次调用，后端已关闭时返回 False"""
+        with self._calls_lock:
+            if self._closed:
+                return False
+            self._calls += 1
+            return True
+
+    def _end(self):
+        with self._calls_lock:
+            self._calls -= 1
+            close = self._closing and self._calls == 0 and not self._closed
+            if close:
+                self._closed = True
+        if close:
+            self._close()
+
+    def shutdown(self):
+        """释放资源：没有进行中的调用时立即释放，否则在最后一个调用结束后释放"""
+        with self._calls_lock:
+            self._closing = True
+            close = self._calls == 0 and not self._closed
+            if close:
+                self._closed = True
+        if close:
+            self._close()
+
+    def _close(self):
+        raise NotImplementedError
+
+
+class ThreadNetworkBackend(_CallTracker):
+    """基于 requests 和线程池的网络后端（默认）"""
+    name = THREAD_BACKEND
+
+    def __init__(self, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        super().__init__()
+        self.max_concurrency = max_concurrency
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="net")
+        self._local = threading.local()
+
+    def _session(self):
+        # requests.Session 不保证线程安全，每个线程各用一个以复用连接
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = requests.Session()
+            self._local.session = session
+        return session
+
+    def request(self, spec):
+        """同步执行单个请求"""
+        start_time = time.perf_counter()
+        try:
+            response = self._session().request(spec["method"], spec["url"], json=spec["json"],
+                                               headers=spec["headers"], timeout=spec["timeout"])
+            return _make_result(spec, response.status_code, response.content,
+                                (time.perf_counter() - start_time) * 1000, headers=dict(response.headers))
+        except Exception as e:
+            return _make_result(spec, latency=(time.perf_counter() - start_time) * 1000, error=str(e))
+
+    def request_many(self, specs):
+        """并发执行多个请求，按输入顺序返回结果"""
+        if not self._begin():
+            return [_closed_result(spec) for spec in specs]
+        try:
+            return list(self._executor.map(self.request, specs))
+        finally:
+            self._end()
+
+    def submit_many(self, specs, callback):
+        """异步执行多个请求，完成后在后台线程中调用 callback(results)"""
+        def run():
+            results = self.request_many(specs)
+            # 与异步后端一致：回调中的异常记录下来，不能随线程静默结束
+            try:
+                callback(results)
+            except Exception as e:
+                print(f"❌ 网络请求回调失败: {str(e)}\n{traceback.format_exc()}")
+
+        # 协调线程不能占用执行器本身，否则执行器占满时会互相等待
+        threading.Thread(target=run, daemon=True).start()
+
+    def iter_lines(self, spec):
+        """流式读取响应行（用于 pull 等流式接口）"""
+        response = self._session().request(spec["method"], spec["url"], json=spec["json"],
+                                           headers=spec["headers"], timeout=spec["timeout"], stream=True)
+        try:
+            for line in response.iter_lines():
+                if line:
+                    yield line
+        finally:
+            response.close()
+
+    def _close(self):
+        self._executor.shutdown(wait=False)
+
+
+class AsyncNetworkBackend(_CallTracker):
+    """基于 asyncio/httpx 的网络后端，在单独的事件循环线程中处理大量并发请求"""
+    name = ASYNC_BACKEND
+
+    def __init__(self, max_concurrency=DEFAULT_ASYNC_MAX_CONCURRENCY):
+        if httpx is None:
+            raise RuntimeError("未安装 httpx，无法使用异步网络后端")
+        super().__init__()
+        self.max_concurrency = max_concurrency
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run_loop, name="net-asyncio", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._clients = {}
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._ready.set()
+        self._loop.run_forever()
+
+    def _client(self, url):
+        """按服务器取连接池：httpx 每次分配连接都要遍历整个池，一个包含上千个连接的池会使开销按平方增长"""
+        origin = httpx.URL(url)
+        key = (origin.scheme, origin.host, origin.port)
+        client = self._clients.get(key)
+        if client is None:
+            client = httpx.AsyncClient(limits=httpx.Limits(max_connections=ASYNC_CONNECTIONS_PER_HOST,
+                                                           max_keepalive_connections=ASYNC_CONNECTIONS_PER_HOST))
+            self._clients[key] = client
+        return client
+
+    async def _fetch(self, spec):
+        start_time = time.perf_counter()
+        async with self._semaphore:
+            try:
+                response = await self._client(spec["url"]).request(spec["method"], spec["url"], json=spec["json"],
+                                                      headers=spec["headers"], timeout=spec["timeout"])
+                return _make_result(spec, response.status_code, response.content,
+                                    (time.perf_counter() - start_time) * 1000, headers=dict(response.headers))
+            except Exception as e:
+                return _make_result(spec, latency=(time.perf_counter() - start_time) * 1000, error=str(e))
+
+    async def _fetch_many(self, specs):
+        return list(await asyncio.gather(*(self._fetch(spec) for spec in specs)))
+
+    def _result_timeout(self, specs):
+        """等待结果的上限：超出并发数的请求要排队，按批次累计请求超时"""
+        longest = max((float(spec["timeout"] or 0) for spec in specs), default=0)
+        batches = -(-len(specs) // max(self.max_concurrency, 1))
+        return longest * max(batches, 1) + RESULT_TIMEOUT_MARGIN
+
+    def _wait(self, coroutine, specs):
+        """在事件循环中执行并等待结果，超时（如事件循环已停止）时取消并返回错误结果"""
+        if not self._begin():
+            coroutine.close()
+            return [_closed_result(spec) for spec in specs]
+        try:
+            future = asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+            try:
+                return future.result(timeout=self._result_timeout(specs))
+            except FutureTimeoutError:
+                future.cancel()
+                return [_make_result(spec, error="等待网络后端超时") for spec in specs]
+        finally:
+            self._end()
+
+    def request(self, spec):
+        result = self._wait(self._fetch(spec), [spec])
+        return result[0] if isinstance(result, list) else result
+
+    def request_many(self, specs):
+        return self._wait(self._fetch_many(specs), specs)
+
+    def submit_many(self, specs, callback):
+        """在事件循环中执行请求，完成后在事件循环线程中调用 callback(results)，不占用线程池"""
+        if not self._begin():
+            callback([_closed_result(spec) for spec in specs])
+            return
+        future = asyncio.run_coroutine_threadsafe(self._fetch_many(specs), self._loop)
+
+        def done(finished):
+            # 回调中的异常不能在事件循环线程中静默丢失
+            try:
+                callback(finished.result())
+            except Exception as e:
+                print(f"❌ 网络请求回调失败: {str(e)}\n{traceback.format_exc()}")
+            finally:
+                self._end()
+
+        future.add_done_callback(done)
+
+    def iter_lines(self, spec):
+        """流式读取响应行，通过队列把事件循环中的数据交给调用线程"""
+        lines = queue.Queue()
+        done = object()
+
+        async def pump():
+            try:
+                async with self._client(spec["url"]).stream(spec["method"], spec["url"], json=spec["json"],
+                                               headers=spec["headers"], timeout=spec["timeout"]) as response:
+                    async for line in response.aiter_lines():
+                        if line:
+                            lines.put(line.encode("utf-8"))
+            except Exception as e:
+                lines.put(e)
+            finally:
+                lines.put(done)
+
+        if not self._begin():
+            raise RuntimeError("网络后端已关闭")
+        future = asyncio.run_coroutine_threadsafe(pump(), self._loop)
+        try:
+            while True:
+                item = lines.get()
+                if item is done:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            # 调用方提前停止读取（如取消拉取）时取消读取任务，关闭响应并释放连接
+            future.cancel()
+            self._end()
+
+    def _close(self):
+        async def close():
+            for client in list(self._clients.values()):
+                await client.aclose()
+
+        if threading.current_thread() is self._thread:
+            # 最后一个调用在事件循环线程中结束（submit_many 回调），不能在这里阻塞等待
+            self._loop.create_task(close()).add_done_callback(lambda _: self._loop.stop())
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(close(), self._loop).result(timeout=2)
+        except Exception:
+            pass
+        self._loop.call_soon_threadsafe(self._loop.stop)
+
+
+def create_network_backend(settings):
+    """根据设置创建网络后端，异步后端不可用时回退到线程后端"""
+    network_settings = settings.get("network", {}) if isinstance(settings, dict) else {}
+    backend_name = network_settings.get("backend", THREAD_BACKEND)
+    try:
+        max_concurrency = int(network_settings["max_concurrency"])
+    except (KeyError, TypeError, ValueError):
+        max_concurrency = None  # 使用各后端自己的默认值
+
+    if backend_name == ASYNC_BACKEND:
+        try:
+            return AsyncNetworkBackend(max_concurrency or DEFAULT_ASYNC_MAX_CONCURRENCY)
+        except RuntimeError as e:
+            print(f"❌ {str(e)}，使用线程网络后端\n")
+    return ThreadNetworkBackend(max_concurrency or DEFAULT_MAX_CONCURRENCY)
+
+
+def _run_benchmark(server_count, delay, rounds, max_concurrency):
+    """用本地桩服务器比较两种后端探测整个服务器集群的吞吐量"""
+    stub_loop = asyncio.new_event_loop()
+    started = threading.Event()
+    ports = []
+
+    async def handle(reader, writer):
+        try:
+            while await reader.readline() not in (b"\r\n", b"\n", b""):
+                pass
+            await asyncio.sleep(delay)
+            body = b'{"version":"stub"}'
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                         b"Content-Length: " + str(len(body)).encode() + b"\r\nConnection: close\r\n\r\n" + body)
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def serve():
+        # 每个“服务器”监听一个独立端口，与真实集群一样每台服务器是不同的连接目标
+        for _ in range(server_count):
+            server = await asyncio.start_server(handle, "127.0.0.1", 0, backlog=128)
+            ports.append(server.sockets[0].getsockname()[1])
+        started.set()
+        await asyncio.Event().wait()
+
+    threading.Thread(target=lambda: stub_loop.run_until_complete(serve()), daemon=True).start()
+    started.wait()
+
+    specs = [make_request(f"http://127.0.0.1:{port}/api/version", timeout=30) for port in ports]
+    backends = [ThreadNetworkBackend]
+    if httpx is not None:
+        backends.append(AsyncNetworkBackend)
+    else:
+        print("未安装 httpx，跳过异步后端")
+
+    for backend_class in backends:
+        backend = backend_class(max_concurrency) if max_concurrency else backend_class()
+        elapsed = []
+        for _ in range(rounds):
+            start_time = time.perf_counter()
+            results = backend.request_many(specs)
+            elapsed.append(time.perf_counter() - start_time)
+            failed = sum(1 for result in results if not result["ok"])
+        best = min(elapsed)
+        print(f"{backend.name:>6}: {server_count} 个探测, 最佳 {best * 1000:.0f}ms, "
+              f"{server_count / best:.0f} 次/秒, 失败 {failed}")
+        backend.shutdown()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="网络后端集群探测基准测试")
+    parser.add_argument("--servers", type=int, default=1000, help="模拟的服务器数量")
+    parser.add_argument("--delay", type=float, default=0.05, help="桩服务器响应延迟（秒）")
+    parser.add_argument("--rounds", type=int, default=3, help="重复轮数")
+    parser.add_argument("--concurrency", type=int, default=0, help="最大并发数（默认使用各后端自己的默认值）")
+    args = parser.parse_args()
+    _run_benchmark(args.servers, args.delay, args.rounds, args.concurrency)
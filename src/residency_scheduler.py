@@ -0,0 +1,160 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+import requests
+from network_backend import api_url
+from sync_planner import normalize_model_name
+from warm_keeper import list_running_models, preload_model
+
+DEFAULT_KEEP_ALIVE = "30m"
+
+
+def parse_size(value):
+    """解析显存预算，支持字节数或 "24GB"、"512MB" 这样的字符串"""
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = re.match(r'^\s*([\d.]+)\s*([KMGT]?)i?B?\s*$', str(value), re.IGNORECASE)
+    if not match:
+        return 0
+    units = {"": 1, "K": 1024, "M": 1024 ** 2, "G": 1024 ** 3, "T": 1024 ** 4}
+    return int(float(match.group(1)) * units[match.group(2).upper()])
+
+
+def _running_name(model):
+    """/api/ps 中模型的名称（带标签），与设置中可能未带标签的名称统一比较"""
+    return normalize_model_name(model.get("name") or model.get("model") or "")
+
+
+def _parse_time(value):
+    """把 "HH:MM" 转换为当天的分钟数，格式错误时返回 None"""
+    match = re.match(r'^\s*(\d{1,2}):(\d{2})\s*$', str(value or ""))
+    if not match:
+        return None
+    return int(match.group(1)) * 60 + int(match.group(2))
+
+
+class ResidencyScheduler:
+    """按服务器显存预算调度模型常驻：按需或定时预加载，超出预算时按 LRU 卸载"""
+
+    def __init__(self, manager):
+        self.manager = manager
+        self._lock = threading.Lock()
+        self._lru = {}           # server_key -> OrderedDict(模型名称 -> 最近使用时间)
+        self._vram_sizes = {}    # server_key -> {模型名称: 实际显存占用}，来自 /api/ps
+        self._schedule_done = {}  # 定时任务 -> 最近一次执行的日期
+
+    def _settings(self):
+        return self.manager._settings.get("residency", {})
+
+    def budget(self, key):
+        """服务器的显存预算（字节），0 表示不限制"""
+        settings = self._settings()
+        return parse_size(settings.get("budgets", {}).get(key, settings.get("default_budget", 0)))
+
+    def touch(self, key, model_name):
+        """记录模型的一次使用"""
+        model_name = normalize_model_name(model_name)
+        with self._lock:
+            lru = self._lru.setdefault(key, OrderedDict())
+            lru.pop(model_name, None)
+            lru[model_name] = time.time()
+
+    def _model_sizes(self, base_url):
+        """从 /api/tags 获取模型的磁盘大小，用来估算未加载过的模型所需显存"""
+        try:
+            response = requests.get(f"{base_url}/tags", timeout=2)
+            if response.status_code == 200:
+                return {normalize_model_name(model.get("name") or ""): model.get("size", 0)
+                        for model in response.json().get("models", [])}
+        except Exception:
+            pass
+        return {}
+
+    def _eviction_order(self, key, running):
+        """按最近使用时间从旧到新排列正在运行的模型，未记录使用的模型按过期时间排在最前"""
+        with self._lock:
+            lru = list(self._lru.get(key, OrderedDict()).keys())
+        untracked = sorted((model for model in running if _running_name(model) not in lru),
+                           key=lambda model: model.get("expires_at", ""))
+        tracked = [model for name in lru for model in running if _running_name(model) == name]
+        return untracked + tracked
+
+    def ensure_loaded(self, address, port, model_name, keep_alive=None):
+        """确保模型已加载；需要时先按 LRU 卸载其他模型以满足显存预算，返回 (成功, 被卸载的模型)"""
+        key = f"{address}:{port}"
+        base_url = api_url(address, port)
+        model_name = normalize_model_name(model_name)
+        keep_alive = keep_alive or self._settings().get("keep_alive", DEFAULT_KEEP_ALIVE)
+        running = list_running_models(base_url)
+
+        with self._lock:
+            sizes = self._vram_sizes.setdefault(key, {})
+            for model in running:
+                sizes[_running_name(model)] = model.get("size_vram", 0) or model.get("size", 0)
+
+        if any(_running_name(model) == model_name for model in running):
+            self.touch(key, model_name)
+            return True, []
+
+        evicted = []
+        budget = self.budget(key)
+        if budget > 0:
+            with self._lock:
+                required = sizes.get(model_name, 0)
+            if not required:
+                required = self._model_sizes(base_url).get(model_name, 0)
+            used = sum(model.get("size_vram", 0) for model in running)
+            for model in self._eviction_order(key, running):
+                if used + required <= budget:
+                    break
+                if self.manager.unload_engine.unload(base_url, model["name"])[0]:
+                    used -= model.get("size_vram", 0)
+                    evicted.append(model["name"])
+                    with self._lock:
+                        self._lru.get(key, OrderedDict()).pop(_running_name(model), None)
+            if used + required > budget:
+                print(f"⚠️  显存预算不足，仍尝试加载: {model_name}\n")
+
+        if not preload_model(base_url, model_name, keep_alive):
+            return False, evicted
+        self.touch(key, model_name)
+        return True, evicted
+
+    def due_preloads(self, now=None):
+        """返回计划时间（HH:MM）已到且今天尚未执行的定时预加载任务
+
+        检查每分钟执行一次，可能跳过计划的那一分钟（休眠、检查耗时），因此不要求时间完全相等
+        """
+        now = now or time.localtime()
+        current = now.tm_hour * 60 + now.tm_min
+        today = time.strftime("%Y-%m-%d", now)
+        due = []
+        for entry in self._settings().get("schedule", []):
+            task_id = f"{entry.get('server', '*')}|{entry.get('model', '')}|{entry.get('time', '')}"
+            scheduled = _parse_time(entry.get("time"))
+            if scheduled is not None and scheduled <= current and self._schedule_done.get(task_id) != today:
+                self._schedule_done[task_id] = today
+                due.append(entry)
+        return due
+
+    def tick(self, servers):
+        """执行到期的定时预加载（在后台线程中调用）"""
+        for entry in self.due_preloads():
+            for server in servers:
+                target = entry.get("server", "*")
+                if target in ("*", server.get("name"), f"{server['address']}:{server['port']}"):
+                    ok, evicted = self.ensure_loaded(server["address"], server["port"], entry.get("model", ""),
+                                                     entry.get("keep_alive"))
+                    print(f"{'✅' if ok else '❌'} 定时预加载 {entry.get('model', '')} @ {server.get('name', '')}"
+                          f"{'，卸载: ' + ', '.join(evicted) if evicted else ''}\n")
+
+    def status(self, address, port):
+        """服务器的显存预算、已用显存和 LRU 顺序"""
+        key = f"{address}:{port}"
+        running = list_running_models(api_url(address, port))
+        return {
+            "budget": self.budget(key),
+            "used": sum(model.get("size_vram", 0) for model in running),
+            "running": [model["name"] for model in self._eviction_order(key, running)]
+        }
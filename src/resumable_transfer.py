@@ -0,0 +1,192 @@
+import json
+import os
+import time
+import requests
+from typing import Callable, Optional
+from segmented_download import parse_content_range
+from stream_hash import StreamingHasher
+
+CHUNK_SIZE = 64 * 1024
+# 重试等待时间上限（秒）
+MAX_BACKOFF = 30
+
+
+class TransferError(Exception):
+    """多次重试后仍无法完成下载，或服务器返回不可重试的错误"""
+
+
+class _RestartTransfer(Exception):
+    """服务器返回的内容无法接在已下载部分之后，需要清空临时文件从头下载"""
+
+
+class ResumableTransfer:
+    """可续传的单连接下载：续传时发送 Range 和 If-Range，校验 206 与 Content-Range 后再追加写入
+
+    续传所需的信息（地址、ETag、Last-Modified、总大小）保存在 <文件>.meta 中；
+    服务器返回完整内容（200，文件已变化或不支持 Range）时清空临时文件重新写入；
+    网络错误按指数退避重试，有新数据写入后重新计数；
+    传入 hasher 时在写入的同时计算摘要
+    """
+
+    def __init__(self, url: str, path: str, chunk_size: int = CHUNK_SIZE, timeout: int = 30,
+                 max_retries: int = 3, cancel_check: Optional[Callable[[], bool]] = None,
+                 pause_check: Optional[Callable[[], bool]] = None,
+                 on_progress: Optional[Callable[[int, int], None]] = None,
+                 hasher: Optional[StreamingHasher] = None):
+        self.url = url
+        self.path = path
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.cancel_check = cancel_check or (lambda: False)
+        self.pause_check = pause_check
+        self.on_progress = on_progress
+        self.hasher = hasher
+        self.meta_path = path + ".meta"
+        self.meta = {}
+        self.downloaded = 0
+        self.total = 0
+
+    def _load_meta(self) -> bool:
+        """读取续传信息，与当前地址不一致或临时文件不存在时视为无效"""
+        if not (os.path.exists(self.meta_path) and os.path.exists(self.path)):
+            return False
+        try:
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if meta.get("url") != self.url:
+            return False
+        self.meta = meta
+        return True
+
+    def _save_meta(self):
+        temp_path = self.meta_path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.meta, f)
+        os.replace(temp_path, self.meta_path)
+
+    def discard(self):
+        """删除临时文件和续传信息"""
+        for path in (self.path, self.meta_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self.meta = {}
+        self.downloaded = 0
+
+    def resume_offset(self) -> int:
+        """可以续传的位置，没有有效的续传信息时为 0"""
+        return os.path.getsize(self.path) if self._load_meta() else 0
+
+    def _request_headers(self, offset: int) -> dict:
+        if offset <= 0:
+            return {}
+        headers = {"Range": f"bytes={offset}-"}
+        # If-Range 只接受强 ETag，弱 ETag 时改用 Last-Modified
+        etag = self.meta.get("etag", "")
+        if etag and not etag.startswith("W/"):
+            headers["If-Range"] = etag
+        elif self.meta.get("last_modified"):
+            headers["If-Range"] = self.meta["last_modified"]
+        return headers
+
+    def run(self) -> bool:
+        """阻塞下载，完成返回 True，取消返回 False，失败抛出 TransferError"""
+        attempt = 0
+        while True:
+            if self.cancel_check():
+                return False
+            offset = self.resume_offset()
+            if offset == 0:
+                self.discard()
+            self.downloaded = offset
+            if self.hasher:
+                # 同一进程内重试时摘要前沿已在 offset，不需要重新读取
+                self.hasher.sync(self.path, offset)
+            try:
+                return self._attempt(offset)
+            except _RestartTransfer as e:
+                print(f"⚠️  无法续传，从头下载: {str(e)}\n")
+                self.discard()
+                attempt += 1
+                if attempt > self.max_retries:
+                    raise TransferError(str(e)) from e
+            except (requests.RequestException, OSError) as e:
+                attempt = 0 if self.downloaded > offset else attempt + 1
+                if attempt > self.max_retries:
+                    raise TransferError(f"下载失败: {str(e)}") from e
+                if not self._backoff(attempt):
+                    return False
+
+    def _backoff(self, attempt: int) -> bool:
+        """指数退避等待，期间取消则返回 False"""
+        deadline = time.monotonic() + min(2 ** max(attempt - 1, 0), MAX_BACKOFF)
+        while time.monotonic() < deadline:
+            if self.cancel_check():
+                return False
+            time.sleep(0.1)
+        return True
+
+    def _attempt(self, offset: int) -> bool:
+        headers = self._request_headers(offset)
+        with requests.get(self.url, headers=headers, stream=True, timeout=self.timeout) as response:
+            status = response.status_code
+            if offset > 0 and status == 416:
+                # 请求的起点超出文件末尾：已下载完整时直接完成，否则从头下载
+                if self.meta.get("size") and offset == self.meta["size"]:
+                    self.total = offset
+                    self._finish()
+                    return True
+                raise _RestartTransfer("服务器返回 416")
+            if offset > 0 and status == 200:
+                # 文件已变化（If-Range 不匹配）或服务器不支持 Range：直接用这次的完整内容覆盖临时文件
+                reason = "服务器文件已变化" if headers.get("If-Range") else "服务器不支持 Range"
+                print(f"⚠️  无法续传，从头下载: {reason}\n")
+                offset = self.downloaded = 0
+                if self.hasher:
+                    self.hasher.reset()
+            if status == 206:
+                content_range = parse_content_range(response.headers.get("content-range", ""))
+                if not content_range or content_range[0] != offset:
+                    raise _RestartTransfer(f"Content-Range 不匹配: {response.headers.get('content-range', '')}")
+                self.total = content_range[2] or self.meta.get("size", 0)
+            elif status == 200:
+                self.total = int(response.headers.get("content-length", 0) or 0)
+            elif status >= 500:
+                raise requests.RequestException(f"服务器错误，状态码: {status}")
+            else:
+                raise TransferError(f"下载失败，状态码: {status}")
+
+            if offset == 0:
+                self.meta = {"url": self.url, "etag": response.headers.get("etag", ""),
+                             "last_modified": response.headers.get("last-modified", ""), "size": self.total}
+                self._save_meta()
+
+            with open(self.path, 'ab' if offset > 0 else 'wb') as f:
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    if self.cancel_check():
+                        return False
+                    while self.pause_check and self.pause_check():
+                        if self.cancel_check():
+                            return False
+                        time.sleep(0.1)
+                    if chunk:
+                        f.write(chunk)
+                        self.downloaded += len(chunk)
+                        if self.hasher:
+                            self.hasher.update(chunk)
+                        if self.on_progress:
+                            self.on_progress(self.downloaded, self.total)
+
+        if self.total and self.downloaded < self.total:
+            # 连接提前断开，按网络错误重试（会从当前位置续传）
+            raise requests.RequestException(f"连接中断，已下载 {self.downloaded}/{self.total} 字节")
+        if self.total and self.downloaded > self.total:
+            raise _RestartTransfer(f"下载内容超出文件大小 {self.total}")
+        self._finish()
+        return True
+
+    def _finish(self):
+        if os.path.exists(self.meta_path):
+            os.remove(self.meta_path)
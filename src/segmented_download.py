@@ -0,0 +1,369 @@
+import json
+import os
+import threading
+import time
+import requests
+from typing import Callable, List, Optional
+from stream_hash import StreamingHasher
+
+DEFAULT_SEGMENTS = 4
+# 小于该大小的文件不分段，多连接的握手开销得不偿失
+MIN_SEGMENT_SIZE = 1024 * 1024
+CHUNK_SIZE = 256 * 1024
+# 分段进度写入段映射文件的最小间隔（秒）
+MAP_SAVE_INTERVAL = 1.0
+
+
+class SegmentedDownloadError(Exception):
+    """服务器不支持分段下载（未返回 206 或 Content-Range 不匹配），调用方应回退到单连接下载"""
+
+
+def plan_segments(size: int, count: int, min_size: int = MIN_SEGMENT_SIZE) -> List[dict]:
+    """把文件按字节范围平均分为最多 count 段，每段至少 min_size 字节"""
+    count = max(1, min(count, size // max(min_size, 1)))
+    segment_size = size // count
+    segments = []
+    for index in range(count):
+        start = index * segment_size
+        end = size - 1 if index == count - 1 else start + segment_size - 1
+        segments.append({"start": start, "end": end, "done": 0})
+    return segments
+
+
+def parse_content_range(value: str) -> Optional[tuple]:
+    """解析 "bytes 100-199/1000"，返回 (start, end, total)，total 未知时为 None"""
+    try:
+        unit, _, spec = value.strip().partition(" ")
+        if unit.lower() != "bytes":
+            return None
+        byte_range, _, total = spec.partition("/")
+        start, _, end = byte_range.partition("-")
+        return int(start), int(end), (None if total == "*" else int(total))
+    except (ValueError, AttributeError):
+        return None
+
+
+def probe_url(url: str, timeout: int = 10) -> dict:
+    """用 HEAD 请求获取文件大小、是否支持 Range 和校验头（跟随重定向，取最终地址的响应），失败时返回空信息"""
+    try:
+        response = requests.head(url, timeout=timeout, allow_redirects=True)
+        if response.status_code == 200:
+            return {
+                'size': int(response.headers.get('content-length', 0) or 0),
+                'content_type': response.headers.get('content-type', ''),
+                'supports_range': response.headers.get('accept-ranges', 'none').lower() == 'bytes',
+                'etag': response.headers.get('etag', ''),
+                'last_modified': response.headers.get('last-modified', '')
+            }
+    except (requests.RequestException, ValueError):
+        pass
+    return {'size': 0, 'content_type': '', 'supports_range': False, 'etag': '', 'last_modified': ''}
+
+
+class SegmentedDownloader:
+    """多连接分段下载：每段用独立连接请求字节范围，写入预分配文件的对应偏移
+
+    段映射（每段的起止位置和已完成字节数）保存在 <文件>.segments 中，中断后可继续；
+    失败的段单独重试，不影响其他段。
+
+    传入 hasher 时边下载边计算摘要：第一段的数据到达时直接计算，
+    摘要前沿进入后面的段时先从文件补算该段已写入的部分，再继续接收该段的数据
+    """
+
+    def __init__(self, url: str, path: str, size: int, etag: str = "", segments: int = DEFAULT_SEGMENTS,
+                 chunk_size: int = CHUNK_SIZE, timeout: int = 30, max_retries: int = 3,
+                 cancel_event: Optional[threading.Event] = None, last_modified: str = "",
+                 cancel_check: Optional[Callable[[], bool]] = None,
+                 pause_check: Optional[Callable[[], bool]] = None,
+                 on_progress: Optional[Callable[[int, int], None]] = None,
+                 hasher: Optional[StreamingHasher] = None):
+        self.url = url
+        self.path = path
+        self.size = size
+        self.etag = etag
+        self.last_modified = last_modified
+        self.segment_count = max(int(segments), 1)
+        self.chunk_size = chunk_size
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.cancel_event = cancel_event or threading.Event()
+        self.cancel_check = cancel_check or (lambda: False)
+        self.pause_check = pause_check
+        self.on_progress = on_progress
+        self.hasher = hasher
+        self._hash_lock = threading.Lock()
+        self.map_path = path + ".segments"
+        self.segments = []
+        self._lock = threading.Lock()
+        self._last_save = 0.0
+        self._errors = []
+        self._stop = threading.Event()  # 某一段彻底失败时通知其他段停止
+
+    def _cancelled(self) -> bool:
+        return self.cancel_event.is_set() or self.cancel_check()
+
+    def _stopped(self) -> bool:
+        return self._cancelled() or self._stop.is_set()
+
+    @property
+    def downloaded(self) -> int:
+        with self._lock:
+            return sum(segment["done"] for segment in self.segments)
+
+    def _load_map(self) -> bool:
+        """读取段映射，地址、大小或 ETag 不一致时视为无效"""
+        if not (os.path.exists(self.map_path) and os.path.exists(self.path)):
+            return False
+        try:
+            with open(self.map_path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if saved.get("url") != self.url or saved.get("size") != self.size or saved.get("etag", "") != self.etag \
+                or saved.get("last_modified", "") != self.last_modified:
+            return False
+        if os.path.getsize(self.path) != self.size:
+            return False
+        self.segments = saved.get("segments", [])
+        return bool(self.segments)
+
+    def _save_map(self, force: bool = False):
+        now = time.monotonic()
+        with self._lock:
+            if not force and now - self._last_save < MAP_SAVE_INTERVAL:
+                return
+            self._last_save = now
+            data = {"url": self.url, "size": self.size, "etag": self.etag, "last_modified": self.last_modified,
+                    "segments": [dict(segment) for segment in self.segments]}
+        # 计入完成字节的数据都已从缓冲区写出，段映射记录之前先写入磁盘，崩溃后映射不会超前于文件内容
+        fd = os.open(self.path, os.O_RDWR if os.name == "nt" else os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        temp_path = self.map_path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(temp_path, self.map_path)
+
+    def _prepare(self):
+        if self._load_map():
+            if self.hasher:
+                with self._hash_lock:
+                    # 同一进程内继续时前沿之前的数据都已写入，可以接着用；否则（跨进程）从头补算
+                    if self.hasher.offset > self._contiguous_end():
+                        self.hasher.reset()
+                    self._hash_catch_up()
+            return
+        if self.hasher:
+            self.hasher.reset()
+        self.segments = plan_segments(self.size, self.segment_count)
+        # 预分配文件，各段直接写入自己的偏移
+        with open(self.path, 'wb') as f:
+            f.truncate(self.size)
+        self._save_map(force=True)
+
+    def download(self) -> bool:
+        """阻塞下载全部分段，成功返回 True，取消返回 False；服务器不支持分段时抛出 SegmentedDownloadError"""
+        self._prepare()
+        self._errors = []
+        self._stop.clear()
+        threads = [threading.Thread(target=self._run_segment, args=(segment,), daemon=True)
+                   for segment in self.segments if segment["start"] + segment["done"] <= segment["end"]]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self._save_map(force=True)
+
+        for error in self._errors:
+            if isinstance(error, SegmentedDownloadError):
+                raise error
+        if self._errors:
+            raise self._errors[0]
+        if self._cancelled():
+            return False
+        if self.hasher:
+            with self._hash_lock:
+                self._hash_catch_up()
+        os.remove(self.map_path)
+        return True
+
+    def _run_segment(self, segment: dict):
+        session = requests.Session()
+        attempt = 0
+        try:
+            while segment["start"] + segment["done"] <= segment["end"] and not self._stopped():
+                try:
+                    self._fetch_segment(session, segment)
+                    attempt = 0
+                except SegmentedDownloadError as e:
+                    self._fail(e)
+                    return
+                except (requests.RequestException, OSError) as e:
+                    attempt += 1
+                    if attempt > self.max_retries:
+                        self._fail(e)
+                        return
+                    # 只重试这一段，等待时间指数增长
+                    time.sleep(min(2 ** (attempt - 1), 30))
+        finally:
+            session.close()
+
+    def _fail(self, error: Exception):
+        with self._lock:
+            self._errors.append(error)
+        # 一段彻底失败时让其他段尽快停下，已完成的部分保留在段映射中
+        self._stop.set()
+
+    def _fetch_segment(self, session: requests.Session, segment: dict):
+        start = segment["start"] + segment["done"]
+        headers = {"Range": f"bytes={start}-{segment['end']}"}
+        # 文件已变化时服务器返回 200 完整内容，而不是旧文件的片段；If-Range 只接受强 ETag，弱 ETag 时改用 Last-Modified
+        if self.etag and not self.etag.startswith("W/"):
+            headers["If-Range"] = self.etag
+        elif self.last_modified:
+            headers["If-Range"] = self.last_modified
+        with session.get(self.url, headers=headers, stream=True, timeout=self.timeout) as response:
+            if response.status_code != 206:
+                raise SegmentedDownloadError(f"服务器未返回分段内容，状态码: {response.status_code}")
+            content_range = parse_content_range(response.headers.get("content-range", ""))
+            if not content_range or content_range[0] != start or content_range[2] not in (None, self.size):
+                raise SegmentedDownloadError(f"Content-Range 不匹配: {response.headers.get('content-range', '')}")
+
+            with open(self.path, 'r+b') as f:
+                f.seek(start)
+                for chunk in response.iter_content(chunk_size=self.chunk_size):
+                    if self._stopped():
+                        return
+                    while self.pause_check and self.pause_check():
+                        if self._stopped():
+                            return
+                        time.sleep(0.1)
+                    if not chunk:
+                        continue
+                    remaining = segment["end"] - (segment["start"] + segment["done"]) + 1
+                    chunk = chunk[:remaining]
+                    position = f.tell()
+                    f.write(chunk)
+                    # 计入完成字节前先写出缓冲区：其他线程可能从文件补算这段数据，段映射保存前也会 fsync 这些数据
+                    f.flush()
+                    with self._lock:
+                        segment["done"] += len(chunk)
+                    if self.hasher:
+                        self._feed_hasher(position, chunk)
+                    if self.on_progress:
+                        self.on_progress(self.downloaded, self.size)
+                    self._save_map()
+                    if remaining <= len(chunk):
+                        break
+
+    def _written_end(self, position: int) -> int:
+        """包含 position 的段中已写入部分的结束位置（不含），position 不在已写入部分时返回 position"""
+        with self._lock:
+            for segment in self.segments:
+                if segment["start"] <= position <= segment["end"]:
+                    return max(segment["start"] + segment["done"], position)
+        return position
+
+    def _contiguous_end(self) -> int:
+        """从文件开头起连续写入的数据的结束位置"""
+        end = 0
+        with self._lock:
+            for segment in sorted(self.segments, key=lambda item: item["start"]):
+                if segment["start"] != end:
+                    break
+                end = segment["start"] + segment["done"]
+                if end <= segment["end"]:
+                    break
+        return end
+
+    def _hash_catch_up(self):
+        # 前沿所在的段已写入的部分从文件补算，补完后前沿可能进入下一段，继续补算
+        while True:
+            end = self._written_end(self.hasher.offset)
+            if end <= self.hasher.offset:
+                return
+            self.hasher.catch_up(self.path, end)
+
+    def _feed_hasher(self, position: int, chunk: bytes):
+        with self._hash_lock:
+            if position == self.hasher.offset:
+                self.hasher.update(chunk)
+            self._hash_catch_up()
+
+    def discard(self):
+        """删除段映射（文件本身由调用方处理）"""
+        if os.path.exists(self.map_path):
+            os.remove(self.map_path)
+
+
+def _run_benchmark(size_mb: int, rate_mb: float, segment_counts: List[int]):
+    """用本地支持 Range 的 HTTP 服务器（每个连接限速）比较不同分段数的下载耗时"""
+    import tempfile
+    from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+
+    work_dir = tempfile.mkdtemp(prefix="segmented-bench-")
+    payload = os.path.join(work_dir, "update.zip")
+    with open(payload, 'wb') as f:
+        f.write(os.urandom(size_mb * 1024 * 1024))
+    bytes_per_second = rate_mb * 1024 * 1024
+
+    class RangeHandler(SimpleHTTPRequestHandler):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, directory=work_dir, **kwargs)
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            file_size = os.path.getsize(payload)
+            start, end = 0, file_size - 1
+            range_header = self.headers.get("Range", "")
+            if range_header.startswith("bytes="):
+                first, _, last = range_header[6:].partition("-")
+                start = int(first)
+                end = int(last) if last else end
+                self.send_response(206)
+                self.send_header("Content-Range", f"bytes {start}-{end}/{file_size}")
+            else:
+                self.send_response(200)
+            self.send_header("Accept-Ranges", "bytes")
+            self.send_header("Content-Length", str(end - start + 1))
+            self.end_headers()
+            with open(payload, 'rb') as f:
+                f.seek(start)
+                remaining = end - start + 1
+                while remaining > 0:
+                    block = f.read(min(64 * 1024, remaining))
+                    self.wfile.write(block)
+                    remaining -= len(block)
+                    # 模拟单连接带宽上限
+                    time.sleep(len(block) / bytes_per_second)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), RangeHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/update.zip"
+    total = os.path.getsize(payload)
+
+    for count in segment_counts:
+        target = os.path.join(work_dir, f"download-{count}.zip")
+        start_time = time.perf_counter()
+        SegmentedDownloader(url, target, total, segments=count, chunk_size=64 * 1024).download()
+        elapsed = time.perf_counter() - start_time
+        with open(payload, 'rb') as a, open(target, 'rb') as b:
+            identical = a.read() == b.read()
+        print(f"{count:>2} 段: {elapsed:.2f}s, {total / elapsed / 1024 / 1024:.1f} MB/s, "
+              f"{'内容一致' if identical else '内容不一致'}")
+        os.remove(target)
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="分段下载基准测试（本地支持 Range 的 HTTP 服务器）")
+    parser.add_argument("--size", type=int, default=32, help="测试文件大小（MB）")
+    parser.add_argument("--rate", type=float, default=8, help="单连接限速（MB/s）")
+    parser.add_argument("--segments", type=int, nargs="+", default=[1, 2, 4, 8], help="要比较的分段数")
+    args = parser.parse_args()
+    _run_benchmark(args.size, args.rate, args.segments)
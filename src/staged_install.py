@@ -0,0 +1,297 @@
+import json
+import os
+import shutil
+import time
+from typing import Callable, Dict, Iterable, List, Optional
+from delta_update import normalize_path
+from io_pool import DEFAULT_WORKERS, IOPool
+
+STAGING_DIR = ".staging"
+JOURNAL_NAME = "journal.json"
+
+
+class StagedInstallError(Exception):
+    """暂存安装无法完成，安装目录保持（或已恢复为）安装前的状态"""
+
+
+def _fsync(path: str, directory: bool = False):
+    if directory and os.name == "nt":
+        # Windows 不能打开目录句柄，目录项的持久化由 NTFS 日志保证
+        return
+    fd = os.open(path, os.O_RDWR if os.name == "nt" and not directory else os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _remove(path: str):
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    elif os.path.lexists(path):
+        os.remove(path)
+
+
+def _place_file(operation):
+    """把一个文件放到暂存位置并写入磁盘
+
+    mode 为 "link" 时来源是安装目录中未变化的文件，建立硬链接（与 BackupStore 相同，不复制数据，
+    内容已在磁盘上，目录项随暂存目录统一 fsync）；为 "move" 时来源是临时解压目录，直接改名；
+    不支持硬链接或跨文件系统时退回复制
+    """
+    source, target, mode = operation
+    if mode == "link" and not os.path.islink(source):
+        try:
+            os.link(source, target)
+            return
+        except OSError:
+            pass
+    if mode == "move":
+        try:
+            os.replace(source, target)
+        except OSError:
+            shutil.copy2(source, target, follow_symlinks=False)
+    else:
+        shutil.copy2(source, target, follow_symlinks=False)
+    if not os.path.islink(target):
+        _fsync(target)
+
+
+def _walk(root: str):
+    """目录树中的子目录和文件（相对路径，使用 "/"），不跟随符号链接"""
+    directories, files = [], []
+    for dirpath, dirnames, filenames in os.walk(root):
+        relative_dir = os.path.relpath(dirpath, root).replace(os.sep, "/")
+        prefix = "" if relative_dir == "." else relative_dir + "/"
+        for name in dirnames:
+            (files if os.path.islink(os.path.join(dirpath, name)) else directories).append(prefix + name)
+        files.extend(prefix + name for name in filenames)
+    return directories, files
+
+
+def _covered(path: str, prefixes: Iterable[str]) -> bool:
+    return any(path == prefix or path.startswith(prefix + "/") for prefix in prefixes)
+
+
+def _tree_signature(path: str) -> Optional[List[int]]:
+    """文件数、总大小和最新修改时间，用于发现暂存之后安装目录中被修改的内容"""
+    if not os.path.lexists(path):
+        return None
+    if not os.path.isdir(path):
+        stat = os.lstat(path)
+        return [1, stat.st_size, stat.st_mtime_ns]
+    count = size = latest = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            stat = os.lstat(os.path.join(dirpath, name))
+            count += 1
+            size += stat.st_size
+            latest = max(latest, stat.st_mtime_ns)
+    return [count, size, latest]
+
+
+class StagedInstall:
+    """在安装目录旁构建新版本的目录树，写入磁盘后用重命名整体换入
+
+    安装以顶层项目（如 ui、src）为单位：每个单位先在 .staging/new 中构建完整的新内容
+    （当前内容加上更新的文件、去掉删除的文件），fsync 之后依次把当前内容改名到 .staging/previous、
+    把新内容改名到安装目录。暂存目录与安装目录在同一文件系统中，重命名是原子的，
+    换入和回滚所需的时间与目录大小无关，应用不会处于只更新了一半文件的状态。
+
+    每个阶段都记录在日志（journal.json）中：进程在交换中途退出时，recover() 根据日志和
+    实际存在的目录把安装目录恢复原样；上一个版本保留在 .staging/previous 中，直到下次暂存
+    """
+
+    def __init__(self, target_dir: str, staging_dir: Optional[str] = None,
+                 log_callback: Optional[Callable[[str], None]] = None, workers: int = DEFAULT_WORKERS,
+                 on_progress: Optional[Callable[[int, int], None]] = None):
+        self.target_dir = target_dir
+        self.staging_dir = staging_dir or os.path.join(target_dir, STAGING_DIR)
+        self.new_dir = os.path.join(self.staging_dir, "new")
+        self.previous_dir = os.path.join(self.staging_dir, "previous")
+        self.journal_path = os.path.join(self.staging_dir, JOURNAL_NAME)
+        self.log_callback = log_callback
+        self.workers = workers
+        self.on_progress = on_progress
+
+    def _log(self, message: str):
+        if self.log_callback:
+            self.log_callback(message)
+
+    def load_journal(self) -> Optional[dict]:
+        try:
+            with open(self.journal_path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_journal(self, journal: dict):
+        os.makedirs(self.staging_dir, exist_ok=True)
+        temp_path = self.journal_path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(journal, f, indent=2, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.journal_path)
+        _fsync(self.staging_dir, directory=True)
+
+    @property
+    def state(self) -> str:
+        journal = self.load_journal()
+        return journal.get("state", "") if journal else ""
+
+    def is_staged(self) -> bool:
+        return self.state == "staged"
+
+    def can_rollback(self) -> bool:
+        return self.state == "installed"
+
+    def discard(self):
+        """删除暂存目录（包括保留的上一个版本），有未完成的交换时先恢复"""
+        self.recover()
+        if os.path.exists(self.staging_dir):
+            shutil.rmtree(self.staging_dir)
+
+    def stage(self, files: Dict[str, str], delete_files: Iterable[str] = (), move: bool = False,
+              info: Optional[dict] = None) -> dict:
+        """构建新版本：files 是安装目录中的相对路径到来源（文件或目录，目录整体替换）的映射，
+        delete_files 是要删除的相对路径；move 为 True 时来源直接改名到暂存目录。返回日志
+        """
+        self.discard()
+        changes = {normalize_path(path): source for path, source in files.items()}
+        deletes = [normalize_path(path) for path in delete_files]
+        names = sorted({path.split("/")[0] for path in list(changes) + deletes})
+        journal = {"state": "staging", "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+                   "units": [], "info": info or {}}
+        self._write_journal(journal)
+        os.makedirs(self.new_dir)
+
+        # 先规划每个单位需要的目录和文件操作：当前内容中未变化的文件建立硬链接，跳过会被替换或删除的路径
+        directories, operations = [], []
+        source_mode = "move" if move else "copy"
+        for name in names:
+            current = os.path.join(self.target_dir, name)
+            replaced = [path for path in list(changes) + deletes if _covered(path, [name])]
+            unit = {"path": name, "signature": None}
+            start = len(directories) + len(operations)
+            if name not in changes and os.path.lexists(current):
+                unit["signature"] = _tree_signature(current)
+                if os.path.isdir(current) and not os.path.islink(current):
+                    sub_dirs, sub_files = _walk(current)
+                    directories.extend(path for path in [name] + [f"{name}/{sub}" for sub in sub_dirs]
+                                       if not _covered(path, replaced))
+                    operations.extend((os.path.join(current, *sub.split("/")), f"{name}/{sub}", "link")
+                                      for sub in sub_files if not _covered(f"{name}/{sub}", replaced))
+                elif not _covered(name, replaced):
+                    operations.append((current, name, "link"))
+            for path in sorted(changes):
+                if not _covered(path, [name]):
+                    continue
+                source = changes[path]
+                if os.path.isdir(source) and not os.path.islink(source):
+                    sub_dirs, sub_files = _walk(source)
+                    directories.append(path)
+                    directories.extend(f"{path}/{sub}" for sub in sub_dirs)
+                    operations.extend((os.path.join(source, *sub.split("/")), f"{path}/{sub}", source_mode)
+                                      for sub in sub_files)
+                else:
+                    operations.append((source, path, source_mode))
+            unit["present"] = len(directories) + len(operations) > start
+            journal["units"].append(unit)
+
+        directories = sorted(set(directories) | {os.path.dirname(target) for _, target, _ in operations} - {""})
+        for path in directories:
+            os.makedirs(os.path.join(self.new_dir, *path.split("/")), exist_ok=True)
+        IOPool(self.workers, self.on_progress).map(
+            _place_file, [(source, os.path.join(self.new_dir, *target.split("/")), mode)
+                          for source, target, mode in operations])
+        # 复制或移动的文件已在放置时逐个写入磁盘，这里把目录项（包括硬链接）也写入磁盘
+        IOPool(self.workers).map(lambda path: _fsync(path, directory=True),
+                                 [self.new_dir] + [os.path.join(self.new_dir, *path.split("/"))
+                                                   for path in directories])
+        self._log(f"已暂存 {len(operations)} 个文件: {', '.join(names)}")
+
+        journal["state"] = "staged"
+        self._write_journal(journal)
+        return journal
+
+    def stage_manifest(self, source_dir: str, manifest: dict, move: bool = False,
+                       info: Optional[dict] = None) -> dict:
+        """按 update_manifest.json 暂存：只替换列出的文件（来源不存在的跳过）并删除 delete_files"""
+        files = {}
+        for entry in manifest.get("files", []):
+            relative_path = normalize_path(entry["path"])
+            source = os.path.join(source_dir, *relative_path.split("/"))
+            if os.path.exists(source):
+                files[relative_path] = source
+        return self.stage(files, manifest.get("delete_files", []), move, info)
+
+    def swap(self) -> List[str]:
+        """把暂存的新版本换入安装目录，失败时恢复原样并抛出 StagedInstallError，返回换入的单位"""
+        journal = self.load_journal()
+        if not journal or journal.get("state") != "staged":
+            raise StagedInstallError("没有已暂存的新版本")
+        for unit in journal["units"]:
+            if unit["signature"] is not None and \
+                    _tree_signature(os.path.join(self.target_dir, unit["path"])) != unit["signature"]:
+                raise StagedInstallError(f"暂存之后 {unit['path']} 已被修改，需要重新暂存")
+            unit["existed"] = os.path.lexists(os.path.join(self.target_dir, unit["path"]))
+
+        # 回滚根据 previous 中是否存在某个单位判断它是否已被移走，开始前清除残留
+        for unit in journal["units"]:
+            _remove(os.path.join(self.previous_dir, unit["path"]))
+        os.makedirs(self.previous_dir, exist_ok=True)
+        journal["state"] = "swapping"
+        self._write_journal(journal)
+        try:
+            for unit in journal["units"]:
+                target = os.path.join(self.target_dir, unit["path"])
+                if unit["existed"]:
+                    os.replace(target, os.path.join(self.previous_dir, unit["path"]))
+                if unit["present"]:
+                    os.replace(os.path.join(self.new_dir, unit["path"]), target)
+            _fsync(self.target_dir, directory=True)
+        except OSError as e:
+            # 换回后新内容回到暂存目录，暂存仍然有效，可以稍后重试（如等待文件句柄释放）
+            self.rollback()
+            journal["state"] = "staged"
+            self._write_journal(journal)
+            raise StagedInstallError(f"换入新版本失败，已恢复原来的文件: {str(e)}")
+
+        journal["state"] = "installed"
+        journal["installed"] = time.strftime("%Y-%m-%d %H:%M:%S")
+        self._write_journal(journal)
+        names = [unit["path"] for unit in journal["units"]]
+        self._log(f"已换入: {', '.join(names)}")
+        return names
+
+    def rollback(self) -> bool:
+        """把保留的上一个版本改名换回，可以从交换或回滚的任意中间状态继续；没有可回滚的安装时返回 False"""
+        journal = self.load_journal()
+        if not journal or journal.get("state") not in ("swapping", "installed", "rolling_back"):
+            return False
+        journal["state"] = "rolling_back"
+        self._write_journal(journal)
+        os.makedirs(self.new_dir, exist_ok=True)
+        for unit in reversed(journal["units"]):
+            target = os.path.join(self.target_dir, unit["path"])
+            previous = os.path.join(self.previous_dir, unit["path"])
+            # 旧内容已移走，或者原来不存在时，安装目录中的就是新内容
+            if (os.path.lexists(previous) or not unit.get("existed", True)) and os.path.lexists(target):
+                staged = os.path.join(self.new_dir, unit["path"])
+                _remove(staged)
+                os.replace(target, staged)
+            if os.path.lexists(previous):
+                os.replace(previous, target)
+        _fsync(self.target_dir, directory=True)
+        journal["state"] = "rolled_back"
+        self._write_journal(journal)
+        self._log(f"已换回: {', '.join(unit['path'] for unit in journal['units'])}")
+        return True
+
+    def recover(self) -> bool:
+        """启动或安装前调用：上次交换没有完成时把安装目录恢复为安装前的状态"""
+        if self.state in ("swapping", "rolling_back"):
+            self._log("检测到未完成的安装，正在恢复...")
+            return self.rollback()
+        return False
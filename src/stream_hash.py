@@ -0,0 +1,66 @@
+import hashlib
+from typing import Dict, Iterable
+
+HASH_ALGORITHMS = ("md5", "sha256")
+READ_CHUNK_SIZE = 1024 * 1024
+
+
+class StreamingHasher:
+    """在下载写入的同时计算摘要，数据写完时摘要也随之完成，不需要再完整读一遍文件
+
+    摘要只能按顺序计算：offset 是已经计算到的位置（前沿），乱序到达的数据（分段下载）
+    先写入文件，前沿追上时再用 catch_up 从文件读取补算。
+    hashlib 的中间状态无法序列化，同一进程内的续传可以继续使用这个对象，
+    跨进程续传时需要对已下载的部分补算一次
+    """
+
+    def __init__(self, algorithms: Iterable[str] = HASH_ALGORITHMS):
+        self.algorithms = tuple(algorithms)
+        self.reset()
+
+    def reset(self):
+        self._hashes = {name: hashlib.new(name) for name in self.algorithms}
+        self.offset = 0
+
+    def update(self, data: bytes):
+        for hash_object in self._hashes.values():
+            hash_object.update(data)
+        self.offset += len(data)
+
+    def catch_up(self, path: str, end: int):
+        """从文件读取 [offset, end) 补算摘要"""
+        if end <= self.offset:
+            return
+        with open(path, 'rb') as f:
+            f.seek(self.offset)
+            while self.offset < end:
+                data = f.read(min(READ_CHUNK_SIZE, end - self.offset))
+                if not data:
+                    raise OSError(f"文件长度不足 {end} 字节: {path}")
+                self.update(data)
+
+    def sync(self, path: str, offset: int):
+        """让前沿与续传位置一致：超过续传位置（文件被截断）时重新计算，落后时从文件补算"""
+        if self.offset > offset:
+            self.reset()
+        self.catch_up(path, offset)
+
+    def hexdigests(self) -> Dict[str, str]:
+        return {name: hash_object.hexdigest() for name, hash_object in self._hashes.items()}
+
+
+def hash_file(path: str, algorithms: Iterable[str] = HASH_ALGORITHMS) -> Dict[str, str]:
+    """一次读取文件同时计算多种摘要"""
+    hasher = StreamingHasher(algorithms)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(READ_CHUNK_SIZE), b''):
+            hasher.update(chunk)
+    return hasher.hexdigests()
+
+
+def verify_digests(digests: Dict[str, str], expected: Dict[str, str]) -> str:
+    """与期望的摘要比较（忽略为空的期望值），全部一致返回空字符串，否则返回错误信息"""
+    for name, value in expected.items():
+        if value and digests.get(name, "").lower() != value.strip().lower():
+            return f"{name.upper()}校验失败: 期望 {value}, 实际 {digests.get(name, '')}"
+    return ""
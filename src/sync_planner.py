@@ -0,0 +1,241 @@
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from network_backend import api_url, server_key
+from update_checker import normalize_digest
+
+# 每台服务器同时执行的操作数（拉取会占满带宽，默认串行）
+DEFAULT_PER_HOST_CONCURRENCY = 1
+# 同时处理的服务器数
+DEFAULT_MAX_HOSTS = 8
+
+
+def normalize_model_name(name):
+    """补全默认标签，与 /api/tags 返回的名称保持一致"""
+    name = name.strip()
+    if name and ":" not in name.rsplit("/", 1)[-1]:
+        name += ":latest"
+    return name
+
+
+def load_desired_state(path):
+    """读取期望状态文件，不存在或格式错误时返回空配置"""
+    if not os.path.exists(path):
+        return {"groups": []}
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            desired = json.load(f)
+        if not isinstance(desired.get("groups"), list):
+            return {"groups": []}
+        return desired
+    except Exception as e:
+        print(f"❌ Error loading desired model state: {str(e)}\n")
+        return {"groups": []}
+
+
+def _group_matches(group, server):
+    patterns = group.get("servers", ["*"])
+    return "*" in patterns or server.get("name") in patterns or server_key(server) in patterns
+
+
+def _model_entries(group):
+    for entry in group.get("models", []):
+        if isinstance(entry, str):
+            entry = {"name": entry}
+        name = normalize_model_name(entry.get("name", ""))
+        if name:
+            yield name, entry.get("digest", "")
+
+
+def pinned_models(desired):
+    """期望状态中固定了 digest 的模型名称（需要查询 registry 当前的 digest）"""
+    return sorted({name for group in desired.get("groups", [])
+                   for name, digest in _model_entries(group) if digest})
+
+
+def plan_sync(desired, servers, host_models, latest_digests=None, registry_digests=None):
+    """计算每台服务器需要执行的最少拉取和删除操作
+
+    desired: {"groups": [{"servers": [...], "models": [名称或 {"name", "digest"}],
+              "prune": bool, "update_outdated": bool}]}
+    host_models: server_key -> {模型名称: digest}，来自 /api/tags
+    latest_digests: 模型名称 -> 集群中最新的 digest，用于 update_outdated
+    registry_digests: 模型名称 -> registry 中该标签当前的 digest；拉取只能得到这个版本，
+                      固定的 digest 与其不同时无法通过拉取达到，记入 unreachable 而不是每次都计划拉取
+    """
+    latest_digests = latest_digests or {}
+    registry_digests = registry_digests or {}
+    plans = []
+    for server in servers:
+        key = server_key(server)
+        if key not in host_models:
+            continue  # 没有该服务器的模型列表（离线），不做计划
+        current = host_models[key]
+        wanted = {}  # 模型名称 -> 期望 digest（空表示任意版本）
+        pinned = set()
+        prune = False
+        for group in desired.get("groups", []):
+            if not _group_matches(group, server):
+                continue
+            prune = prune or bool(group.get("prune", False))
+            for name, digest in _model_entries(group):
+                if digest:
+                    pinned.add(name)
+                elif group.get("update_outdated", False):
+                    digest = latest_digests.get(name, "")
+                wanted[name] = digest or wanted.get(name, "")
+
+        pulls, unreachable = [], []
+        for name, digest in sorted(wanted.items()):
+            digest = normalize_digest(digest)
+            if name in current and (not digest or normalize_digest(current[name]) == digest):
+                continue
+            if name in pinned and digest and normalize_digest(registry_digests.get(name, "")) != digest:
+                unreachable.append({"model": name, "digest": digest,
+                                    "current": normalize_digest(current.get(name, "")),
+                                    "registry": normalize_digest(registry_digests.get(name, ""))})
+                continue
+            pulls.append(name)
+        deletes = sorted(name for name in current if name not in wanted) if prune else []
+        if pulls or deletes or unreachable:
+            plans.append({"key": key, "name": server.get("name", key),
+                          "address": server["address"], "port": server["port"],
+                          "pulls": pulls, "deletes": deletes, "unreachable": unreachable})
+    return plans
+
+
+def plan_actions(plans):
+    """把计划展开为操作列表，删除排在拉取之前以先释放磁盘空间"""
+    actions = []
+    for plan in plans:
+        for op in ("delete", "pull"):
+            for model_name in plan[op + "s"]:
+                actions.append({"id": f"{plan['key']}|{op}|{model_name}", "key": plan["key"],
+                                "name": plan["name"], "address": plan["address"], "port": plan["port"],
+                                "op": op, "model": model_name})
+    return actions
+
+
+class FleetSyncRunner:
+    """并行执行同步操作：不同服务器并行，同一服务器受并发上限约束，进度持久化以便中断后继续"""
+
+    def __init__(self, state_file, per_host_concurrency=DEFAULT_PER_HOST_CONCURRENCY,
+                 max_hosts=DEFAULT_MAX_HOSTS):
+        self.state_file = state_file
+        self.per_host_concurrency = max(int(per_host_concurrency), 1)
+        self.max_hosts = max(int(max_hosts), 1)
+        self.cancel_event = threading.Event()
+        self._lock = threading.Lock()
+        self._running = False
+        self._state = {"pending": [], "completed": [], "failed": []}
+
+    @property
+    def running(self):
+        return self._running
+
+    def load_pending(self):
+        """读取上次未完成的操作"""
+        if os.path.exists(self.state_file):
+            try:
+                with open(self.state_file, 'r', encoding='utf-8') as f:
+                    return json.load(f).get("pending", [])
+            except Exception as e:
+                print(f"❌ Error loading sync state: {str(e)}\n")
+        return []
+
+    def _save_state(self):
+        try:
+            with open(self.state_file, 'w', encoding='utf-8') as f:
+                json.dump(self._state, f, indent=2, ensure_ascii=False)
+        except Exception as e:
+            print(f"❌ Error saving sync state: {str(e)}\n")
+
+    def run(self, actions, on_progress, on_finished):
+        """阻塞执行全部操作（应在后台线程中调用）"""
+        with self._lock:
+            if self._running:
+                return False
+            self._running = True
+        self.cancel_event.clear()
+        self._state = {"pending": list(actions), "completed": [], "failed": []}
+        self._save_state()
+
+        total = len(actions)
+        host_actions = {}
+        for action in actions:
+            host_actions.setdefault(action["key"], []).append(action)
+
+        def execute(action):
+            if self.cancel_event.is_set():
+                return
+            ok, error = self._execute(action)
+            with self._lock:
+                # 操作只有成功后才移出 pending；失败或被取消的操作保留，下次可继续
+                if ok:
+                    self._state["pending"] = [item for item in self._state["pending"] if item["id"] != action["id"]]
+                    self._state["completed"].append(action["id"])
+                elif not self.cancel_event.is_set():
+                    self._state["failed"].append({"id": action["id"], "error": error})
+                done = len(self._state["completed"]) + len(self._state["failed"])
+                self._save_state()
+            on_progress({"done": done, "total": total, "action": action, "ok": ok, "error": error})
+
+        def run_host(items):
+            # 每台服务器由自己的任务按顺序处理，不会因为操作按服务器排列而占满所有线程
+            if self.per_host_concurrency == 1 or len(items) == 1:
+                for action in items:
+                    execute(action)
+                return
+            with ThreadPoolExecutor(max_workers=min(self.per_host_concurrency, len(items)),
+                                    thread_name_prefix="sync-host") as host_executor:
+                list(host_executor.map(execute, items))
+
+        try:
+            workers = min(self.max_hosts, max(len(host_actions), 1))
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="sync") as executor:
+                list(executor.map(run_host, host_actions.values()))
+        finally:
+            with self._lock:
+                self._running = False
+                failed = len(self._state["failed"])
+                completed = len(self._state["completed"])
+            if self.cancel_event.is_set():
+                on_finished(False, f"同步已取消，已完成 {completed}/{total}")
+            elif failed:
+                on_finished(False, f"同步完成 {completed}/{total}，{failed} 个操作失败")
+            else:
+                on_finished(True, f"同步完成，共 {total} 个操作")
+        return True
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def _execute(self, action):
+        base_url = api_url(action["address"], action["port"])
+        try:
+            if action["op"] == "delete":
+                response = requests.delete(f"{base_url}/delete", json={"name": action["model"]}, timeout=30)
+                return response.status_code == 200, "" if response.status_code == 200 else f"状态码 {response.status_code}"
+
+            response = requests.post(f"{base_url}/pull", json={"name": action["model"]}, stream=True, timeout=30)
+            if response.status_code != 200:
+                return False, f"状态码 {response.status_code}"
+            status = ""
+            for line in response.iter_lines():
+                if self.cancel_event.is_set():
+                    response.close()
+                    return False, "已取消"
+                if not line:
+                    continue
+                try:
+                    data = json.loads(line.decode('utf-8'))
+                except json.JSONDecodeError:
+                    continue
+                if data.get("error"):
+                    return False, data["error"]
+                status = data.get("status", status)
+            return status == "success", "" if status == "success" else f"拉取未完成: {status}"
+        except Exception as e:
+            return False, str(e)
@@ -0,0 +1,130 @@
+import re
+import threading
+import time
+from network_backend import make_request, result_json
+from sync_planner import normalize_model_name
+
+# keep_alive 参数（0.1.23）、/api/ps（0.1.38）、/api/embed 的 keep_alive（0.3.0）开始支持的版本
+KEEP_ALIVE_VERSION = (0, 1, 23)
+PS_VERSION = (0, 1, 38)
+EMBED_VERSION = (0, 3, 0)
+# 确认卸载时轮询 /api/ps 的初始间隔、最大间隔和总超时（秒）
+POLL_INITIAL_INTERVAL = 0.1
+POLL_MAX_INTERVAL = 1.0
+DEFAULT_POLL_TIMEOUT = 10
+
+
+def parse_version(version):
+    """把 "0.5.7"、"0.1.38-rc1" 这样的版本号转为元组，无法解析时返回 None"""
+    match = re.match(r'^v?(\d+)\.(\d+)\.(\d+)', str(version or ""))
+    return tuple(int(part) for part in match.groups()) if match else None
+
+
+class UnloadEngine:
+    """通过 keep_alive=0 卸载模型并轮询 /api/ps 确认，服务器能力按服务器缓存"""
+
+    def __init__(self, network, poll_timeout=DEFAULT_POLL_TIMEOUT):
+        self.network = network
+        self.poll_timeout = poll_timeout
+        self._capabilities = {}  # base_url -> 能力
+        self._lock = threading.Lock()
+
+    def capabilities(self, base_url):
+        """通过 /api/version 检测服务器能力，每台服务器只检测一次
+
+        /api/version 只用于选择卸载方式：没有响应（代理未转发、旧服务器等）时按最新版本处理，
+        不缓存，下次重新检测；服务器是否可达由卸载请求本身的结果决定
+        """
+        with self._lock:
+            cached = self._capabilities.get(base_url)
+        if cached:
+            return cached
+
+        data = result_json(self.network.request(make_request(f"{base_url}/version", timeout=2)))
+        if data is None:
+            return {"version": "", "detected": False, "keepAlive": True, "ps": True, "embed": True}
+        version = parse_version(data.get("version"))
+        # 开发版本可能没有版本号，按最新版本处理
+        capabilities = {
+            "version": data.get("version", ""),
+            "detected": True,
+            "keepAlive": version is None or version >= KEEP_ALIVE_VERSION,
+            "ps": version is None or version >= PS_VERSION,
+            "embed": version is None or version >= EMBED_VERSION
+        }
+        with self._lock:
+            self._capabilities[base_url] = capabilities
+        return capabilities
+
+    def forget(self, base_url):
+        """清除服务器能力缓存（服务器升级或地址变更后）"""
+        with self._lock:
+            self._capabilities.pop(base_url, None)
+
+    def running_models(self, base_url):
+        """当前驻留的模型名称集合（统一带标签），请求失败时返回 None"""
+        data = result_json(self.network.request(make_request(f"{base_url}/ps", timeout=2)))
+        if data is None:
+            return None
+        return {normalize_model_name(model.get(field) or "") for model in data.get("models", [])
+                for field in ("name", "model")} - {""}
+
+    def _evict_specs(self, base_url, model_names):
+        return [make_request(f"{base_url}/generate", "POST", {"model": name, "keep_alive": 0}, timeout=5)
+                for name in model_names]
+
+    def unload_many(self, base_url, model_names):
+        """并行卸载多个模型，返回 {模型名称: (成功, 消息)}"""
+        model_names = list(dict.fromkeys(model_names))
+        if not model_names:
+            return {}
+        capabilities = self.capabilities(base_url)
+        if not capabilities["keepAlive"]:
+            message = f"服务器版本 {capabilities['version']} 不支持 keep_alive 卸载"
+            return {name: (False, message) for name in model_names}
+
+        outcomes = {}
+        results = self.network.request_many(self._evict_specs(base_url, model_names))
+        retry_embed = []
+        for name, result in zip(model_names, results):
+            if result["ok"]:
+                outcomes[name] = (True, "模型卸载成功")
+            elif result["status"] == 400 and capabilities["embed"]:
+                retry_embed.append(name)  # 嵌入模型不支持 generate，改用 /api/embed 卸载
+            else:
+                outcomes[name] = (False, result["error"] or f"状态码 {result['status']}")
+
+        if retry_embed:
+            specs = [make_request(f"{base_url}/embed", "POST", {"model": name, "input": [], "keep_alive": 0},
+                                  timeout=5) for name in retry_embed]
+            for name, result in zip(retry_embed, self.network.request_many(specs)):
+                outcomes[name] = (True, "模型卸载成功") if result["ok"] else \
+                    (False, result["error"] or f"状态码 {result['status']}")
+
+        pending = [name for name, (ok, _) in outcomes.items() if ok]
+        # 版本未知时先确认 /api/ps 可用，没有该接口的旧服务器无法确认，以卸载请求的结果为准
+        if pending and capabilities["ps"] and (capabilities["detected"] or self.running_models(base_url) is not None):
+            for name in self._wait_evicted(base_url, pending):
+                outcomes[name] = (False, "卸载请求已发送，但模型仍在运行")
+        return outcomes
+
+    def _wait_evicted(self, base_url, model_names):
+        """以指数退避轮询 /api/ps，直到模型全部卸载或超时，返回仍在运行的模型"""
+        # /api/ps 返回带标签的名称，未带标签的 llama3 要按 llama3:latest 比较
+        remaining = {normalize_model_name(name): name for name in model_names}
+        interval = POLL_INITIAL_INTERVAL
+        deadline = time.monotonic() + self.poll_timeout
+        while True:
+            running = self.running_models(base_url)
+            if running is not None:
+                remaining = {name: original for name, original in remaining.items() if name in running}
+                if not remaining:
+                    return []
+            if time.monotonic() + interval > deadline:
+                return sorted(remaining.values())
+            time.sleep(interval)
+            interval = min(interval * 2, POLL_MAX_INTERVAL)
+
+    def unload(self, base_url, model_name):
+        """卸载单个模型并确认，返回 (成功, 消息)"""
+        return self.unload_many(base_url, [model_name])[model_name]
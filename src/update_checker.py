@@ -0,0 +1,123 @@
+import hashlib
+import threading
+import time
+from network_backend import make_request
+
+DEFAULT_REGISTRY = "https://registry.ollama.ai"
+# 远程 manifest 摘要的缓存时间（秒）
+DEFAULT_TTL = 3600
+MANIFEST_ACCEPT = "application/vnd.docker.distribution.manifest.v2+json"
+
+UP_TO_DATE = "up_to_date"
+OUTDATED = "outdated"
+UNKNOWN = "unknown"
+
+
+def parse_model_reference(name, default_registry=DEFAULT_REGISTRY):
+    """把模型名称解析为 (registry 地址, 仓库, 标签)
+
+    "llama3" -> 官方库 library/llama3:latest；"user/model:tag" -> user/model；
+    "host.example.com/ns/model:tag" -> 自定义 registry
+    """
+    name = name.strip()
+    tag = "latest"
+    last_part = name.rsplit("/", 1)[-1]
+    if ":" in last_part:
+        name, tag = name.rsplit(":", 1)
+    parts = name.split("/")
+    registry = default_registry.rstrip("/")
+    if len(parts) >= 3 or (len(parts) == 2 and ("." in parts[0] or ":" in parts[0])):
+        registry = f"https://{parts[0]}"
+        parts = parts[1:]
+    if len(parts) == 1:
+        parts = ["library"] + parts
+    return registry, "/".join(parts), tag
+
+
+def normalize_digest(digest):
+    """/api/tags 中的 digest 不带 "sha256:" 前缀，统一去掉前缀后比较"""
+    digest = (digest or "").strip().lower()
+    return digest.split(":", 1)[1] if digest.startswith("sha256:") else digest
+
+
+def _header(result, name):
+    for key, value in result.get("headers", {}).items():
+        if key.lower() == name:
+            return value
+    return ""
+
+
+class UpdateChecker:
+    """比较本地模型摘要和远程 registry 的 manifest 摘要，不拉取模型即可找出过期模型"""
+
+    def __init__(self, network, registry_url=DEFAULT_REGISTRY, ttl=DEFAULT_TTL, timeout=10):
+        self.network = network
+        self.registry_url = registry_url
+        self.ttl = ttl
+        self.timeout = timeout
+        self._cache = {}  # manifest 地址 -> (摘要, 获取时间)
+        self._lock = threading.Lock()
+
+    def manifest_url(self, model_name):
+        registry, repository, tag = parse_model_reference(model_name, self.registry_url)
+        return f"{registry}/v2/{repository}/manifests/{tag}"
+
+    def _cached(self, url, now):
+        with self._lock:
+            entry = self._cache.get(url)
+        if entry and now - entry[1] < self.ttl:
+            return entry[0]
+        return None
+
+    def remote_digests(self, model_names):
+        """并发获取远程 manifest 摘要（优先使用缓存），返回 {模型名称: (摘要, 错误)}"""
+        now = time.time()
+        urls = {name: self.manifest_url(name) for name in model_names}
+        digests = {}
+        missing = []
+        for name, url in urls.items():
+            cached = self._cached(url, now)
+            if cached is not None:
+                digests[name] = (cached, "")
+            elif url not in missing:
+                missing.append(url)
+
+        specs = [make_request(url, headers={"Accept": MANIFEST_ACCEPT}, timeout=self.timeout) for url in missing]
+        fetched = {}
+        for url, result in zip(missing, self.network.request_many(specs)):
+            if result["ok"]:
+                # 本地 digest 是 manifest 内容的 sha256，registry 返回的摘要头与其一致，没有时自己计算
+                digest = normalize_digest(_header(result, "docker-content-digest")) or \
+                         hashlib.sha256(result["content"]).hexdigest()
+                fetched[url] = (digest, "")
+                with self._lock:
+                    self._cache[url] = (digest, now)
+            else:
+                fetched[url] = ("", result["error"] or f"状态码 {result['status']}")
+
+        for name, url in urls.items():
+            if name not in digests:
+                digests[name] = fetched[url]
+        return digests
+
+    def check(self, models):
+        """检查模型列表（/api/tags 的 models）是否过期，返回每个模型的状态"""
+        remote = self.remote_digests([model.get("name", "") for model in models])
+        rows = []
+        for model in models:
+            name = model.get("name", "")
+            local_digest = normalize_digest(model.get("digest", ""))
+            remote_digest, error = remote[name]
+            if not remote_digest or not local_digest:
+                status = UNKNOWN
+            elif remote_digest == local_digest:
+                status = UP_TO_DATE
+            else:
+                status = OUTDATED
+            rows.append({"name": name, "status": status, "localDigest": local_digest,
+                         "remoteDigest": remote_digest, "error": error})
+        return rows
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
@@ -1,12 +1,17 @@
 import os
 import sys
-import hashlib
+import json
 import shutil
-import zipfile
 import psutil
+import threading
 import time
+from contextlib import contextmanager
 from typing import Optional, Callable
 from logger import logger
+from stream_hash import HASH_ALGORITHMS, hash_file
+from zip_extract import extract_update
+from backup_store import BackupStore
+from staged_install import StagedInstall
 
 
 def is_process_running(process_name: str) -> bool:
@@ -44,21 +49,66 @@ def kill_process(process_name: str) -> bool:
         return False
 
 
+@contextmanager
+def low_io_priority():
+    """后台任务期间降低当前线程的磁盘 I/O 优先级，结束后恢复；平台或 psutil 不支持时不做处理
+
+    只在 Linux 上生效：I/O 优先级作用于当前线程，之后创建的线程（如 I/O 线程池）会继承。
+    Windows 上只能设置整个进程的 I/O 优先级，会拖慢界面和其他下载，不做处理
+    """
+    process = previous = None
+    if sys.platform.startswith("linux"):
+        try:
+            process = psutil.Process(threading.get_native_id())
+            previous = process.ionice()
+            process.ionice(psutil.IOPRIO_CLASS_IDLE)
+        except (AttributeError, OSError, psutil.Error) as e:
+            logger.warning(f"⚠️  无法降低 I/O 优先级: {str(e)}")
+            process = previous = None
+    try:
+        yield
+    finally:
+        if previous is not None:
+            try:
+                value = None if previous.ioclass == psutil.IOPRIO_CLASS_NONE else previous.value
+                process.ionice(previous.ioclass, value)
+            except (OSError, psutil.Error) as e:
+                logger.warning(f"⚠️  恢复 I/O 优先级失败: {str(e)}")
+
+
 def calculate_md5(file_path: str) -> str:
     """计算文件的MD5值"""
+    return calculate_digests(file_path, ("md5",)).get("md5", "")
+
+
+def calculate_digests(file_path: str, algorithms=HASH_ALGORITHMS) -> dict:
+    """一次读取文件同时计算多种摘要，失败时返回空字典"""
     try:
-        md5_hash = hashlib.md5()
-        with open(file_path, "rb") as f:
-            for chunk in iter(lambda: f.read(4096), b""):
-                md5_hash.update(chunk)
-        return md5_hash.hexdigest()
+        return hash_file(file_path, algorithms)
     except Exception as e:
-        logger.error(f"❌ 计算MD5失败: {str(e)}")
-        return ""
+        logger.error(f"❌ 计算文件摘要失败: {str(e)}")
+        return {}
+
+
+def file_signature(file_path: str) -> dict:
+    """文件大小和修改时间，用于判断下载时记录的摘要是否仍然有效"""
+    stat = os.stat(file_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def file_digests(file_path: str, recorded: Optional[dict] = None) -> dict:
+    """文件的摘要：下载时已计算且文件未变化（大小和修改时间一致）时直接使用，否则重新读取计算"""
+    if recorded:
+        try:
+            if file_signature(file_path) == recorded.get("signature"):
+                return recorded.get("digests", {})
+        except OSError:
+            pass
+    return calculate_digests(file_path)
 
 
 def create_backup(source_dir: str, backup_dir: str, log_callback: Optional[Callable[[str], None]] = None) -> bool:
-    """创建备份"""
+    """创建备份：在 backup_dir 的内容寻址存储中创建快照，未变化的文件与之前的备份共享"""
     try:
         if not os.path.exists(source_dir):
             if log_callback:
@@ -67,20 +117,11 @@ def create_backup(source_dir: str, backup_dir: str, log_callback: Optional[Calla
 
         os.makedirs(backup_dir, exist_ok=True)
         
-        files_copied = 0
-        for item in os.listdir(source_dir):
-            source_path = os.path.join(source_dir, item)
-            backup_path = os.path.join(backup_dir, item)
-            
-            if os.path.isfile(source_path):
-                shutil.copy2(source_path, backup_path)
-                files_copied += 1
-            elif os.path.isdir(source_path):
-                shutil.copytree(source_path, backup_path, dirs_exist_ok=True)
-                files_copied += 1
+        index = BackupStore(backup_dir).create_snapshot(source_dir)
         
         if log_callback:
-            log_callback(f"已备份 {files_copied} 个文件/目录")
+            log_callback(f"已备份 {len(index['files'])} 个文件，新增占用 {index['newBytes'] / (1024 * 1024):.1f}MB: "
+                         f"{index['backup_path']}")
         return True
     except Exception as e:
         if log_callback:
@@ -89,13 +130,12 @@ def create_backup(source_dir: str, backup_dir: str, log_callback: Optional[Calla
 
 
 def extract_zip(zip_path: str, extract_to: str, log_callback: Optional[Callable[[str], None]] = None) -> bool:
-    """解压ZIP文件"""
+    """解压ZIP文件：清单列出了文件时只解压要安装的成员，成员在多个线程中并行解压"""
     try:
-        with zipfile.ZipFile(zip_path, 'r') as zip_ref:
-            zip_ref.extractall(extract_to)
+        result = extract_update(zip_path, extract_to)
         
         if log_callback:
-            log_callback(f"已解压到: {extract_to}")
+            log_callback(f"已解压 {len(result['files'])} 个文件到: {extract_to}")
         return True
     except Exception as e:
         if log_callback:
@@ -103,8 +143,22 @@ def extract_zip(zip_path: str, extract_to: str, log_callback: Optional[Callable[
         return False
 
 
-def copy_files(source_dir: str, target_dir: str, log_callback: Optional[Callable[[str], None]] = None) -> bool:
-    """复制文件到目标目录"""
+def load_install_manifest(extract_dir: str) -> dict:
+    """读取更新包中的 update_manifest.json，不存在或格式错误时返回空字典"""
+    manifest_file = os.path.join(extract_dir, "update_manifest.json")
+    if not os.path.exists(manifest_file):
+        return {}
+    try:
+        with open(manifest_file, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error(f"❌ 读取更新清单失败: {str(e)}")
+        return {}
+
+
+def copy_files(source_dir: str, target_dir: str, log_callback: Optional[Callable[[str], None]] = None,
+               move: bool = False) -> bool:
+    """把 source_dir 的顶层项目安装到目标目录：先在暂存目录中构建，写入磁盘后用重命名整体换入"""
     try:
         if not os.path.exists(source_dir):
             if log_callback:
@@ -113,26 +167,12 @@ def copy_files(source_dir: str, target_dir: str, log_callback: Optional[Callable
 
         os.makedirs(target_dir, exist_ok=True)
         
-        files_copied = 0
-        for item in os.listdir(source_dir):
-            source_path = os.path.join(source_dir, item)
-            target_path = os.path.join(target_dir, item)
-            
-            if os.path.isfile(source_path):
-                shutil.copy2(source_path, target_path)
-                files_copied += 1
-                if log_callback:
-                    log_callback(f"复制文件: {item}")
-            elif os.path.isdir(source_dir):
-                if os.path.exists(target_path):
-                    shutil.rmtree(target_path)
-                shutil.copytree(source_path, target_path, dirs_exist_ok=True)
-                files_copied += 1
-                if log_callback:
-                    log_callback(f"复制目录: {item}")
+        staged = StagedInstall(target_dir, log_callback=log_callback)
+        staged.stage({item: os.path.join(source_dir, item) for item in os.listdir(source_dir)}, move=move)
+        names = staged.swap()
         
         if log_callback:
-            log_callback(f"已复制 {files_copied} 个文件/目录")
+            log_callback(f"已替换 {len(names)} 个文件/目录")
         return True
     except Exception as e:
         if log_callback:
@@ -141,13 +181,23 @@ def copy_files(source_dir: str, target_dir: str, log_callback: Optional[Callable
 
 
 def rollback_update(backup_dir: str, target_dir: str, log_callback: Optional[Callable[[str], None]] = None) -> bool:
-    """回滚更新"""
+    """回滚更新：暂存安装保留了上一个版本时直接改名换回，否则从备份恢复"""
     try:
+        staged = StagedInstall(target_dir, log_callback=log_callback)
+        if staged.can_rollback():
+            return staged.rollback()
+
         if not os.path.exists(backup_dir):
             if log_callback:
                 log_callback(f"备份目录不存在: {backup_dir}")
             return False
 
+        # 内容寻址存储中的快照按索引恢复
+        index = BackupStore.load_index(backup_dir)
+        if index and "files" in index:
+            BackupStore(os.path.dirname(backup_dir)).restore(backup_dir, target_dir, log_callback)
+            return True
+
         files_restored = 0
         for item in os.listdir(backup_dir):
             backup_path = os.path.join(backup_dir, item)
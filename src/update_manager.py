@@ -6,10 +6,19 @@ import zipfile
 import hashlib
 import requests
 import subprocess
+import threading
 from PyQt6.QtCore import QObject, pyqtSignal, QThread, pyqtSlot, QMetaObject, Qt, Q_ARG, QRunnable, QVariant, pyqtProperty, QUrl
 from PyQt6.QtCore import QFileSystemWatcher
 from typing import Optional, Dict, Any
 from logger import logger
+from resumable_transfer import ResumableTransfer, TransferError
+from segmented_download import MIN_SEGMENT_SIZE, SegmentedDownloader, SegmentedDownloadError, probe_url
+from stream_hash import StreamingHasher, verify_digests
+from delta_update import DeltaDownloader, DeltaUpdateError, fetch_manifest, plan_delta
+from zip_extract import extract_update
+from binary_patch import apply_patches
+from staged_install import StagedInstall
+import update_helper
 
 
 class UpdateWorker(QRunnable):
@@ -34,6 +43,7 @@ class UpdateManager(QObject):
     updateInstallFailed = pyqtSignal(str)
     updateCheckFailed = pyqtSignal(str)
     updateCancelled = pyqtSignal()
+    updatePrestaged = pyqtSignal(str)
     settingsUpdated = pyqtSignal()
     
     @pyqtProperty(str)
@@ -66,13 +76,22 @@ class UpdateManager(QObject):
         self.auto_install = False
         self.backup_enabled = True
         self.developer_mode = False
+        self.delta_updates = True
         self.is_downloading = False
         self.is_installing = False
+        self.is_prestaging = False
+        # 每次取消预先暂存时递增；暂存任务记录开始下载时的值，值变化即表示已取消（包括尚未开始的暂存）
+        self.prestage_generation = 0
+        self.prestage_lock = threading.Lock()
+        self.prestage_done = threading.Event()
+        self.prestage_done.set()
         self.download_cancel_event = None
         self.update_info = None
         self.temp_dir = ""
         self.backup_dir = ""
         self.update_file = ""
+        self.download_hasher = StreamingHasher()
+        self.update_digests = {}
         self.thread_pool = None
         
         self._init_directories()
@@ -119,6 +138,7 @@ class UpdateManager(QObject):
             self.auto_install = update_config.get('auto_install', False)
             self.backup_enabled = update_config.get('backup_enabled', True)
             self.developer_mode = update_config.get('developer_mode', False)
+            self.delta_updates = update_config.get('delta_updates', True)
             logger.info("✅ 从config.json加载更新配置成功")
         else:
             self._create_default_config()
@@ -130,6 +150,7 @@ class UpdateManager(QObject):
         self.auto_install = False
         self.backup_enabled = True
         self.developer_mode = False
+        self.delta_updates = True
         self._save_config()
     
     def _save_config(self):
@@ -141,7 +162,8 @@ class UpdateManager(QObject):
                 'auto_download': self.auto_download,
                 'auto_install': self.auto_install,
                 'backup_enabled': self.backup_enabled,
-                'developer_mode': self.developer_mode
+                'developer_mode': self.developer_mode,
+                'delta_updates': self.delta_updates
             }
             self.model_manager.save_settings()
             logger.info("✅ 更新配置已保存到config.json")
@@ -153,7 +175,8 @@ class UpdateManager(QObject):
                 'auto_download': self.auto_download,
                 'auto_install': self.auto_install,
                 'backup_enabled': self.backup_enabled,
-                'developer_mode': self.developer_mode
+                'developer_mode': self.developer_mode,
+                'delta_updates': self.delta_updates
             }
             try:
                 with open(config_file, 'w', encoding='utf-8') as f:
@@ -203,6 +226,7 @@ class UpdateManager(QObject):
                                 'release_notes': remote_version_info.get('release_notes', ''),
                                 'file_size': remote_version_info.get('file_size', 0),
                                 'md5': remote_version_info.get('md5', ''),
+                                'sha256': remote_version_info.get('sha256', ''),
                                 'force_update': remote_version_info.get('force_update', False)
                             }
                             self.updateAvailable.emit(self.update_info)
@@ -231,6 +255,7 @@ class UpdateManager(QObject):
                             'release_notes': release_info.get('body', ''),
                             'file_size': 0,
                             'md5': '',
+                            'sha256': '',
                             'force_update': False
                         }
                         self.updateAvailable.emit(self.update_info)
@@ -256,6 +281,9 @@ class UpdateManager(QObject):
                             'release_notes': remote_version_info.get('release_notes', ''),
                             'file_size': remote_version_info.get('file_size', 0),
                             'md5': remote_version_info.get('md5', ''),
+                            'sha256': remote_version_info.get('sha256', ''),
+                            'delta_manifest': remote_version_info.get('delta_manifest', ''),
+                            'delta_manifest_sha256': remote_version_info.get('delta_manifest_sha256', ''),
                             'force_update': remote_version_info.get('force_update', False)
                         }
                         self.updateAvailable.emit(self.update_info)
@@ -307,14 +335,27 @@ class UpdateManager(QObject):
         
         self.is_downloading = True
         self.download_cancel_event = False
+        # 重新下载时之前的预先暂存已失效
+        self._cancel_prestage()
         
-        worker = UpdateWorker(self._download_update_impl)
+        worker = UpdateWorker(self._download_and_prestage, self.prestage_generation)
         if self.thread_pool:
             self.thread_pool.start(worker)
         else:
             worker.run()
 
-    def _download_update_impl(self):
+    def _download_and_prestage(self, generation: int):
+        """下载完成后，开启自动下载时在同一个后台线程中继续预先暂存"""
+        if self._download_update_impl() and self.auto_download:
+            self._prestage_update_impl(generation)
+
+    def _cancel_prestage(self) -> bool:
+        """取消正在进行或即将开始的预先暂存，返回是否有正在进行的暂存"""
+        with self.prestage_lock:
+            self.prestage_generation += 1
+            return self.is_prestaging
+
+    def _download_update_impl(self) -> bool:
         try:
             if not self.update_info:
                 self.updateDownloadFailed.emit("未获取到更新信息")
@@ -327,43 +368,56 @@ class UpdateManager(QObject):
 
             logger.info(f"📥 开始下载更新包: {download_url}")
 
-            response = requests.get(download_url, stream=True, timeout=30)
-            if response.status_code != 200:
-                self.updateDownloadFailed.emit(f"下载失败，状态码: {response.status_code}")
-                return
-
-            total_size = int(response.headers.get('content-length', 0))
-            downloaded_size = 0
-            chunk_size = 8192
-
             os.makedirs(self.temp_dir, exist_ok=True)
             self.update_file = os.path.join(self.temp_dir, "update.zip")
+            partial_file = self.update_file + ".part"
+
+            def on_progress(downloaded_size, total_size):
+                if total_size > 0:
+                    progress = (downloaded_size / total_size) * 100
+                    progress_mb = downloaded_size / (1024 * 1024)
+                    total_mb = total_size / (1024 * 1024)
+                    self.updateDownloadProgress.emit(
+                        progress,
+                        f"{progress_mb:.1f}MB / {total_mb:.1f}MB",
+                        f"{progress:.1f}%"
+                    )
+
+            if self.delta_updates and self.update_info.get('delta_manifest'):
+                try:
+                    if self._download_delta_update(on_progress):
+                        return True
+                except DeltaUpdateError as e:
+                    logger.warning(f"⚠️  增量更新失败，改为下载完整更新包: {str(e)}")
+                if self.download_cancel_event:
+                    self.updateCancelled.emit()
+                    return
 
-            with open(self.update_file, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=chunk_size):
-                    if self.download_cancel_event:
-                        self.updateCancelled.emit()
-                        if os.path.exists(self.update_file):
-                            os.remove(self.update_file)
-                        return
-
-                    if chunk:
-                        f.write(chunk)
-                        downloaded_size += len(chunk)
-
-                        if total_size > 0:
-                            progress = (downloaded_size / total_size) * 100
-                            progress_mb = downloaded_size / (1024 * 1024)
-                            total_mb = total_size / (1024 * 1024)
-                            self.updateDownloadProgress.emit(
-                                progress,
-                                f"{progress_mb:.1f}MB / {total_mb:.1f}MB",
-                                f"{progress:.1f}%"
-                            )
+            if not self._download_full_update(download_url, partial_file, on_progress):
+                self.updateCancelled.emit()
+                return
 
+            digests = self.download_hasher.hexdigests()
+            error = verify_digests(digests, {"md5": self.update_info.get('md5', ''),
+                                             "sha256": self.update_info.get('sha256', '')})
+            if error:
+                ResumableTransfer(download_url, partial_file).discard()
+                self.download_hasher.reset()
+                logger.error(f"❌ 更新包校验失败: {error}")
+                self.updateDownloadFailed.emit(error)
+                return
+
+            os.replace(partial_file, self.update_file)
+            # 记录下载时计算的摘要和文件签名，更新程序在文件未变化时不再重新读取计算
+            self.update_digests = {"path": self.update_file, "digests": digests,
+                                   "signature": update_helper.file_signature(self.update_file)}
             logger.info(f"✅ 更新包下载完成: {self.update_file}")
             self.updateDownloadComplete.emit(self.update_file)
+            return True
 
+        except TransferError as e:
+            logger.error(f"❌ 更新包下载失败（已下载部分保留，可继续下载）: {str(e)}")
+            self.updateDownloadFailed.emit(str(e))
         except requests.exceptions.Timeout:
             error_msg = "下载超时，请检查网络连接"
             self.updateDownloadFailed.emit(error_msg)
@@ -377,6 +431,153 @@ class UpdateManager(QObject):
         finally:
             self.is_downloading = False
 
+    def _download_full_update(self, download_url: str, partial_file: str, on_progress) -> bool:
+        """下载完整更新包到 partial_file，返回 False 表示已取消，失败时抛出异常
+
+        服务器支持 Range 且文件足够大时用多连接分段下载（段映射保存在 .segments 中），
+        已有单连接下载的断点或服务器实际不支持分段时单连接下载（续传信息保存在 .meta 中）；
+        两种方式都在写入时同步计算摘要，未完成的下载保留，再次下载同一地址时从断点继续
+        """
+        cancel_check = lambda: bool(self.download_cancel_event)
+        segments_file = partial_file + ".segments"
+        if not os.path.exists(partial_file + ".meta"):
+            info = probe_url(download_url)
+            if info['supports_range'] and info['size'] >= MIN_SEGMENT_SIZE * 2:
+                downloader = SegmentedDownloader(download_url, partial_file, info['size'], etag=info['etag'],
+                                                 last_modified=info['last_modified'], cancel_check=cancel_check,
+                                                 on_progress=on_progress, hasher=self.download_hasher)
+                if os.path.exists(segments_file):
+                    logger.info("📥 按段映射继续分段下载")
+                try:
+                    return downloader.download()
+                except SegmentedDownloadError as e:
+                    logger.warning(f"⚠️  分段下载不可用，改用单连接下载: {str(e)}")
+            # 段映射对单连接下载无效，清除后从头下载
+            if os.path.exists(segments_file):
+                os.remove(segments_file)
+                if os.path.exists(partial_file):
+                    os.remove(partial_file)
+                self.download_hasher.reset()
+
+        transfer = ResumableTransfer(download_url, partial_file, timeout=30, cancel_check=cancel_check,
+                                     on_progress=on_progress, hasher=self.download_hasher)
+        resume_offset = transfer.resume_offset()
+        if resume_offset:
+            logger.info(f"📥 从 {resume_offset / (1024 * 1024):.1f}MB 处继续下载")
+        return transfer.run()
+
+    def _download_delta_update(self, on_progress) -> bool:
+        """增量更新：只下载内容清单中与本地文件摘要不同的文件，打包为补丁包作为 update.zip
+
+        返回 False 表示已取消或没有必要使用增量更新（由调用方下载完整更新包）
+        """
+        manifest_url = self.update_info['delta_manifest']
+        manifest = fetch_manifest(manifest_url, self.update_info.get('delta_manifest_sha256', ''),
+                                  self.update_info.get('version', ''))
+        plan = plan_delta(manifest, self.project_root)
+        if plan["fullBytes"] and plan["downloadBytes"] >= plan["fullBytes"] * 0.8:
+            # 大部分文件都变了，逐个下载不如直接下载压缩后的完整更新包
+            logger.info("📥 变化的文件较多，下载完整更新包")
+            return False
+        logger.info(f"📥 增量更新: {len(plan['changed'])} 个文件变化，{plan['unchanged']} 个未变，"
+                    f"需下载 {plan['downloadBytes'] / (1024 * 1024):.1f}MB"
+                    f"（完整 {plan['fullBytes'] / (1024 * 1024):.1f}MB）")
+
+        staging_dir = os.path.join(self.temp_dir, "delta")
+        downloader = DeltaDownloader(manifest_url, staging_dir,
+                                     cancel_check=lambda: bool(self.download_cancel_event),
+                                     on_progress=on_progress)
+        result = downloader.download(plan, manifest, self.update_file)
+        if result is None:
+            return False
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+        # 补丁包在本地生成，摘要与服务器提供的完整包不同：改用生成时计算的摘要，
+        # 预先暂存和更新程序安装前按它校验补丁包（其中每个文件已按固定的内容清单校验）
+        digests = result['digests']
+        self.update_info = dict(self.update_info, md5=digests.get('md5', ''), sha256=digests.get('sha256', ''))
+        self.update_digests = {"path": self.update_file, "digests": digests,
+                               "signature": update_helper.file_signature(self.update_file)}
+        logger.info(f"✅ 增量更新包已生成: {self.update_file}（{result['files']} 个文件，"
+                    f"用时 {result['elapsed']:.1f}s）")
+        self.updateDownloadComplete.emit(self.update_file)
+        return True
+
+    def _prestage_update_impl(self, generation: int):
+        """后台预先暂存：校验、解压、应用补丁、备份，并在安装目录旁构建新版本，重启时更新程序只需要交换目录
+
+        generation 是下载开始时的 prestage_generation，之后有取消（重新下载、启动更新程序）时不再暂存。
+        整个过程以低 I/O 优先级运行；失败或取消时清除暂存，更新程序按原来的完整流程安装
+        """
+        with self.prestage_lock:
+            if generation != self.prestage_generation:
+                logger.info("ℹ️  预先暂存已取消")
+                return
+            self.is_prestaging = True
+            self.prestage_done.clear()
+        extract_dir = os.path.join(self.temp_dir, "prestage")
+        staged = StagedInstall(self.project_root)
+        version = self.update_info.get('version', '')
+
+        def check_cancel():
+            if generation != self.prestage_generation:
+                raise InterruptedError("预先暂存已取消")
+
+        try:
+            with update_helper.low_io_priority():
+                logger.info(f"📦 开始预先暂存更新: {version}")
+                expected = {"md5": self.update_info.get('md5', ''), "sha256": self.update_info.get('sha256', '')}
+                if any(expected.values()):
+                    recorded = self.update_digests if self.update_file == self.update_digests.get('path') else None
+                    error = verify_digests(update_helper.file_digests(self.update_file, recorded), expected)
+                    if error:
+                        raise ValueError(error)
+                check_cancel()
+
+                shutil.rmtree(extract_dir, ignore_errors=True)
+                manifest = extract_update(self.update_file, extract_dir)["manifest"] or {}
+                if manifest.get('patches'):
+                    apply_patches(manifest, self.project_root, extract_dir, log_callback=logger.info)
+                check_cancel()
+
+                backup_created = self.backup_enabled and update_helper.create_backup(
+                    self.project_root, self.backup_dir, logger.info)
+                check_cancel()
+
+                # 记录对应的更新包，更新程序确认暂存属于这个更新包后才直接交换
+                info = {'version': version, 'update_file': self.update_file,
+                        'signature': update_helper.file_signature(self.update_file), 'backup': backup_created}
+                if manifest.get('files'):
+                    staged.stage_manifest(extract_dir, manifest, move=True, info=info)
+                else:
+                    staged.stage({item: os.path.join(extract_dir, item) for item in os.listdir(extract_dir)},
+                                 move=True, info=info)
+            logger.info(f"✅ 更新已预先暂存，重启即可完成安装: {version}")
+            self.updatePrestaged.emit(version)
+        except InterruptedError:
+            staged.discard()
+            logger.info("ℹ️  预先暂存已取消")
+        except Exception as e:
+            staged.discard()
+            logger.warning(f"⚠️  预先暂存更新失败，重启时按完整流程安装: {str(e)}")
+        finally:
+            shutil.rmtree(extract_dir, ignore_errors=True)
+            with self.prestage_lock:
+                self.is_prestaging = False
+                self.prestage_done.set()
+
+    def _is_prestaged(self) -> bool:
+        """暂存目录中是否有属于当前更新包（路径、大小和修改时间一致）的新版本"""
+        journal = StagedInstall(self.project_root).load_journal()
+        if not journal or journal.get('state') != 'staged':
+            return False
+        info = journal.get('info', {})
+        try:
+            return info.get('update_file') == self.update_file and \
+                info.get('signature') == update_helper.file_signature(self.update_file)
+        except OSError:
+            return False
+
     @pyqtSlot()
     def cancelDownload(self):
         if self.is_downloading:
@@ -545,6 +746,10 @@ class UpdateManager(QObject):
 
             logger.info("🚀 准备启动更新程序")
 
+            if self._cancel_prestage():
+                # 预先暂存还没完成时取消并等待其结束，更新程序按完整流程安装
+                self.prestage_done.wait(30)
+
             if getattr(sys, 'frozen', False):
                 updater_exe = os.path.join(self.project_root, "OllamaManagerUpdater.exe")
                 main_exe = sys.executable
@@ -573,6 +778,9 @@ class UpdateManager(QObject):
                 'main_exe': main_exe,
                 'backup_dir': self.backup_dir,
                 'md5': self.update_info.get('md5', ''),
+                'sha256': self.update_info.get('sha256', ''),
+                'verified': self.update_digests if self.update_file == self.update_digests.get('path') else None,
+                'prestaged': self._is_prestaged(),
                 'release_notes': self.update_info.get('release_notes', '')
             }
 
@@ -583,6 +791,7 @@ class UpdateManager(QObject):
             logger.info(f"📋 更新版本: {update_info_data['version']}")
             logger.info(f"📋 更新文件: {update_info_data['update_file']}")
             logger.info(f"📋 目标目录: {update_info_data['target_dir']}")
+            logger.info(f"📋 预先暂存: {'是' if update_info_data['prestaged'] else '否'}")
 
             # 构建启动命令
             if isinstance(updater_exe, list):
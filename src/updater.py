@@ -12,6 +12,9 @@ from PyQt6.QtCore import Qt, QThread, pyqtSignal, QTimer
 from PyQt6.QtGui import QFont
 import update_helper
 from logger import logger
+from stream_hash import verify_digests
+from binary_patch import apply_patches
+from staged_install import StagedInstall, StagedInstallError
 
 
 class UpdateWorker(QThread):
@@ -47,20 +50,25 @@ class UpdateWorker(QThread):
             if not os.path.exists(self.update_info['target_dir']):
                 raise Exception(f"目标目录不存在: {self.update_info['target_dir']}")
 
+            if StagedInstall(self.update_info['target_dir']).recover():
+                self.log_updated.emit("已恢复上次未完成的安装")
+                logger.warning("已恢复上次未完成的安装")
+
             self.progress_updated.emit(10, "检查主程序进程...")
             self.log_updated.emit("检查主程序进程...")
             logger.info("检查主程序进程...")
             main_exe = self.update_info['main_exe']
             process_name = os.path.basename(main_exe)
 
-            if update_helper.is_process_running(process_name):
+            process_running = update_helper.is_process_running(process_name)
+            if process_running:
                 self.log_updated.emit(f"检测到主程序正在运行: {process_name}")
                 logger.info(f"检测到主程序正在运行: {process_name}")
                 self.progress_updated.emit(15, "等待主程序退出...")
                 self.log_updated.emit("等待主程序退出...")
                 logger.info("等待主程序退出...")
                 
-                wait_result = update_helper.wait_for_process_exit(process_name, timeout=30)
+                wait_result = update_helper.wait_for_process_exit(process_name, timeout=30, check_interval=0.1)
                 if not wait_result:
                     self.log_updated.emit("主程序未在30秒内退出，尝试强制终止...")
                     logger.warning("主程序未在30秒内退出，尝试强制终止...")
@@ -69,80 +77,15 @@ class UpdateWorker(QThread):
                         logger.info("主程序已强制终止")
                     else:
                         raise Exception("无法终止主程序进程")
-                
-                time.sleep(2)
             else:
                 self.log_updated.emit("主程序未运行")
                 logger.info("主程序未运行")
 
-            self.progress_updated.emit(20, "创建备份...")
-            self.log_updated.emit("创建备份...")
-            logger.info("创建备份...")
-            backup_dir = self.update_info.get('backup_dir', '')
-            if backup_dir:
-                os.makedirs(backup_dir, exist_ok=True)
-                backup_result = update_helper.create_backup(
-                self.update_info['target_dir'],
-                backup_dir,
-                lambda msg: self.log_updated.emit(msg)
-            )
-                if backup_result:
-                    self.log_updated.emit(f"备份创建成功: {backup_dir}")
-                    logger.info(f"备份创建成功: {backup_dir}")
-                else:
-                    self.log_updated.emit("警告: 备份创建失败，继续更新...")
-                    logger.warning("备份创建失败，继续更新...")
-
-            self.progress_updated.emit(30, "解压更新包...")
-            self.log_updated.emit("解压更新包...")
-            logger.info("解压更新包...")
-            temp_dir = os.path.join(self.update_info['target_dir'], 'temp', 'update_temp')
-            os.makedirs(temp_dir, exist_ok=True)
-            
-            # 清理临时目录（如果存在）
-            if os.path.exists(temp_dir):
-                shutil.rmtree(temp_dir)
-                os.makedirs(temp_dir, exist_ok=True)
-            
-            extract_result = update_helper.extract_zip(self.update_info['update_file'], temp_dir, lambda msg: self.log_updated.emit(msg))
-            if not extract_result:
-                # 解压失败，终止更新流程
-                raise Exception("更新包解压失败")
-            
-            self.log_updated.emit("更新包解压完成")
-            logger.info("更新包解压完成")
-
-            self.progress_updated.emit(50, "验证文件完整性...")
-            self.log_updated.emit("验证文件完整性...")
-            logger.info("验证文件完整性...")
-            expected_md5 = self.update_info.get('md5', '')
-            if expected_md5:
-                update_file_md5 = update_helper.calculate_md5(self.update_info['update_file'])
-                if update_file_md5 != expected_md5:
-                    raise Exception(f"MD5校验失败: 期望 {expected_md5}, 实际 {update_file_md5}")
-                self.log_updated.emit("MD5校验通过")
-                logger.info("MD5校验通过")
-            else:
-                self.log_updated.emit("跳过MD5校验（未提供MD5值）")
-                logger.info("跳过MD5校验（未提供MD5值）")
-
-            self.progress_updated.emit(60, "复制文件...")
-            self.log_updated.emit("复制文件...")
-            logger.info("复制文件...")
-            update_helper.copy_files(temp_dir, self.update_info['target_dir'], lambda msg: self.log_updated.emit(msg))
-            self.log_updated.emit("文件复制完成")
-            logger.info("文件复制完成")
-
-            self.progress_updated.emit(80, "清理临时文件...")
-            self.log_updated.emit("清理临时文件...")
-            logger.info("清理临时文件...")
-            try:
-                shutil.rmtree(temp_dir)
-                self.log_updated.emit("临时文件清理完成")
-                logger.info("临时文件清理完成")
-            except Exception as e:
-                self.log_updated.emit(f"警告: 清理临时文件失败: {str(e)}")
-                logger.warning(f"清理临时文件失败: {str(e)}")
+            if not self._swap_prestaged():
+                if process_running:
+                    # 等待主程序释放文件句柄
+                    time.sleep(2)
+                self._install_package()
 
             self.progress_updated.emit(90, "启动新版本...")
             self.log_updated.emit("启动新版本...")
@@ -205,6 +148,134 @@ class UpdateWorker(QThread):
             
             self.update_finished.emit(False, str(e))
 
+    def _swap_prestaged(self) -> bool:
+        """主程序在后台预先暂存了这个更新包时直接交换目录，返回是否已完成安装
+
+        主程序刚退出时文件句柄可能还没释放，交换失败会自动换回，短暂等待后重试；
+        暂存不属于这个更新包或多次重试仍失败时返回 False，按完整流程安装
+        """
+        if not self.update_info.get('prestaged'):
+            return False
+        staged = StagedInstall(self.update_info['target_dir'], log_callback=lambda msg: self.log_updated.emit(msg))
+        journal = staged.load_journal() or {}
+        info = journal.get('info', {})
+        try:
+            matches = staged.is_staged() and info.get('update_file') == self.update_info['update_file'] and \
+                info.get('signature') == update_helper.file_signature(self.update_info['update_file'])
+        except OSError:
+            matches = False
+        if not matches:
+            self.log_updated.emit("预先暂存的版本与更新包不一致，按完整流程安装")
+            logger.warning("预先暂存的版本与更新包不一致，按完整流程安装")
+            return False
+
+        self.progress_updated.emit(50, "切换到新版本...")
+        self.log_updated.emit("使用预先暂存的新版本，交换目录...")
+        logger.info("使用预先暂存的新版本，交换目录...")
+        start_time = time.time()
+        for attempt in range(10):
+            try:
+                names = staged.swap()
+                break
+            except StagedInstallError as e:
+                if attempt == 9 or not staged.is_staged():
+                    self.log_updated.emit(f"交换目录失败，按完整流程安装: {str(e)}")
+                    logger.warning(f"交换目录失败，按完整流程安装: {str(e)}")
+                    return False
+                time.sleep(0.2)
+        self.log_updated.emit(f"已换入 {len(names)} 个文件/目录，用时 {(time.time() - start_time) * 1000:.0f}ms")
+        logger.info(f"已换入 {len(names)} 个文件/目录，用时 {(time.time() - start_time) * 1000:.0f}ms")
+        return True
+
+    def _install_package(self):
+        """完整流程：备份、解压、校验，然后暂存并换入新版本"""
+        self.progress_updated.emit(20, "创建备份...")
+        self.log_updated.emit("创建备份...")
+        logger.info("创建备份...")
+        backup_dir = self.update_info.get('backup_dir', '')
+        if backup_dir:
+            os.makedirs(backup_dir, exist_ok=True)
+            backup_result = update_helper.create_backup(
+            self.update_info['target_dir'],
+            backup_dir,
+            lambda msg: self.log_updated.emit(msg)
+        )
+            if backup_result:
+                self.log_updated.emit(f"备份创建成功: {backup_dir}")
+                logger.info(f"备份创建成功: {backup_dir}")
+            else:
+                self.log_updated.emit("警告: 备份创建失败，继续更新...")
+                logger.warning("备份创建失败，继续更新...")
+
+        self.progress_updated.emit(30, "解压更新包...")
+        self.log_updated.emit("解压更新包...")
+        logger.info("解压更新包...")
+        temp_dir = os.path.join(self.update_info['target_dir'], 'temp', 'update_temp')
+        os.makedirs(temp_dir, exist_ok=True)
+        
+        # 清理临时目录（如果存在）
+        if os.path.exists(temp_dir):
+            shutil.rmtree(temp_dir)
+            os.makedirs(temp_dir, exist_ok=True)
+        
+        extract_result = update_helper.extract_zip(self.update_info['update_file'], temp_dir, lambda msg: self.log_updated.emit(msg))
+        if not extract_result:
+            # 解压失败，终止更新流程
+            raise Exception("更新包解压失败")
+        
+        self.log_updated.emit("更新包解压完成")
+        logger.info("更新包解压完成")
+
+        self.progress_updated.emit(50, "验证文件完整性...")
+        self.log_updated.emit("验证文件完整性...")
+        logger.info("验证文件完整性...")
+        expected = {"md5": self.update_info.get('md5', ''), "sha256": self.update_info.get('sha256', '')}
+        if any(expected.values()):
+            # 下载时已在写入过程中计算摘要，更新包未变化时直接使用，不再完整读取一遍
+            digests = update_helper.file_digests(self.update_info['update_file'],
+                                                 self.update_info.get('verified'))
+            error = verify_digests(digests, expected)
+            if error:
+                raise Exception(error)
+            self.log_updated.emit("摘要校验通过")
+            logger.info("摘要校验通过")
+        else:
+            self.log_updated.emit("跳过摘要校验（未提供MD5/SHA-256值）")
+            logger.info("跳过摘要校验（未提供MD5/SHA-256值）")
+
+        self.progress_updated.emit(60, "复制文件...")
+        self.log_updated.emit("复制文件...")
+        logger.info("复制文件...")
+        install_manifest = update_helper.load_install_manifest(temp_dir)
+        if install_manifest.get('patches'):
+            patch_result = apply_patches(install_manifest, self.update_info['target_dir'], temp_dir,
+                                         log_callback=lambda msg: self.log_updated.emit(msg))
+            logger.info(f"二进制补丁: {len(patch_result['patched'])} 个已应用，"
+                        f"{len(patch_result['fallback'])} 个使用完整文件")
+        # 新版本先在安装目录旁构建，写入磁盘后用重命名换入，失败时自动换回原来的文件
+        staged = StagedInstall(self.update_info['target_dir'], log_callback=lambda msg: self.log_updated.emit(msg))
+        if install_manifest.get('files'):
+            # 增量更新包只包含变化的文件，按清单在当前文件的副本上替换
+            staged.stage_manifest(temp_dir, install_manifest, move=True)
+        else:
+            staged.stage({item: os.path.join(temp_dir, item) for item in os.listdir(temp_dir)}, move=True)
+        names = staged.swap()
+        self.log_updated.emit(f"已换入 {len(names)} 个文件/目录")
+        logger.info(f"已换入 {len(names)} 个文件/目录")
+        self.log_updated.emit("文件复制完成")
+        logger.info("文件复制完成")
+
+        self.progress_updated.emit(80, "清理临时文件...")
+        self.log_updated.emit("清理临时文件...")
+        logger.info("清理临时文件...")
+        try:
+            shutil.rmtree(temp_dir)
+            self.log_updated.emit("临时文件清理完成")
+            logger.info("临时文件清理完成")
+        except Exception as e:
+            self.log_updated.emit(f"警告: 清理临时文件失败: {str(e)}")
+            logger.warning(f"清理临时文件失败: {str(e)}")
+
 
 class UpdateWindow(QMainWindow):
     def __init__(self, update_info):
@@ -0,0 +1,150 @@
+import threading
+import time
+import requests
+from sync_planner import normalize_model_name
+
+# 预加载时使用的默认驻留时间（秒），同时作为空闲释放的超时时间
+DEFAULT_IDLE_TIMEOUT = 600
+
+
+def list_running_models(api_url, timeout=2):
+    """通过 /api/ps 获取当前驻留在内存中的模型列表"""
+    try:
+        response = requests.get(f"{api_url}/ps", timeout=timeout)
+        if response.status_code == 200:
+            return response.json().get("models", [])
+    except Exception:
+        pass
+    return []
+
+
+def is_model_resident(api_url, model_name, timeout=2):
+    """检查模型是否已驻留（未带标签的名称按 :latest 比较，与 /api/ps 返回的名称一致）"""
+    wanted = normalize_model_name(model_name)
+    for model in list_running_models(api_url, timeout):
+        if wanted in (normalize_model_name(model.get("name") or ""), normalize_model_name(model.get("model") or "")):
+            return True
+    return False
+
+
+def preload_model(api_url, model_name, keep_alive, timeout=120):
+    """预加载模型（不带 prompt 的 generate 请求只加载模型，不做推理）"""
+    try:
+        response = requests.post(f"{api_url}/generate", json={
+            "model": model_name,
+            "keep_alive": keep_alive
+        }, timeout=timeout)
+        return response.status_code == 200
+    except Exception:
+        return False
+
+
+class WarmModelKeeper:
+    """保持 Ollama 翻译模型常驻，避免每次翻译都承担模型加载延迟"""
+
+    def __init__(self, manager):
+        self.manager = manager
+        self._lock = threading.Lock()
+        self._loaded = None  # (api_url, model_name)，由本对象预加载的模型
+        self._last_used = 0.0
+        self._idle_timer = None
+
+    def _translation_settings(self):
+        return self.manager._settings.get("translation", {})
+
+    def is_enabled(self):
+        """翻译模型常驻模式是否开启"""
+        settings = self._translation_settings()
+        return bool(settings.get("ollama_translation", False)
+                    and settings.get("ollama_model", "")
+                    and settings.get("ollama_keep_warm", True))
+
+    @property
+    def idle_timeout(self):
+        try:
+            return max(int(self._translation_settings().get("ollama_idle_timeout", DEFAULT_IDLE_TIMEOUT)), 0)
+        except (TypeError, ValueError):
+            return DEFAULT_IDLE_TIMEOUT
+
+    @property
+    def keep_alive(self):
+        """翻译请求附带的 keep_alive，每次请求都会刷新驻留时间"""
+        return f"{self.idle_timeout}s"
+
+    def activate(self):
+        """页面打开时调用：确认模型驻留，未驻留则预加载（在后台线程中执行）"""
+        if not self.is_enabled():
+            return False
+
+        api_url = self.manager.apiUrl
+        model_name = self._translation_settings().get("ollama_model", "")
+
+        with self._lock:
+            previous = self._loaded
+        # 服务器或模型发生变化时，释放之前预加载的模型
+        if previous and previous != (api_url, model_name):
+            self.manager.unload_engine.unload(*previous)
+            with self._lock:
+                self._loaded = None
+
+        if not is_model_resident(api_url, model_name):
+            print(f"🔥 预加载翻译模型: {model_name}\n")
+            # 通过常驻调度器加载，超出显存预算时会先按 LRU 卸载其他模型
+            loaded, _ = self.manager.residency.ensure_loaded(self.manager._server_address,
+                                                             self.manager._server_port,
+                                                             model_name, self.keep_alive)
+            if not loaded:
+                print(f"❌ 预加载翻译模型失败: {model_name}\n")
+                return False
+
+        with self._lock:
+            self._loaded = (api_url, model_name)
+        self.touch()
+        return True
+
+    def touch(self):
+        """记录一次使用，并重新计时空闲释放"""
+        with self._lock:
+            self._last_used = time.time()
+            if self._idle_timer:
+                self._idle_timer.cancel()
+            if self._loaded and self.idle_timeout > 0:
+                self._idle_timer = threading.Timer(self.idle_timeout, self._release_if_idle)
+                self._idle_timer.daemon = True
+                self._idle_timer.start()
+
+    def _release_if_idle(self):
+        with self._lock:
+            if not self._loaded or time.time() - self._last_used < self.idle_timeout:
+                return
+            loaded = self._loaded
+            self._loaded = None
+            self._idle_timer = None
+        print(f"💤 翻译模型空闲超时，释放: {loaded[1]}\n")
+        self.manager.unload_engine.unload(*loaded)
+
+    def release(self):
+        """关闭常驻模式时调用：停止空闲计时并释放由本对象预加载的模型，返回是否释放了模型"""
+        with self._lock:
+            loaded = self._loaded
+            self._loaded = None
+            if self._idle_timer:
+                self._idle_timer.cancel()
+                self._idle_timer = None
+        if not loaded:
+            return False
+        print(f"💤 翻译模型常驻已关闭，释放: {loaded[1]}\n")
+        return self.manager.unload_engine.unload(*loaded)[0]
+
+    @property
+    def loaded(self):
+        """由本对象预加载的 (api_url, 模型名称)，没有时为 None"""
+        with self._lock:
+            return self._loaded
+
+    def shutdown(self):
+        """停止空闲计时器（不主动释放，交由服务器的 keep_alive 处理）"""
+        with self._lock:
+            if self._idle_timer:
+                self._idle_timer.cancel()
+                self._idle_timer = None
@@ -0,0 +1,158 @@
+import json
+import os
+import shutil
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, List, Optional
+from delta_update import MANIFEST_NAME, normalize_path
+
+DEFAULT_WORKERS = 4
+COPY_CHUNK_SIZE = 1024 * 1024
+
+
+def read_zip_manifest(zip_path: str, name: str = MANIFEST_NAME) -> Optional[dict]:
+    """直接从压缩包中读取 update_manifest.json，不解压其他文件；没有清单时返回 None"""
+    with zipfile.ZipFile(zip_path, 'r') as archive:
+        try:
+            with archive.open(name) as f:
+                return json.load(f)
+        except KeyError:
+            return None
+
+
+def manifest_paths(manifest: Optional[dict]) -> Optional[List[str]]:
+    """清单中需要从压缩包取出的路径（安装的文件、补丁和完整文件），清单没有列出文件时返回 None（全部解压）"""
+    if not manifest or not (manifest.get("files") or manifest.get("patches")):
+        return None
+    paths = [MANIFEST_NAME]
+    paths.extend(entry["path"] for entry in manifest.get("files", []))
+    for entry in manifest.get("patches", []):
+        paths.extend(entry[key] for key in ("patch", "fallback") if entry.get(key))
+    return [normalize_path(path) for path in paths]
+
+
+def select_members(archive: zipfile.ZipFile, paths: Optional[Iterable[str]] = None) -> List[zipfile.ZipInfo]:
+    """选出要解压的成员：paths 中的文件，或以 paths 中的目录为前缀的文件；paths 为 None 时选出全部文件"""
+    members = [info for info in archive.infolist() if not info.is_dir()]
+    if paths is None:
+        return members
+    wanted = set(paths)
+    prefixes = tuple(path + "/" for path in wanted)
+    return [info for info in members
+            if info.filename.rstrip("/") in wanted or info.filename.startswith(prefixes)]
+
+
+class ZipExtractor:
+    """并行流式解压：每个工作线程使用独立的 ZipFile 句柄，成员直接分块写到暂存目录中的目标位置
+
+    zipfile 在读完每个成员时校验 CRC-32，不一致时抛出 BadZipFile；先写到临时文件，校验通过后再改名
+    """
+
+    def __init__(self, zip_path: str, workers: int = DEFAULT_WORKERS,
+                 on_progress: Optional[Callable[[int, int], None]] = None):
+        self.zip_path = zip_path
+        self.workers = max(int(workers), 1)
+        self.on_progress = on_progress
+        self._local = threading.local()
+        self._handles = []
+        self._lock = threading.Lock()
+        self._done_bytes = 0
+        self._total_bytes = 0
+
+    def _archive(self) -> zipfile.ZipFile:
+        archive = getattr(self._local, "archive", None)
+        if archive is None:
+            archive = self._local.archive = zipfile.ZipFile(self.zip_path, 'r')
+            with self._lock:
+                self._handles.append(archive)
+        return archive
+
+    def _extract_member(self, info: zipfile.ZipInfo, dest_dir: str) -> str:
+        relative_path = normalize_path(info.filename)
+        target = os.path.join(dest_dir, *relative_path.split("/"))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        temp_path = target + ".extracting"
+        try:
+            with self._archive().open(info) as source, open(temp_path, 'wb') as out:
+                for chunk in iter(lambda: source.read(COPY_CHUNK_SIZE), b''):
+                    out.write(chunk)
+                    self._advance(len(chunk))
+            os.replace(temp_path, target)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return relative_path
+
+    def _advance(self, length: int):
+        with self._lock:
+            self._done_bytes += length
+            done = self._done_bytes
+        if self.on_progress:
+            self.on_progress(done, self._total_bytes)
+
+    def extract(self, dest_dir: str, paths: Optional[Iterable[str]] = None) -> List[str]:
+        """解压选中的成员到 dest_dir，返回解压的相对路径"""
+        with zipfile.ZipFile(self.zip_path, 'r') as archive:
+            members = select_members(archive, paths)
+        # 大文件先开始，各线程的负载更均衡
+        members.sort(key=lambda info: info.file_size, reverse=True)
+        self._done_bytes = 0
+        self._total_bytes = sum(info.file_size for info in members)
+        os.makedirs(dest_dir, exist_ok=True)
+        try:
+            with ThreadPoolExecutor(max_workers=min(self.workers, max(len(members), 1)),
+                                    thread_name_prefix="unzip") as executor:
+                return list(executor.map(lambda info: self._extract_member(info, dest_dir), members))
+        finally:
+            for archive in self._handles:
+                archive.close()
+            self._handles = []
+            self._local = threading.local()
+
+
+def extract_update(zip_path: str, dest_dir: str, workers: int = DEFAULT_WORKERS, selective: bool = True,
+                   on_progress: Optional[Callable[[int, int], None]] = None) -> dict:
+    """解压更新包：先直接读取清单，清单列出了文件时只解压要安装的成员；返回清单（可能为 None）和解压的文件"""
+    manifest = read_zip_manifest(zip_path)
+    paths = manifest_paths(manifest) if selective else None
+    extracted = ZipExtractor(zip_path, workers, on_progress).extract(dest_dir, paths)
+    return {"manifest": manifest, "files": extracted}
+
+
+def _run_benchmark(file_count: int, file_kb: int, workers: List[int]):
+    """比较 extractall 与不同线程数的并行流式解压"""
+    import tempfile
+    import time
+
+    work_dir = tempfile.mkdtemp(prefix="zip-extract-")
+    zip_path = os.path.join(work_dir, "update.zip")
+    block = os.urandom(1024)
+    with zipfile.ZipFile(zip_path, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for index in range(file_count):
+            # 一半可压缩的内容，接近 QML 和库文件的混合
+            data = (block * (file_kb // 2)) + os.urandom(file_kb * 512)
+            archive.writestr(f"ui/part{index // 100}/file{index}.bin", data)
+
+    target = os.path.join(work_dir, "out")
+    start = time.perf_counter()
+    with zipfile.ZipFile(zip_path, 'r') as archive:
+        archive.extractall(target)
+    print(f"extractall: {time.perf_counter() - start:.2f}s")
+    for count in workers:
+        shutil.rmtree(target, ignore_errors=True)
+        start = time.perf_counter()
+        ZipExtractor(zip_path, count).extract(target)
+        print(f"{count:>2} 线程: {time.perf_counter() - start:.2f}s")
+    shutil.rmtree(work_dir)
+
+
+if __name__ == "__main__":
+    import argparse
+    parser = argparse.ArgumentParser(description="并行流式解压基准测试")
+    parser.add_argument("--files", type=int, default=400, help="压缩包中的文件数")
+    parser.add_argument("--size", type=int, default=256, help="每个文件的大小（KB）")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="要比较的线程数")
+    args = parser.parse_args()
+    _run_benchmark(args.files, args.size, args.workers)
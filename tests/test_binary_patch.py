@@ -0,0 +1,107 @@
+import hashlib
+import os
+import random
+import pytest
+import binary_patch
+from binary_patch import PatchError, apply_patches, create_patch
+
+
+def _pair(seed=1):
+    """合成的新旧文件对：在旧文件中插入、删除和覆盖若干区域"""
+    rng = random.Random(seed)
+    old = bytearray(rng.randbytes(256 * 1024))
+    new = bytearray(old)
+    new[1000:1000] = rng.randbytes(300)
+    del new[50000:52000]
+    new[120000:120500] = rng.randbytes(500)
+    return bytes(old), bytes(new)
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def _read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+@pytest.fixture
+def update(tmp_path):
+    """安装目录中的旧文件，解压目录中的补丁和完整文件，返回 (安装目录, 解压目录, 清单, 新内容)"""
+    old, new = _pair()
+    target_dir, extract_dir = tmp_path / "install", tmp_path / "extract"
+    _write(str(target_dir / "bin" / "app.bin"), old)
+    _write(str(tmp_path / "new.bin"), new)
+    _write(str(extract_dir / "fallback" / "bin" / "app.bin"), new)
+    os.makedirs(extract_dir / "patches")
+    stats = create_patch(str(target_dir / "bin" / "app.bin"), str(tmp_path / "new.bin"),
+                         str(extract_dir / "patches" / "app.bin.patch"), block_size=1024)
+    assert stats["patchSize"] < len(new) // 10
+    manifest = {"files": [], "patches": [{
+        "path": "bin/app.bin", "patch": "patches/app.bin.patch", "fallback": "fallback/bin/app.bin",
+        "source_sha256": hashlib.sha256(old).hexdigest(), "sha256": hashlib.sha256(new).hexdigest()}]}
+    return target_dir, extract_dir, manifest, new
+
+
+def test_patch_applied(update):
+    target_dir, extract_dir, manifest, new = update
+    result = apply_patches(manifest, str(target_dir), str(extract_dir))
+    assert result == {"patched": ["bin/app.bin"], "fallback": []}
+    assert _read(extract_dir / "bin" / "app.bin") == new
+    assert manifest["files"] == [{"path": "bin/app.bin", "sha256": hashlib.sha256(new).hexdigest()}]
+
+
+def test_corrupt_patch_uses_fallback(update):
+    target_dir, extract_dir, manifest, new = update
+    patch_path = extract_dir / "patches" / "app.bin.patch"
+    _write(str(patch_path), _read(patch_path)[:-100])
+    result = apply_patches(manifest, str(target_dir), str(extract_dir))
+    assert result == {"patched": [], "fallback": ["bin/app.bin"]}
+    assert _read(extract_dir / "bin" / "app.bin") == new
+    assert not os.path.exists(extract_dir / "bin" / "app.bin.patched")
+
+
+def test_unexpected_patch_error_uses_fallback(update, monkeypatch):
+    target_dir, extract_dir, manifest, new = update
+
+    def broken(*args):
+        raise ValueError("corrupt bsdiff patch")
+
+    monkeypatch.setattr(binary_patch, "_apply_entry", broken)
+    assert apply_patches(manifest, str(target_dir), str(extract_dir))["fallback"] == ["bin/app.bin"]
+    assert _read(extract_dir / "bin" / "app.bin") == new
+
+
+def test_missing_sha256_uses_fallback(update):
+    target_dir, extract_dir, manifest, new = update
+    del manifest["patches"][0]["sha256"]
+    assert apply_patches(manifest, str(target_dir), str(extract_dir))["fallback"] == ["bin/app.bin"]
+    assert _read(extract_dir / "bin" / "app.bin") == new
+
+
+def test_changed_source_uses_download_fallback(update):
+    target_dir, extract_dir, manifest, new = update
+    _write(str(target_dir / "bin" / "app.bin"), b"locally modified")
+    del manifest["patches"][0]["fallback"]
+    manifest["patches"][0]["fallback_url"] = "https://example.invalid/app.bin"
+    downloads = []
+
+    def download(url, path):
+        downloads.append(url)
+        _write(path, new)
+        return True
+
+    assert apply_patches(manifest, str(target_dir), str(extract_dir), download)["fallback"] == ["bin/app.bin"]
+    assert downloads == ["https://example.invalid/app.bin"]
+    assert _read(extract_dir / "bin" / "app.bin") == new
+
+
+def test_no_fallback_raises(update):
+    target_dir, extract_dir, manifest, _ = update
+    _write(str(extract_dir / "patches" / "app.bin.patch"), b"garbage")
+    del manifest["patches"][0]["fallback"]
+    with pytest.raises(PatchError):
+        apply_patches(manifest, str(target_dir), str(extract_dir))
@@ -0,0 +1,77 @@
+import json
+import os
+import time
+import pytest
+from blob_gc import BlobGarbageCollector
+
+OLD = time.time() - 2 * 86400
+
+
+def _digest(char):
+    return "sha256-" + char * 64
+
+
+def _write(path, content=b"x", mtime=OLD):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(content)
+    os.utime(path, (mtime, mtime))
+
+
+@pytest.fixture
+def models_dir(tmp_path):
+    """manifest 引用 a（层）和 b（config）；c 未被引用，d 未被引用但刚修改；a 有一个未完成的下载"""
+    root = tmp_path / "models"
+    manifest = {"config": {"digest": "sha256:" + "b" * 64, "size": 2},
+                "layers": [{"digest": "sha256:" + "a" * 64, "size": 4}]}
+    _write(str(root / "manifests" / "registry.ollama.ai" / "library" / "llama3" / "latest"),
+           json.dumps(manifest).encode())
+    blobs = root / "blobs"
+    _write(str(blobs / _digest("a")), b"aaaa")
+    _write(str(blobs / _digest("b")), b"bb")
+    _write(str(blobs / _digest("c")), b"ccc")
+    _write(str(blobs / (_digest("a") + "-partial")), b"aa")
+    _write(str(blobs / (_digest("a") + "-partial-0")), b"a")
+    _write(str(blobs / _digest("d")), b"dddd", mtime=time.time())
+    _write(str(blobs / "notes.txt"), b"not a blob")
+    return root
+
+
+def _names(root):
+    return sorted(os.listdir(root / "blobs"))
+
+
+def test_dry_run_lists_without_deleting(models_dir):
+    before = _names(models_dir)
+    report = BlobGarbageCollector(str(models_dir), workers=2).collect(dry_run=True)
+    assert sorted(report["targets"]) == sorted([_digest("c"), _digest("a") + "-partial", _digest("a") + "-partial-0"])
+    assert report["reclaimableBytes"] == 3 + 2 + 1
+    assert report["reachable"] == 2 and report["manifests"] == 1
+    assert report["deleted"] == [] and report["freedBytes"] == 0
+    assert _names(models_dir) == before
+
+
+def test_delete_removes_only_unreferenced(models_dir):
+    report = BlobGarbageCollector(str(models_dir), workers=2).collect(dry_run=False)
+    assert sorted(report["deleted"]) == sorted(report["targets"])
+    assert report["freedBytes"] == 6 and report["failed"] == []
+    assert _names(models_dir) == sorted([_digest("a"), _digest("b"), _digest("d"), "notes.txt"])
+
+
+def test_min_age_protects_recent_files(models_dir):
+    report = BlobGarbageCollector(str(models_dir), workers=2, min_age=3600).collect(dry_run=False)
+    assert [blob["name"] for blob in report["skipped"]] == [_digest("d")]
+    assert _digest("d") in _names(models_dir)
+    # min_age 为 0 时刚修改的文件也会回收
+    report = BlobGarbageCollector(str(models_dir), workers=2, min_age=0).collect(dry_run=False)
+    assert report["deleted"] == [_digest("d")]
+
+
+def test_unreadable_manifest_blocks_orphan_deletion(models_dir):
+    _write(str(models_dir / "manifests" / "registry.ollama.ai" / "library" / "broken" / "latest"), b"{not json")
+    report = BlobGarbageCollector(str(models_dir), workers=2).collect(dry_run=False)
+    assert len(report["errors"]) == 1 and "broken" in report["errors"][0]
+    # 未引用的 blob 可能被读取失败的 manifest 引用，不删除；未完成的下载仍然回收
+    assert report["orphans"] and _digest("c") not in report["targets"]
+    assert sorted(report["deleted"]) == sorted([_digest("a") + "-partial", _digest("a") + "-partial-0"])
+    assert _digest("c") in _names(models_dir)
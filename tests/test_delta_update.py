@@ -0,0 +1,39 @@
+import hashlib
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from delta_update import DeltaUpdateError, fetch_manifest
+
+MANIFEST = json.dumps({"version": "1.2.0", "files": [{"path": "app.py", "size": 3, "sha256": "0" * 64}]}).encode()
+
+
+@pytest.fixture
+def manifest_url():
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(MANIFEST)))
+            self.end_headers()
+            self.wfile.write(MANIFEST)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/update_manifest.json"
+    server.shutdown()
+    server.server_close()
+
+
+def test_manifest_must_match_published_digest(manifest_url):
+    digest = hashlib.sha256(MANIFEST).hexdigest()
+    assert fetch_manifest(manifest_url, digest.upper(), "1.2.0")["version"] == "1.2.0"
+
+    with pytest.raises(DeltaUpdateError, match="摘要"):
+        fetch_manifest(manifest_url, "")
+    with pytest.raises(DeltaUpdateError, match="校验失败"):
+        fetch_manifest(manifest_url, hashlib.sha256(b"other").hexdigest())
+    with pytest.raises(DeltaUpdateError, match="版本"):
+        fetch_manifest(manifest_url, digest, "1.3.0")
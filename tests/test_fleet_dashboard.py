@@ -0,0 +1,27 @@
+import json
+from fleet_dashboard import FleetSnapshotCache
+from network_backend import _make_result
+
+
+class FakeNetwork:
+    """为每台服务器返回相同的 /api/tags 和空的 /api/ps"""
+
+    def __init__(self, models):
+        self.models = models
+
+    def submit_many(self, specs, callback):
+        callback([_make_result(spec, 200, json.dumps({"models": self.models if spec["url"].endswith("/tags")
+                                                      else []}).encode()) for spec in specs])
+
+
+def test_listed_size_counts_aliases_once():
+    models = [{"name": "llama3:latest", "digest": "a", "size": 4},
+              {"name": "llama3:8b", "digest": "a", "size": 4},
+              {"name": "qwen2:latest", "digest": "b", "size": 3}]
+    servers = [{"address": "host", "port": "11434"}, {"address": "host", "port": "11435"}]
+    cache = FleetSnapshotCache()
+    cache.refresh(FakeNetwork(models), servers)
+
+    totals = cache.summary(servers)["totals"]
+    assert totals["models"] == 6
+    assert totals["listedBytes"] == 14
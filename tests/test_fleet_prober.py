@@ -0,0 +1,27 @@
+from fleet_prober import FleetProber
+from network_backend import _make_result
+
+
+class FakeNetwork:
+    """按端口返回预设状态码的网络后端"""
+
+    def __init__(self, statuses):
+        self.statuses = statuses
+
+    def submit_many(self, specs, callback):
+        results = []
+        for spec in specs:
+            status = self.statuses.get(spec["url"].split(":")[2].split("/")[0], 0)
+            body = b'{"version": "0.5.0"}' if status == 200 else b""
+            results.append(_make_result(spec, status, body, latency=3.0, error="" if status else "连接失败"))
+        callback(results)
+
+
+def test_any_http_response_counts_as_online():
+    servers = [{"address": "host", "port": port} for port in ("11434", "11435", "11436")]
+    snapshots = []
+    FleetProber().probe(FakeNetwork({"11434": 200, "11435": 404}), servers, snapshots.append)
+
+    online = [row["online"] for row in snapshots[0]]
+    assert online == [True, True, False]
+    assert snapshots[0][0]["version"] == "0.5.0"
@@ -0,0 +1,50 @@
+import json
+from model_benchmark import ModelBenchmark, StubOllamaServer
+from network_backend import ThreadNetworkBackend
+
+
+def _benchmark(tmp_path, network):
+    return ModelBenchmark(network, str(tmp_path / "history.json"), num_predict=4)
+
+
+def test_run_against_stub_server(tmp_path):
+    stub = StubOllamaServer(load_delay=0.05, token_delay=0.001)
+    server = stub.start()
+    network = ThreadNetworkBackend(4)
+    try:
+        benchmark = _benchmark(tmp_path, network)
+        run = benchmark.run([server], ["stub:latest", "missing:latest"], repeat=1)
+    finally:
+        network.shutdown()
+        stub.stop()
+
+    assert not run["cancelled"]
+    assert [result["model"] for result in run["results"]] == ["stub:latest"]
+    result = run["results"][0]
+    assert result["errors"] == []
+    stats = result["stats"]
+    assert stats["coldLoad"]["count"] == 1 and stats["coldLoad"]["p50"] >= 40
+    assert stats["warmFirstToken"]["count"] == 1
+    # 热启动不再加载模型，首 token 比冷启动快
+    assert stats["warmFirstToken"]["p50"] < stats["coldFirstToken"]["p50"]
+    assert stats["tokensPerSecond"]["p50"] > 0
+    history = json.loads((tmp_path / "history.json").read_text(encoding="utf-8"))
+    assert len(history) == 1 and history[0]["results"][0]["model"] == "stub:latest"
+
+
+def test_cancelled_run_is_not_saved(tmp_path):
+    stub = StubOllamaServer(load_delay=0.01, token_delay=0.001)
+    server = stub.start()
+    network = ThreadNetworkBackend(4)
+    try:
+        benchmark = _benchmark(tmp_path, network)
+        run = benchmark.run([server], ["stub:latest"], repeat=3,
+                            on_progress=lambda progress: benchmark.cancel())
+    finally:
+        network.shutdown()
+        stub.stop()
+
+    assert run["cancelled"]
+    assert run["results"][0]["stats"]["coldLoad"]["count"] == 1
+    assert not (tmp_path / "history.json").exists()
+    assert benchmark.load_history() == []
@@ -0,0 +1,13 @@
+from model_inventory import ModelInventory
+
+
+def test_latest_digest_compares_parsed_times():
+    inventory = ModelInventory()
+    # 字符串比较时 "2026-10-05T09:00:00+08:00" 更大，实际上它比 UTC 03:00 更早
+    inventory.update_host("a", "a", [{"name": "llama3:latest", "digest": "old",
+                                      "modified_at": "2026-10-05T09:00:00+08:00"}])
+    inventory.update_host("b", "b", [{"name": "llama3:latest", "digest": "new",
+                                      "modified_at": "2026-10-05T03:00:00.123456789Z"}])
+
+    assert inventory.outdated_hosts("llama3:latest") == [
+        {"key": "a", "name": "a", "digest": "old", "expectedDigest": "new"}]
@@ -0,0 +1,119 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from network_backend import AsyncNetworkBackend, ThreadNetworkBackend, httpx, make_request
+
+
+class StubServer:
+    """/slow 延迟返回，/stream 持续输出行直到客户端断开，并记录流已断开"""
+
+    def __init__(self):
+        server = self
+        self.release = threading.Event()
+        self.stream_closed = threading.Event()
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                if self.path == "/stream":
+                    self.send_response(200)
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    try:
+                        for _ in range(200):
+                            line = b'{"status":"pulling"}\n'
+                            self.wfile.write(b"%x\r\n%s\r\n" % (len(line), line))
+                            self.wfile.flush()
+                            time.sleep(0.05)
+                    except OSError:
+                        server.stream_closed.set()
+                    return
+                if self.path == "/slow":
+                    server.release.wait(5)
+                body = b'{"version":"0.5.0"}'
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.release.set()
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def server():
+    stub = StubServer()
+    yield stub
+    stub.close()
+
+
+BACKENDS = [ThreadNetworkBackend, pytest.param(AsyncNetworkBackend, marks=pytest.mark.skipif(
+    httpx is None, reason="未安装 httpx"))]
+
+
+@pytest.mark.parametrize("backend_class", BACKENDS)
+def test_shutdown_waits_for_in_flight_calls(server, backend_class):
+    backend = backend_class()
+    results = []
+    worker = threading.Thread(target=lambda: results.extend(
+        backend.request_many([make_request(f"{server.url}/slow", timeout=5)])))
+    worker.start()
+    time.sleep(0.2)
+    backend.shutdown()
+    server.release.set()
+    worker.join(5)
+
+    assert results[0]["ok"]
+    closed = backend.request_many([make_request(f"{server.url}/api/version")])
+    assert not closed[0]["ok"] and closed[0]["error"] == "网络后端已关闭"
+
+
+@pytest.mark.parametrize("backend_class", BACKENDS)
+def test_submit_many_reports_callback_errors(server, backend_class, capsys):
+    backend = backend_class()
+    finished = threading.Event()
+
+    def callback(results):
+        finished.set()
+        raise ValueError("boom")
+
+    backend.submit_many([make_request(f"{server.url}/api/version")], callback)
+    assert finished.wait(5)
+    time.sleep(0.2)
+    backend.shutdown()
+    assert "网络请求回调失败: boom" in capsys.readouterr().out
+
+
+@pytest.mark.skipif(httpx is None, reason="未安装 httpx")
+def test_async_request_times_out_when_loop_stopped(server):
+    backend = AsyncNetworkBackend()
+    backend._loop.call_soon_threadsafe(backend._loop.stop)
+    backend._thread.join(2)
+
+    result = backend.request(make_request(f"{server.url}/api/version", timeout=0.1))
+    assert not result["ok"] and result["error"] == "等待网络后端超时"
+
+
+@pytest.mark.skipif(httpx is None, reason="未安装 httpx")
+def test_async_iter_lines_releases_stream_when_consumer_stops(server):
+    backend = AsyncNetworkBackend()
+    lines = backend.iter_lines(make_request(f"{server.url}/stream", timeout=5))
+    assert next(lines)
+    lines.close()
+
+    assert server.stream_closed.wait(5)
+    backend.shutdown()
+    backend._thread.join(2)
+    assert not backend._thread.is_alive()
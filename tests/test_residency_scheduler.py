@@ -0,0 +1,61 @@
+import time
+import residency_scheduler
+from residency_scheduler import ResidencyScheduler
+
+GB = 1024 ** 3
+
+
+class FakeUnloadEngine:
+    def __init__(self, running):
+        self.running = running
+        self.unloaded = []
+
+    def unload(self, base_url, model_name):
+        self.unloaded.append(model_name)
+        self.running[:] = [model for model in self.running if model["name"] != model_name]
+        return True, "模型卸载成功"
+
+
+class FakeManager:
+    def __init__(self, running, residency):
+        self._settings = {"residency": residency}
+        self.unload_engine = FakeUnloadEngine(running)
+
+
+def _scheduler(monkeypatch, running, residency=None):
+    preloaded = []
+
+    def preload(base_url, model_name, keep_alive):
+        preloaded.append(model_name)
+        running.append({"name": model_name, "size_vram": 4 * GB})
+        return True
+
+    monkeypatch.setattr(residency_scheduler, "list_running_models", lambda base_url: list(running))
+    monkeypatch.setattr(residency_scheduler, "preload_model", preload)
+    scheduler = ResidencyScheduler(FakeManager(running, residency or {"default_budget": "10GB"}))
+    scheduler._model_sizes = lambda base_url: {"qwen2:latest": 4 * GB, "mistral:latest": 4 * GB}
+    return scheduler, preloaded
+
+
+def test_untagged_name_matches_running_model(monkeypatch):
+    running = [{"name": "qwen2:latest", "size_vram": 4 * GB, "expires_at": "2026-10-19T09:00:00Z"},
+               {"name": "llama3:latest", "size_vram": 4 * GB, "expires_at": "2026-10-19T10:00:00Z"}]
+    scheduler, preloaded = _scheduler(monkeypatch, running)
+    scheduler.touch("host:11434", "llama3")
+
+    # 设置中未带标签的名称与 /api/ps 的 qwen2:latest 是同一个模型，不应重新加载
+    assert scheduler.ensure_loaded("host", 11434, "qwen2") == (True, [])
+    assert preloaded == []
+
+    # qwen2 刚被使用，超出预算时应先卸载较早使用的 llama3
+    assert scheduler.ensure_loaded("host", 11434, "mistral") == (True, ["llama3:latest"])
+    assert preloaded == ["mistral:latest"]
+
+
+def test_schedule_fires_after_missed_minute(monkeypatch):
+    scheduler, _ = _scheduler(monkeypatch, [], {"schedule": [{"model": "qwen2", "time": "08:00"}]})
+    day = (2026, 10, 19, 7, 59, 0, 0, 292, -1)
+    assert scheduler.due_preloads(time.struct_time(day)) == []
+    late = time.struct_time(day[:3] + (8, 2) + day[5:])
+    assert [entry["model"] for entry in scheduler.due_preloads(late)] == ["qwen2"]
+    assert scheduler.due_preloads(late) == []
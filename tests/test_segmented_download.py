@@ -0,0 +1,118 @@
+import hashlib
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from segmented_download import MIN_SEGMENT_SIZE, SegmentedDownloader, probe_url
+from stream_hash import StreamingHasher
+
+PAYLOAD = os.urandom(MIN_SEGMENT_SIZE * 2 + 123)
+LAST_MODIFIED = "Mon, 05 Oct 2026 08:00:00 GMT"
+
+
+class RangeServer:
+    """支持 Range 的本地文件服务器，/redirect 重定向到 /update.zip，记录收到的 If-Range"""
+
+    def __init__(self, etag):
+        server = self
+        self.if_range = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _headers(self, status, start, end):
+                self.send_response(status)
+                if status == 206:
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{len(PAYLOAD)}")
+                self.send_header("Accept-Ranges", "bytes")
+                self.send_header("ETag", etag)
+                self.send_header("Last-Modified", LAST_MODIFIED)
+                self.send_header("Content-Length", str(end - start + 1))
+                self.end_headers()
+
+            def _redirect(self):
+                if self.path != "/redirect":
+                    return False
+                self.send_response(302)
+                self.send_header("Location", "/update.zip")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return True
+
+            def do_HEAD(self):
+                if not self._redirect():
+                    self._headers(200, 0, len(PAYLOAD) - 1)
+
+            def do_GET(self):
+                if self._redirect():
+                    return
+                server.if_range.append(self.headers.get("If-Range"))
+                start, end = 0, len(PAYLOAD) - 1
+                first, _, last = self.headers.get("Range", "")[len("bytes="):].partition("-")
+                if first:
+                    start, end = int(first), int(last) if last else end
+                self._headers(206 if first else 200, start, end)
+                self.wfile.write(PAYLOAD[start:end + 1])
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def weak_etag_server():
+    server = RangeServer('W/"v1"')
+    yield server
+    server.stop()
+
+
+def test_probe_follows_redirects(weak_etag_server):
+    info = probe_url(weak_etag_server.url + "/redirect")
+    assert info["size"] == len(PAYLOAD)
+    assert info["supports_range"]
+    assert info["last_modified"] == LAST_MODIFIED
+
+
+def test_weak_etag_uses_last_modified(weak_etag_server, tmp_path):
+    info = probe_url(weak_etag_server.url + "/update.zip")
+    path = str(tmp_path / "update.zip.part")
+    hasher = StreamingHasher()
+    downloader = SegmentedDownloader(weak_etag_server.url + "/update.zip", path, info["size"], etag=info["etag"],
+                                     last_modified=info["last_modified"], segments=2, chunk_size=64 * 1024,
+                                     hasher=hasher)
+    assert downloader.download()
+    with open(path, 'rb') as f:
+        assert f.read() == PAYLOAD
+    assert hasher.hexdigests()["sha256"] == hashlib.sha256(PAYLOAD).hexdigest()
+    assert not os.path.exists(path + ".segments")
+    assert weak_etag_server.if_range == [LAST_MODIFIED, LAST_MODIFIED]
+
+
+def test_resume_from_saved_map(tmp_path):
+    server = RangeServer('"v1"')
+    try:
+        path = str(tmp_path / "update.zip.part")
+        cancel = threading.Event()
+        downloader = SegmentedDownloader(server.url + "/update.zip", path, len(PAYLOAD), etag='"v1"', segments=2,
+                                         chunk_size=64 * 1024, cancel_event=cancel,
+                                         on_progress=lambda done, total: cancel.set())
+        assert not downloader.download()
+        # 取消时保存的段映射只记录已写入的字节
+        with open(path, 'rb') as f:
+            data = f.read()
+        for segment in downloader.segments:
+            written = slice(segment["start"], segment["start"] + segment["done"])
+            assert data[written] == PAYLOAD[written]
+
+        resumed = SegmentedDownloader(server.url + "/update.zip", path, len(PAYLOAD), etag='"v1"', segments=2)
+        assert resumed.download()
+        with open(path, 'rb') as f:
+            assert f.read() == PAYLOAD
+        assert set(server.if_range) == {'"v1"'}
+    finally:
+        server.stop()
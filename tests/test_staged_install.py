@@ -0,0 +1,83 @@
+import os
+import pytest
+import staged_install
+from staged_install import StagedInstall, StagedInstallError
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(data)
+
+
+def _read(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+@pytest.fixture
+def install(tmp_path):
+    """安装目录中 ui 有三个文件，更新包替换其中一个、新增一个，并删除另一个"""
+    target_dir, package_dir = tmp_path / "install", tmp_path / "package"
+    for name in ("main.qml", "pages/home.qml", "pages/old.qml"):
+        _write(str(target_dir / "ui" / name), f"old {name}")
+    _write(str(package_dir / "main.qml"), "new main.qml")
+    _write(str(package_dir / "pages" / "new.qml"), "new pages/new.qml")
+    return target_dir, package_dir
+
+
+def _stage(target_dir, package_dir, move=False):
+    staged = StagedInstall(str(target_dir), workers=2)
+    staged.stage({"ui/main.qml": str(package_dir / "main.qml"),
+                  "ui/pages/new.qml": str(package_dir / "pages" / "new.qml")},
+                 delete_files=["ui/pages/old.qml"], move=move)
+    return staged
+
+
+def test_unchanged_files_are_hardlinked(install):
+    target_dir, package_dir = install
+    staged = _stage(target_dir, package_dir)
+    new_home = os.path.join(staged.new_dir, "ui", "pages", "home.qml")
+    assert os.path.samefile(new_home, target_dir / "ui" / "pages" / "home.qml")
+    assert not os.path.samefile(os.path.join(staged.new_dir, "ui", "main.qml"), package_dir / "main.qml")
+    assert not os.path.exists(os.path.join(staged.new_dir, "ui", "pages", "old.qml"))
+    # 暂存不改变安装目录
+    assert _read(target_dir / "ui" / "main.qml") == "old main.qml"
+
+
+def test_swap_and_rollback(install):
+    target_dir, package_dir = install
+    staged = _stage(target_dir, package_dir, move=True)
+    assert staged.swap() == ["ui"]
+    assert _read(target_dir / "ui" / "main.qml") == "new main.qml"
+    assert _read(target_dir / "ui" / "pages" / "new.qml") == "new pages/new.qml"
+    assert _read(target_dir / "ui" / "pages" / "home.qml") == "old pages/home.qml"
+    assert not os.path.exists(target_dir / "ui" / "pages" / "old.qml")
+    assert staged.can_rollback()
+
+    assert staged.rollback()
+    assert _read(target_dir / "ui" / "main.qml") == "old main.qml"
+    assert _read(target_dir / "ui" / "pages" / "old.qml") == "old pages/old.qml"
+    assert not os.path.exists(target_dir / "ui" / "pages" / "new.qml")
+
+
+def test_copy_when_hardlinks_unsupported(install, monkeypatch):
+    target_dir, package_dir = install
+
+    def no_link(source, target):
+        raise OSError("hardlinks not supported")
+
+    monkeypatch.setattr(staged_install.os, "link", no_link)
+    staged = _stage(target_dir, package_dir)
+    new_home = os.path.join(staged.new_dir, "ui", "pages", "home.qml")
+    assert _read(new_home) == "old pages/home.qml"
+    assert not os.path.samefile(new_home, target_dir / "ui" / "pages" / "home.qml")
+
+
+def test_swap_refuses_changed_install(install):
+    target_dir, package_dir = install
+    staged = _stage(target_dir, package_dir)
+    _write(str(target_dir / "ui" / "extra.qml"), "added after staging")
+    with pytest.raises(StagedInstallError):
+        staged.swap()
+    assert _read(target_dir / "ui" / "main.qml") == "old main.qml"
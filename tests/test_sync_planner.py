@@ -0,0 +1,79 @@
+import json
+import threading
+import time
+from sync_planner import FleetSyncRunner, pinned_models, plan_actions, plan_sync
+
+
+def _actions(host_count, per_host):
+    plans = [{"key": f"10.0.0.{index}:11434", "name": f"host{index}", "address": f"10.0.0.{index}",
+              "port": 11434, "pulls": [f"model{n}:latest" for n in range(per_host)], "deletes": []}
+             for index in range(host_count)]
+    return plan_actions(plans)
+
+
+def test_hosts_run_in_parallel(tmp_path):
+    runner = FleetSyncRunner(str(tmp_path / "state.json"), max_hosts=4)
+    active, peak = set(), []
+    lock = threading.Lock()
+
+    def execute(action):
+        with lock:
+            active.add(action["key"])
+            peak.append(len(active))
+        time.sleep(0.02)
+        with lock:
+            active.discard(action["key"])
+        return True, ""
+
+    runner._execute = execute
+    finished = []
+    runner.run(_actions(4, 3), lambda progress: None, lambda ok, message: finished.append(ok))
+    assert finished == [True]
+    assert max(peak) > 1
+
+
+def test_cancelled_action_stays_pending(tmp_path):
+    state_file = tmp_path / "state.json"
+    runner = FleetSyncRunner(str(state_file), max_hosts=1)
+    actions = _actions(1, 3)
+
+    def execute(action):
+        runner.cancel()
+        return False, "已取消"
+
+    runner._execute = execute
+    finished = []
+    runner.run(actions, lambda progress: None, lambda ok, message: finished.append(ok))
+    assert finished == [False]
+    state = json.loads(state_file.read_text(encoding="utf-8"))
+    assert [item["id"] for item in state["pending"]] == [action["id"] for action in actions]
+    assert state["failed"] == []
+    assert runner.load_pending() == actions
+
+
+def test_failed_action_is_kept_for_resume(tmp_path):
+    runner = FleetSyncRunner(str(tmp_path / "state.json"))
+    actions = _actions(1, 2)
+    runner._execute = lambda action: (action is actions[1], "" if action is actions[1] else "状态码 500")
+    runner.run(actions, lambda progress: None, lambda ok, message: None)
+    assert [item["id"] for item in runner.load_pending()] == [actions[0]["id"]]
+
+
+def test_pinned_digest_not_in_registry_is_reported_not_pulled():
+    desired = {"groups": [{"models": [{"name": "llama3", "digest": "sha256:old"}, "qwen2"]}]}
+    servers = [{"address": "10.0.0.1", "port": 11434}]
+    host_models = {"10.0.0.1:11434": {"llama3:latest": "new", "qwen2:latest": "q"}}
+    assert pinned_models(desired) == ["llama3:latest"]
+
+    plans = plan_sync(desired, servers, host_models, registry_digests={"llama3:latest": "new"})
+    assert plans[0]["pulls"] == []
+    assert plans[0]["unreachable"] == [{"model": "llama3:latest", "digest": "old",
+                                        "current": "new", "registry": "new"}]
+    assert plan_actions(plans) == []
+
+    # registry 仍提供固定的版本时照常拉取
+    plans = plan_sync(desired, servers, host_models, registry_digests={"llama3:latest": "sha256:old"})
+    assert plans[0]["pulls"] == ["llama3:latest"] and plans[0]["unreachable"] == []
+
+    host_models["10.0.0.1:11434"]["llama3:latest"] = "old"
+    assert plan_sync(desired, servers, host_models) == []
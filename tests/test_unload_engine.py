@@ -0,0 +1,56 @@
+from network_backend import _make_result
+from unload_engine import UnloadEngine
+
+
+class FakeNetwork:
+    """按路径返回预设响应的网络后端，记录请求过的路径"""
+
+    def __init__(self, responses):
+        self.responses = responses
+        self.paths = []
+
+    def request(self, spec):
+        path = spec["url"].split("/api", 1)[1]
+        self.paths.append(path)
+        status, body = self.responses.get(path, (0, b""))
+        return _make_result(spec, status, body, error="" if status else "连接失败")
+
+    def request_many(self, specs):
+        return [self.request(spec) for spec in specs]
+
+
+def test_unload_without_version_endpoint():
+    network = FakeNetwork({"/generate": (200, b'{"done": true}'), "/ps": (200, b'{"models": []}')})
+    engine = UnloadEngine(network, poll_timeout=0.2)
+    assert engine.unload("http://host:11434/api", "llama3:latest") == (True, "模型卸载成功")
+    assert "/generate" in network.paths
+    # 检测失败的能力不缓存
+    engine.unload("http://host:11434/api", "llama3:latest")
+    assert network.paths.count("/version") == 2
+
+
+def test_unload_without_version_and_ps_endpoints():
+    network = FakeNetwork({"/generate": (200, b'{"done": true}'), "/ps": (404, b"")})
+    engine = UnloadEngine(network, poll_timeout=0.2)
+    assert engine.unload("http://host:11434/api", "llama3:latest")[0]
+
+
+def test_unreachable_server_reports_failure():
+    engine = UnloadEngine(FakeNetwork({}), poll_timeout=0.2)
+    ok, message = engine.unload("http://host:11434/api", "llama3:latest")
+    assert not ok and message == "连接失败"
+
+
+def test_old_server_without_keep_alive():
+    network = FakeNetwork({"/version": (200, b'{"version": "0.1.20"}')})
+    ok, message = UnloadEngine(network).unload("http://host:11434/api", "llama3:latest")
+    assert not ok and "0.1.20" in message
+    assert "/generate" not in network.paths
+
+
+def test_untagged_name_waits_for_tagged_ps_entry():
+    network = FakeNetwork({"/version": (200, b'{"version": "0.5.0"}'), "/generate": (200, b'{"done": true}'),
+                           "/ps": (200, b'{"models": [{"name": "llama3:latest", "model": "llama3:latest"}]}')})
+    engine = UnloadEngine(network, poll_timeout=0.2)
+    # 模型一直驻留，未带标签的名称不能被当作已卸载
+    assert engine.unload("http://host:11434/api", "llama3") == (False, "卸载请求已发送，但模型仍在运行")
@@ -0,0 +1,93 @@
+import hashlib
+import socket
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import pytest
+from network_backend import ThreadNetworkBackend
+from update_checker import OUTDATED, UNKNOWN, UP_TO_DATE, UpdateChecker
+
+MANIFEST = b'{"schemaVersion": 2, "layers": []}'
+MANIFEST_DIGEST = hashlib.sha256(MANIFEST).hexdigest()
+
+
+class Registry:
+    """本地 registry 桩：manifests 为 仓库:标签 -> (内容, 是否返回 Docker-Content-Digest)"""
+
+    def __init__(self, manifests):
+        registry = self
+        self.requests = []
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                registry.requests.append(self.path)
+                repository, _, tag = self.path[len("/v2/"):].partition("/manifests/")
+                entry = manifests.get(f"{repository}:{tag}")
+                if entry is None:
+                    self.send_error(404)
+                    return
+                body, with_header = entry
+                self.send_response(200)
+                if with_header:
+                    self.send_header("Docker-Content-Digest", "sha256:" + hashlib.sha256(body).hexdigest())
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+@pytest.fixture
+def network():
+    backend = ThreadNetworkBackend(4)
+    yield backend
+    backend.shutdown()
+
+
+@pytest.fixture
+def registry():
+    stub = Registry({"library/llama3:latest": (MANIFEST, True), "user/coder:7b": (MANIFEST, False)})
+    yield stub
+    stub.stop()
+
+
+def test_digest_unchanged_and_changed(network, registry):
+    checker = UpdateChecker(network, registry.url)
+    rows = checker.check([
+        {"name": "llama3:latest", "digest": MANIFEST_DIGEST},
+        # 没有 Docker-Content-Digest 时按 manifest 内容计算
+        {"name": "user/coder:7b", "digest": "sha256:" + MANIFEST_DIGEST},
+        {"name": "llama3", "digest": "0" * 64},
+    ])
+    assert [row["status"] for row in rows] == [UP_TO_DATE, UP_TO_DATE, OUTDATED]
+    assert rows[2]["remoteDigest"] == MANIFEST_DIGEST
+    # llama3 和 llama3:latest 是同一个 manifest，只请求一次；第二次检查使用缓存
+    assert len(registry.requests) == 2
+    checker.check([{"name": "llama3:latest", "digest": MANIFEST_DIGEST}])
+    assert len(registry.requests) == 2
+
+
+def test_missing_manifest_is_unknown(network, registry):
+    rows = UpdateChecker(network, registry.url).check([{"name": "missing:latest", "digest": MANIFEST_DIGEST}])
+    assert rows[0]["status"] == UNKNOWN
+    assert rows[0]["error"] == "状态码 404"
+
+
+def test_registry_unreachable(network):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    checker = UpdateChecker(network, f"http://127.0.0.1:{port}", timeout=2)
+    rows = checker.check([{"name": "llama3:latest", "digest": MANIFEST_DIGEST}])
+    assert rows[0]["status"] == UNKNOWN
+    assert rows[0]["remoteDigest"] == "" and rows[0]["error"]
+    # 失败的结果不缓存
+    assert checker._cache == {}
@@ -0,0 +1,34 @@
+from warm_keeper import WarmModelKeeper
+
+
+class FakeUnloadEngine:
+    def __init__(self):
+        self.unloaded = []
+
+    def unload(self, base_url, model_name):
+        self.unloaded.append((base_url, model_name))
+        return True, "模型卸载成功"
+
+
+class FakeManager:
+    def __init__(self):
+        self._settings = {"translation": {"ollama_translation": True, "ollama_model": "qwen2",
+                                          "ollama_keep_warm": True, "ollama_idle_timeout": 600}}
+        self.unload_engine = FakeUnloadEngine()
+
+
+def test_release_when_keep_warm_disabled():
+    manager = FakeManager()
+    keeper = WarmModelKeeper(manager)
+    keeper._loaded = ("http://host:11434/api", "qwen2")
+    keeper.touch()
+    assert keeper._idle_timer is not None
+
+    manager._settings["translation"]["ollama_keep_warm"] = False
+    assert not keeper.is_enabled()
+    assert keeper.release()
+    assert manager.unload_engine.unloaded == [("http://host:11434/api", "qwen2")]
+    assert keeper.loaded is None and keeper._idle_timer is None
+    # 没有预加载的模型时不发送卸载请求
+    assert not keeper.release()
+    assert len(manager.unload_engine.unloaded) == 1
@@ -56,7 +56,7 @@ Item {
                 Layout.fillHeight: true
                 Label {
                     anchors.fill: parent
-                    text: Utils.parseModelFamily(name)
+                    text: family || Utils.parseModelFamily(name)
                     color: "#cccccc"
                     font.pointSize: 11
                     verticalAlignment: Text.AlignVCenter
@@ -70,7 +70,7 @@ Item {
                 Layout.fillHeight: true
                 Label {
                     anchors.fill: parent
-                    text: Utils.parseParamSize(name)
+                    text: parameterSize || Utils.parseParamSize(name)
                     color: "#cccccc"
                     font.pointSize: 11
                     verticalAlignment: Text.AlignVCenter
@@ -96,7 +96,7 @@ Item {
                 Layout.fillHeight: true
                 Label {
                     anchors.fill: parent
-                    text: Utils.parseQuantization(name)
+                    text: quantization || Utils.parseQuantization(name)
                     color: "#cccccc"
                     font.pointSize: 11
                     verticalAlignment: Text.AlignVCenter
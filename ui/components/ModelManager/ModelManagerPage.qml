@@ -7,6 +7,8 @@ Rectangle {
     property string currentPage: "modelManager"
     property string deleteModelName: ""
     property bool showDeleteDialog: false
+    property bool bulkRunning: false
+    property string bulkProgressText: ""
     width: parent.width
     height: parent.height
     color: "#121212"
@@ -25,6 +27,15 @@ Rectangle {
         modelManager.deleteModel(deleteModelName)
         closeDeleteDialog()
     }
+
+    Connections {
+        target: modelManager
+        function onBulkOperationProgress(progress) {
+            bulkRunning = !progress.finished
+            bulkProgressText = progress.finished ? "" : "批量操作 " + progress.done + "/" + progress.total
+                                                      + (progress.failed > 0 ? "，失败 " + progress.failed : "")
+        }
+    }
     
     ColumnLayout {
         anchors.fill: parent
@@ -48,6 +59,76 @@ Rectangle {
                 Layout.fillWidth: true
             }
 
+            TextField {
+                id: modelFilterInput
+                Layout.preferredWidth: 220
+                placeholderText: "筛选模型 (名称、系列、量化)"
+                onTextChanged: installedModels.filterText = text
+                background: Rectangle {
+                    color: "#2a2a2a"
+                    radius: 8
+                    border {
+                        width: 1
+                        color: "#333333"
+                    }
+                }
+                color: "#ffffff"
+                placeholderTextColor: "#999999"
+            }
+
+            ComboBox {
+                id: sortCombo
+                Layout.preferredWidth: 140
+                textRole: "text"
+                model: [
+                    { text: "按名称", key: "name", desc: false },
+                    { text: "按大小", key: "size", desc: true },
+                    { text: "按更新时间", key: "modifiedAt", desc: true },
+                    { text: "按参数量", key: "parameterSize", desc: true },
+                    { text: "按量化", key: "quantization", desc: false },
+                    { text: "按系列分组", key: "name", desc: false, group: "family" }
+                ]
+                onActivated: function(index) {
+                    var option = model[index]
+                    installedModels.groupBy = option.group || ""
+                    installedModels.sortKey = option.key
+                    installedModels.descending = option.desc
+                }
+            }
+
+            Label {
+                text: bulkProgressText
+                visible: bulkProgressText !== ""
+                color: "#aaaaaa"
+                font.pointSize: 11
+            }
+
+            Button {
+                text: bulkRunning ? "取消" : "全部更新"
+                onClicked: {
+                    if (bulkRunning) {
+                        modelManager.cancelBulkOperation()
+                    } else {
+                        bulkRunning = true
+                        modelManager.updateAllModels()
+                    }
+                }
+                background: Rectangle {
+                    color: "#2a2a2a"
+                    radius: 8
+                    border {
+                        width: 1
+                        color: "#333333"
+                    }
+                }
+                contentItem: Text {
+                    text: parent.text
+                    color: "#ffffff"
+                    horizontalAlignment: Text.AlignHCenter
+                    verticalAlignment: Text.AlignVCenter
+                }
+            }
+
             Button {
                 text: "刷新"
                 onClicked: modelManager.getModels()
@@ -221,7 +302,22 @@ Rectangle {
                             width: parent.width
                             height: parent.height
                             spacing: 0
-                            model: modelData
+                            model: installedModels
+                            section.property: installedModels.groupBy
+                            section.delegate: Rectangle {
+                                width: modelList.totalColumnWidth
+                                height: 28
+                                color: "#202020"
+                                Label {
+                                    anchors.verticalCenter: parent.verticalCenter
+                                    anchors.left: parent.left
+                                    anchors.leftMargin: 25
+                                    text: section || "-"
+                                    color: "#4ecdc4"
+                                    font.bold: true
+                                    font.pointSize: 11
+                                }
+                            }
                             clip: true
                             // 计算总列宽
                             property real totalColumnWidth: colWidth1 + colWidth2 + colWidth3 + colWidth4 + colWidth5 + colWidth6
@@ -424,40 +520,8 @@ Rectangle {
         }
     }
 
-    // 存储信号连接
-    property var modelUpdatedConnection
-    // 模型数据
-    ListModel {
-        id: modelData
-    }
-
-    // 连接信号
     Component.onCompleted: {
-        // 连接模型更新信号
-        modelUpdatedConnection = modelManager.modelsUpdated.connect(function(models) {
-            // 清空现有模型数据
-            if (modelData) {
-                modelData.clear()
-                
-                // 添加新模型数据
-                for (var i = 0; i < models.length; i++) {
-                    var model = models[i]
-                    modelData.append({
-                        name: model.name,
-                        size: model.size || 0
-                    })
-                }
-            }
-        })
-        
         // 主动获取模型列表
         modelManager.getModels()
     }
-    
-    // 断开信号连接
-    Component.onDestruction: {
-        if (modelUpdatedConnection) {
-            modelUpdatedConnection.disconnect()
-        }
-    }
-}
\ No newline at end of file
+}
@@ -48,6 +48,7 @@ Rectangle {
     property string diskUsage: "0.0 GB"
     property string vramUsage: "0 B"
     property var activeModelsDetails: []
+    property var fleetTotals: ({})
     
     // 监听ModelManager的信号
     Connections {
@@ -77,6 +78,23 @@ Rectangle {
         function onActiveModelsDetailsUpdated(models) {
             activeModelsDetails = models;
         }
+        
+        // 监听集群汇总更新
+        function onFleetDashboardUpdated() {
+            fleetTotals = modelManager.fleetDashboard.totals;
+        }
+    }
+    
+    // 定时器，定期刷新所有服务器的快照
+    Timer {
+        interval: 15000 // 15秒更新一次
+        running: dashboardPage.visible
+        repeat: true
+        triggeredOnStart: true
+        
+        onTriggered: {
+            modelManager.refreshFleetDashboard();
+        }
     }
     
     // 定时器，定期更新数据
@@ -116,6 +134,18 @@ Rectangle {
         font.bold: true
         color: "#ffffff"
     }
+    
+    // 集群汇总
+    Label {
+        x: 20
+        y: 95
+        width: parent.width - 40
+        height: 20
+        visible: fleetTotals.servers > 1
+        text: `集群: ${fleetTotals.online}/${fleetTotals.servers} 在线 · 模型 ${fleetTotals.models} (${fleetTotals.uniqueModels} 种) · 已加载 ${fleetTotals.loadedModels} · 模型大小合计 ${fleetTotals.listedUsage} · 显存 ${fleetTotals.vramUsage}`
+        font.pointSize: 11
+        color: "#999999"
+    }
 
     // 卡片容器
     Rectangle {
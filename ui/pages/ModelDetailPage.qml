@@ -44,6 +44,8 @@ Rectangle {
             originalModelDescription = modelDescription || ""
             // console.log("Model data loaded:", currentModelData)
             loadModelDetails()
+            // 预加载翻译模型，减少首次翻译延迟
+            modelManager.warmTranslationModel()
         } else {
             errorMessage = "未找到模型数据"
         }
@@ -25,6 +25,8 @@ Rectangle {
     // 初始化
     Component.onCompleted: {
         loadModels()
+        // 预加载翻译模型，减少首次翻译延迟
+        modelManager.warmTranslationModel()
     }
     
     // 加载模型列表
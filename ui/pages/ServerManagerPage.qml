@@ -8,6 +8,51 @@ Rectangle {
     width: parent.width
     height: parent.height
     color: "#121212"
+
+    // 服务器健康统计（按 "地址:端口" 索引）
+    property var healthByKey: ({})
+
+    function updateHealth() {
+        var map = {}
+        var rows = modelManager ? modelManager.fleetHealth : []
+        for (var i = 0; i < rows.length; i++) {
+            map[rows[i].key] = rows[i]
+        }
+        healthByKey = map
+    }
+
+    function healthText(server) {
+        if (!server) return ""
+        var health = healthByKey[server.address + ":" + server.port]
+        if (!health || health.checks === 0) return "检测中..."
+        if (!health.online) return `离线 · 可用率 ${health.availability}%`
+        return `${health.p50}/${health.p95}/${health.p99}ms · ${health.availability}%`
+    }
+
+    Connections {
+        target: modelManager
+        function onFleetHealthUpdated() {
+            updateHealth()
+        }
+    }
+
+    Component.onCompleted: {
+        if (modelManager) {
+            modelManager.probeFleet()
+        }
+    }
+
+    // 页面可见时每10秒并发探测所有服务器
+    Timer {
+        interval: 10000
+        running: settingsPage.visible
+        repeat: true
+        onTriggered: {
+            if (modelManager) {
+                modelManager.probeFleet()
+            }
+        }
+    }
     
     ColumnLayout {
         anchors.fill: parent
@@ -31,6 +76,50 @@ Rectangle {
                 Layout.fillWidth: true
             }
 
+            // 按 config/model_sync.json 同步所有服务器的模型
+            Button {
+                id: syncFleetButton
+                property bool syncing: false
+                text: syncing ? "取消同步" : "同步模型"
+                onClicked: {
+                    if (syncing) {
+                        modelManager.cancelFleetSync()
+                    } else {
+                        syncing = true
+                        modelManager.syncFleet()
+                    }
+                }
+                Connections {
+                    target: modelManager
+                    function onSyncProgressUpdated(progress) {
+                        syncFleetButton.syncing = true
+                    }
+                    function onSyncFinished(success, message) {
+                        syncFleetButton.syncing = false
+                    }
+                    function onSyncPlanReady(plans) {
+                        // 只有无法达到的固定版本时不会启动同步
+                        if (!plans.some(plan => plan.pulls.length > 0 || plan.deletes.length > 0)) {
+                            syncFleetButton.syncing = false
+                        }
+                    }
+                }
+                background: Rectangle {
+                    color: "#252525"
+                    radius: 8
+                    border {
+                        width: 1
+                        color: "#4ecdc4"
+                    }
+                }
+                contentItem: Text {
+                    text: parent.text
+                    color: "#ffffff"
+                    horizontalAlignment: Text.AlignHCenter
+                    verticalAlignment: Text.AlignVCenter
+                }
+            }
+
             Button {
                 text: "新建服务器"
                 onClicked: {
@@ -186,6 +275,31 @@ Rectangle {
                             }
                         }
 
+                        // 健康列
+                        Item {
+                            Layout.preferredWidth: 220
+                            Layout.fillHeight: true
+                            Label {
+                                anchors.centerIn: parent
+                                text: "延迟 p50/p95/p99 · 可用率"
+                                font.bold: true
+                                color: "#ffffff"
+                                font.pointSize: 12
+                            }
+                        }
+
+                        // 分隔符5
+                        Item {
+                            Layout.preferredWidth: 15
+                            Layout.fillHeight: true
+                            Rectangle {
+                                anchors.centerIn: parent
+                                width: 1
+                                height: parent.height
+                                color: "#444444"
+                            }
+                        }
+
                         // 操作列
                         Item {
                             Layout.preferredWidth: 190
@@ -323,6 +437,33 @@ Rectangle {
                                 }
                             }
 
+                            // 健康
+                            Item {
+                                Layout.preferredWidth: 220
+                                Layout.fillHeight: true
+                                Label {
+                                    anchors.centerIn: parent
+                                    text: healthText(modelData)
+                                    color: {
+                                        var health = modelData ? healthByKey[modelData.address + ":" + modelData.port] : null
+                                        return health && health.online ? "#4ecdc4" : "#999999"
+                                    }
+                                    font.pointSize: 12
+                                }
+                            }
+
+                            // 分隔符5
+                            Item {
+                                Layout.preferredWidth: 15
+                                Layout.fillHeight: true
+                                Rectangle {
+                                    anchors.centerIn: parent
+                                    width: 1
+                                    height: parent.height
+                                    color: "#444444"
+                                }
+                            }
+
                             // 操作
                             Item {
                                 Layout.preferredWidth: 190